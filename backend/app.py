@@ -1,172 +1,288 @@
-from flask import Flask, request, jsonify
+import time
+_boot_started = time.perf_counter()
+
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
-from PIL import Image, UnidentifiedImageError, ImageEnhance
-import cv2
-import numpy as np
+from PIL import Image
 import io
 import base64
+import hashlib
+import hmac
+import json
 import os
+import tempfile
 from dotenv import load_dotenv
+from werkzeug.utils import secure_filename
 
-from utils.image_processing import (
-    apply_threshold,
-    apply_edge_detection,
-    apply_noise_reduction,
-    apply_morphological_operation,
-    apply_color_transformation,
-    apply_special_effect,
-    apply_geometric_transform
-)
-from skimage.transform import resize
-from rembg import remove
+from utils.pipeline import FILTERS, frame_to_image, image_to_frame, run_frame_pipeline, run_pipeline
+from utils.planner import PLAN_MODES, check_operations, plan_operations
+from utils.animation import FramePool, encode_clip, open_clip
+from utils.parallel import StepSplitter
+from utils.operations import FILE_OPERATIONS, apply_file_operation, decode_size, resolve_params
+from utils import background_removal, face_blur, lazy_imports
+from utils.batch import default_workers, validate_operations, run_batch, ndjson_stream, zip_stream
+from utils.jobs import JobManager, parse_concurrency, DONE, FAILED, CANCELLED
+from utils.encoder import encode_image, output_options
+from utils.tiling import TilingPolicy
+from utils.upload_store import UploadStore, UploadTooLarge
+from utils.retention import UploadSweeper
+from utils.metrics import Metrics, server_timing
+from utils.profiler import SlowRequestProfiler
+from utils.result_cache import ResultCache, hash_bytes, hash_stream, make_key, normalize_operations
+from utils.prefix_cache import PrefixCache, prefix_keys
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}})
+CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=['X-Encode-Time-Ms', 'X-Encoded-Bytes', 'X-Frames', 'X-Frames-Per-Second',
+                                                                   'X-Plan-Estimated-Ms', 'X-Plan-Rewrites', 'X-Reused-Steps', 'Server-Timing'])
 
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Process pool size for /batch; defaults to the CPUs this process may use
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', 0)) or default_workers()
+
+# Background jobs for slow operations. JOB_CONCURRENCY caps the number of
+# jobs running at once per operation class, e.g. "remove-background=1,upscale=2".
+job_manager = JobManager(
+    parse_concurrency(os.getenv('JOB_CONCURRENCY', 'remove-background=1,upscale=2,nlmeans=2'),
+                      default=int(os.getenv('JOB_DEFAULT_CONCURRENCY', 2))),
+    result_ttl=int(os.getenv('JOB_RESULT_TTL', 600))
+)
+
+# OpenCV, scikit-image and rembg are imported on first use. List operations in
+# PRELOAD_OPERATIONS (e.g. "process,upscale") to import their modules at boot.
+lazy_imports.preload([op.strip() for op in os.getenv('PRELOAD_OPERATIONS', '').split(',') if op.strip()])
+
+# Load the rembg model sessions at startup instead of on the first request
+if os.getenv('REMBG_PRELOAD') == '1':
+    background_removal.warm_up()
+
+# Neighbourhood filters on frames of TILE_MIN_MEGAPIXELS or more run tile by
+# tile with at most TILE_MEMORY_MB of working memory per tile (0 disables).
+# Filters that write back into the frame (Gaussian, median, morphology) need
+# no working memory and always run whole.
+TILING = TilingPolicy(
+    memory_mb=int(os.getenv('TILE_MEMORY_MB', 64)),
+    min_megapixels=float(os.getenv('TILE_MIN_MEGAPIXELS', 16))
+)
+
+# /process requests with "preview": true run on a proxy whose longest edge is
+# at most PREVIEW_MAX_EDGE pixels; an integer "preview" picks the edge itself
+PREVIEW_MAX_EDGE = int(os.getenv('PREVIEW_MAX_EDGE', 1024))
+
+# /process chains are validated against the /filters schema and planned
+# before they run (utils/planner.py). PLAN_MODE is the default plan: 'exact'
+# (rewrites that keep every pixel), 'fast' (also reorders and merges steps;
+# the result is similar but can differ from the chain as sent) or 'off'.
+# Requests pick their own with "plan".
+PLAN_MODE = os.getenv('PLAN_MODE', 'exact')
+
+# Animated GIF/WebP/PNG and video inputs to /process are filtered by
+# FRAME_WORKERS threads (default: the CPUs this process may use) with at most
+# FRAME_MAX_IN_FLIGHT frames decoded at once (default: twice the workers).
+# Clips longer than CLIP_MAX_FRAMES are rejected.
+FRAME_WORKERS = int(os.getenv('FRAME_WORKERS', 0)) or default_workers()
+frame_pool = FramePool(FRAME_WORKERS, int(os.getenv('FRAME_MAX_IN_FLIGHT', 0)) or 2 * FRAME_WORKERS)
+CLIP_MAX_FRAMES = int(os.getenv('CLIP_MAX_FRAMES', 3000))
+
+# Still /process steps built on single-threaded scikit-image filters (sobel,
+# prewitt, roberts, laplace edges and wavelet denoising) run as strips or
+# channels on up to SPLIT_THREADS threads (default: the CPUs this process may
+# use; 1 disables), shared fairly by the requests splitting at the same time.
+# Frames under SPLIT_MIN_MEGAPIXELS run whole.
+step_splitter = StepSplitter(int(os.getenv('SPLIT_THREADS', 0)) or default_workers(),
+                             float(os.getenv('SPLIT_MIN_MEGAPIXELS', 1)))
+
+# Binary /process bodies larger than this are spooled to a temp file
+SPOOL_MAX_MEMORY = int(os.getenv('SPOOL_MAX_MEMORY_MB', 16)) * 1024 * 1024
+
+# Per-stage latency, input size and peak allocation histograms, served at
+# /metrics. METRICS_TRACEMALLOC=1 measures true peak allocation (slower).
+# Requests sending "X-Timing: 1", or all requests with TIMING_HEADER=1, get
+# their breakdown in a Server-Timing header.
+metrics = Metrics(trace_malloc=os.getenv('METRICS_TRACEMALLOC') == '1')
+TIMING_HEADER = os.getenv('TIMING_HEADER') == '1'
+
+# Requests slower than PROFILE_SLOW_MS (0 disables) are stack-sampled every
+# PROFILE_INTERVAL_MS, starting once they are PROFILE_ARM_MS old (default
+# half the threshold). Captures are listed at /admin/profiles, which needs
+# ADMIN_TOKEN to be set and sent in the X-Admin-Token header.
+profiler = SlowRequestProfiler(
+    os.path.join(UPLOAD_FOLDER, '.profiles'),
+    slow_ms=float(os.getenv('PROFILE_SLOW_MS', 0)),
+    arm_ms=float(os.environ['PROFILE_ARM_MS']) if os.getenv('PROFILE_ARM_MS') else None,
+    interval_ms=float(os.getenv('PROFILE_INTERVAL_MS', 10)),
+    max_captures=int(os.getenv('PROFILE_MAX_CAPTURES', 50))
+)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+if profiler.slow_ms and not ADMIN_TOKEN:
+    print("PROFILE_SLOW_MS is set without ADMIN_TOKEN: captures are recorded but /admin/profiles refuses every request")
+
+# Upload metadata index plus decoded frames and prepared watermarks shared by
+# the filename endpoints, bounded to UPLOAD_CACHE_MB of decoded pixels
+upload_store = UploadStore(UPLOAD_FOLDER, cache_bytes=int(os.getenv('UPLOAD_CACHE_MB', 256)) * 1024 * 1024)
+
+# /upload rejects bodies over UPLOAD_MAX_MB and images whose header declares
+# more than UPLOAD_MAX_MEGAPIXELS, before anything is decoded
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_MB', 50)) * 1024 * 1024
+UPLOAD_MAX_PIXELS = int(float(os.getenv('UPLOAD_MAX_MEGAPIXELS', 100)) * 1e6)
+
+# Uploads idle for UPLOAD_TTL_HOURS (0 keeps them) are deleted, then the least
+# recently used ones until the folder is within UPLOAD_QUOTA_MB (0, the
+# default, for no quota), every UPLOAD_SWEEP_SECONDS. Both are off unless set,
+# so nothing is deleted by default. Usage is reported at /uploads/usage.
+upload_sweeper = UploadSweeper(
+    upload_store,
+    quota_bytes=int(os.getenv('UPLOAD_QUOTA_MB', 0)) * 1024 * 1024,
+    ttl_seconds=float(os.getenv('UPLOAD_TTL_HOURS', 0)) * 3600,
+    interval=float(os.getenv('UPLOAD_SWEEP_SECONDS', 300))
+)
+
+# Results are cached by source content hash + operation spec. Set
+# RESULT_CACHE_DISK=1 to also persist entries under UPLOAD_FOLDER.
+result_cache = ResultCache(
+    max_bytes=int(os.getenv('RESULT_CACHE_MAX_MB', 128)) * 1024 * 1024,
+    disk_dir=os.path.join(UPLOAD_FOLDER, '.result_cache') if os.getenv('RESULT_CACHE_DISK') == '1' else None,
+    disk_max_bytes=int(os.getenv('RESULT_CACHE_DISK_MAX_MB', 1024)) * 1024 * 1024
+)
+
+# /process requests that name an editing session ("session" field or
+# X-Session-Id header) keep the frame after every step of their chain, so a
+# later request that only changes step k recomputes steps k..n. Each worker
+# process holds at most PREFIX_CACHE_MB of frames, PREFIX_CACHE_SESSION_MB per
+# session; sessions idle for PREFIX_CACHE_TTL_SECONDS are dropped.
+prefix_cache = PrefixCache(
+    max_bytes=int(os.getenv('PREFIX_CACHE_MB', 512)) * 1024 * 1024,
+    session_max_bytes=int(os.getenv('PREFIX_CACHE_SESSION_MB', 128)) * 1024 * 1024,
+    ttl_seconds=float(os.getenv('PREFIX_CACHE_TTL_SECONDS', 900))
+)
+
+
+@app.before_request
+def start_request_metrics():
+    metrics.begin(request.url_rule.rule if request.url_rule else 'unmatched')
+    profiler.begin()
+    upload_sweeper.ensure_started()
+
+@app.after_request
+def finish_request_metrics(response):
+    timings = metrics.end(response.status_code)
+    profiler.end(request.url_rule.rule if request.url_rule else 'unmatched', response.status_code, timings)
+    if timings and (TIMING_HEADER or request.headers.get('X-Timing') == '1'):
+        response.headers['Server-Timing'] = server_timing(timings)
+    return response
 
 @app.route("/")
 def hello():
     return "Hello, VisionCraft❤!"
 
-def base64_to_image(base64_string):
+def base64_to_bytes(base64_string):
+    try:
+        # Any data URL (data:image/png;base64,..., data:video/mp4;base64,...)
+        if base64_string.startswith('data:'):
+            base64_string = base64_string.split(',', 1)[1]
+        return base64.b64decode(base64_string)
+    except Exception as e:
+        raise ValueError(f"Error processing image: {str(e)}")
+
+def stream_to_image(stream, max_edge=None):
     try:
-        if 'data:image' in base64_string:
-            base64_string = base64_string.split(',')[1]
-        image_data = base64.b64decode(base64_string)
-        image = Image.open(io.BytesIO(image_data))
+        image = Image.open(stream)
+        if max_edge:
+            # Draft-decodes JPEGs at reduced scale before the final resample
+            image.thumbnail((max_edge, max_edge))
+        image.load()
         if image.mode != 'RGB':
             image = image.convert('RGB')
         return image
     except Exception as e:
         raise ValueError(f"Error processing image: {str(e)}")
 
+def bytes_to_image(image_data, max_edge=None):
+    return stream_to_image(io.BytesIO(image_data), max_edge)
+
+def base64_to_image(base64_string):
+    return bytes_to_image(base64_to_bytes(base64_string))
+
+def spool_stream(stream, chunk_size=64 * 1024):
+    """Copy a request body into a seekable spool file in chunks, hashing it on the way."""
+    digest = hashlib.sha256()
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+        spool.write(chunk)
+    spool.seek(0)
+    return spool, digest.hexdigest()
+
 def image_to_base64(image):
     try:
-        buffered = io.BytesIO()
-        image.save(buffered, format="PNG")
-        return base64.b64encode(buffered.getvalue()).decode()
+        return base64.b64encode(encode_image(image, format='png')[0]).decode()
     except Exception as e:
         raise ValueError(f"Error converting image to base64: {str(e)}")
 
-def process_image(filename, operation, **kwargs):
+def process_image(filename, operation, output=None, **kwargs):
+    """
+    Run a single-file operation on an upload.
+
+    ``output`` is an optional encoding policy (see utils.encoder.output_options);
+    without it each operation keeps its historical output format.
+    """
     try:
-        img_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        img = Image.open(img_path)
-        original_size = os.path.getsize(img_path)  # Get original size in bytes
-        img_format = img.format.lower()
-
-        if operation == 'compress':
-            quality = kwargs.get('quality', 85)
-            img_io = io.BytesIO()
-            img.save(img_io, img_format, optimize=True, quality=quality)
-            compressed_size = img_io.tell()  # Get compressed size in bytes
-            img_io.seek(0)
-            img_base64 = base64.b64encode(img_io.read()).decode('utf-8')
-        elif operation == 'resize':
-            width = kwargs.get('width')
-            height = kwargs.get('height')
-            img = img.resize((width, height))
-            img_io = io.BytesIO()
-            img.save(img_io, img_format)
-            compressed_size = img_io.tell()
-            img_io.seek(0)
-            img_base64 = base64.b64encode(img_io.read()).decode('utf-8')
-        elif operation == 'crop':
-            left = kwargs.get('left')
-            top = kwargs.get('top')
-            right = kwargs.get('right')
-            bottom = kwargs.get('bottom')
-            img = img.crop((left, top, right, bottom))
-            img_io = io.BytesIO()
-            img.save(img_io, img_format)
-            compressed_size = img_io.tell()
-            img_io.seek(0)
-            img_base64 = base64.b64encode(img_io.read()).decode('utf-8')
-        elif operation == 'convert-to-jpg':
-            img = img.convert('RGB')
-            img_io = io.BytesIO()
-            img.save(img_io, 'JPEG')
-            compressed_size = img_io.tell()
-            img_io.seek(0)
-            img_base64 = base64.b64encode(img_io.read()).decode('utf-8')
-        elif operation == 'upscale':
-            method = kwargs.get('method', 'lanczos')
-            width = img.width * 2  # Upscale by 2x
-            height = img.height * 2
-            img_array = np.array(img)
-            resized_array = resize(img_array, (height, width), order={
-                'nearest': 0,
-                'bilinear': 1,
-                'bicubic': 3,
-                'lanczos': 5
-            }[method], anti_aliasing=True)
-            resized_img = Image.fromarray((resized_array * 255).astype(np.uint8))
-            img_io = io.BytesIO()
-            resized_img.save(img_io, img_format)
-            compressed_size = img_io.tell()
-            img_io.seek(0)
-            img_base64 = base64.b64encode(img_io.read()).decode('utf-8')
+        meta = upload_store.metadata(filename)
+        # Everything else the result depends on: the watermark's content (a
+        # re-upload keeps its name) and the segmentation model
+        depends_on = [kwargs, output]
+        if operation == 'watermark' and kwargs.get('watermark_filename'):
+            depends_on.append(upload_store.metadata(kwargs['watermark_filename'])['sha256'])
         elif operation == 'remove-background':
-            img = remove(img)
-            img_io = io.BytesIO()
-            img.save(img_io, 'PNG')  # Save as PNG to preserve transparency
-            compressed_size = img_io.tell()
-            img_io.seek(0)
-            img_base64 = base64.b64encode(img_io.read()).decode('utf-8')
-        elif operation == 'watermark':
-            watermark_filename = kwargs.get('watermark_filename')
-            x = kwargs.get('x', 0)
-            y = kwargs.get('y', 0)
-            width = kwargs.get('width')
-            height = kwargs.get('height')
-            opacity = kwargs.get('opacity', 0.5)
-
-            watermark_path = os.path.join(app.config['UPLOAD_FOLDER'], watermark_filename)
-            watermark = Image.open(watermark_path).convert("RGBA")
-
-            # Resize watermark
-            watermark = watermark.resize((width, height))
-
-            # Adjust opacity
-            alpha = watermark.split()[3]
-            alpha = ImageEnhance.Brightness(alpha).enhance(opacity)
-            watermark.putalpha(alpha)
-
-            # Apply watermark
-            img.paste(watermark, (x, y), watermark)
-
-            img_io = io.BytesIO()
-            img.save(img_io, img_format)
-            compressed_size = img_io.tell()
-            img_io.seek(0)
-            img_base64 = base64.b64encode(img_io.read()).decode('utf-8')
-        elif operation == 'blur_face':
-            # Implement face blurring logic here
-            # This is a placeholder and should be replaced with the actual implementation
-            img_io = io.BytesIO()
-            img.save(img_io, img_format)
-            compressed_size = img_io.tell()
-            img_io.seek(0)
-            img_base64 = base64.b64encode(img_io.read()).decode('utf-8')
-        else:
-            raise ValueError(f"Unsupported operation: {operation}")
+            depends_on.append(background_removal.MODEL_NAME)
+        cache_key = make_key(meta['sha256'], operation, depends_on)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return jsonify(cached)
+
+        # Downscales only decode what they need (JPEG DCT scaling)
+        kwargs = resolve_params(operation, meta['width'], meta['height'], kwargs)
+        with metrics.stage('decode'):
+            img = upload_store.open_image(
+                filename, draft_size=decode_size(operation, meta['width'], meta['height'], **kwargs)
+            )
+        metrics.input_image(img)
+        profiler.annotate(operations=[{'operation': operation, 'params': kwargs}], width=img.width, height=img.height)
+        original_size = meta['size']  # Get original size in bytes
+        img_format = meta['format']
+
+        with metrics.operation(operation):
+            img, img_format, save_options = apply_file_operation(
+                img, img_format, operation, app.config['UPLOAD_FOLDER'], store=upload_store, **kwargs
+            )
+
+        with metrics.stage('encode'):
+            if output:
+                encoded, encode_info = encode_image(img, **output)
+            else:
+                encoded, encode_info = encode_image(img, format=img_format, **save_options)
+        compressed_size = len(encoded)
+        with metrics.stage('base64'):
+            img_base64 = base64.b64encode(encoded).decode('utf-8')
 
         # Convert sizes to KB and format to two decimal places
         original_size_kb = round(original_size / 1024, 2)
         compressed_size_kb = round(compressed_size / 1024, 2)
 
-        return jsonify({
+        result = {
             'success': True,
             'img': img_base64,
             'original_size': original_size_kb,
-            'compressed_size': compressed_size_kb
-        })
+            'compressed_size': compressed_size_kb,
+            'format': encode_info['format'],
+            'encode_ms': encode_info['encode_ms']
+        }
+        result_cache.put(cache_key, result)
+        return jsonify(result)
 
     except FileNotFoundError:
         return jsonify({'success': False, 'error': 'File not found.'}), 404
@@ -176,54 +292,281 @@ def process_image(filename, operation, **kwargs):
         print(f"Error processing image: {e}")
         return jsonify({'success': False, 'error': 'Image processing failed.'}), 500
 
+def encoded_response(encoded, encode_info, animation=None, plan=None, reused_steps=None):
+    response = Response(encoded, mimetype=encode_info['mimetype'])
+    response.headers['X-Encode-Time-Ms'] = str(encode_info['encode_ms'])
+    response.headers['X-Encoded-Bytes'] = str(encode_info['bytes'])
+    if animation:
+        response.headers['X-Frames'] = str(animation['frames'])
+        response.headers['X-Frames-Per-Second'] = str(animation['fps'])
+    if plan:
+        response.headers['X-Plan-Estimated-Ms'] = str(plan['estimated_ms'])
+        response.headers['X-Plan-Rewrites'] = str(len(plan['rewrites']))
+    if reused_steps is not None:
+        response.headers['X-Reused-Steps'] = str(reused_steps)
+    return response
+
+def preview_edge(value):
+    """Longest proxy edge for a /process ``preview`` field, or None for a full render."""
+    if value in (None, False, '', '0', 'false'):
+        return None
+    if value in (True, '1', 'true'):
+        return PREVIEW_MAX_EDGE
+    edge = int(value)
+    if edge < 16:
+        raise ValueError("preview must be true or an edge length of at least 16 pixels")
+    return edge
+
+def plan_mode(value):
+    """Plan mode for a /process ``plan`` field, PLAN_MODE when it is not given."""
+    mode = value or PLAN_MODE
+    if mode not in PLAN_MODES:
+        raise ValueError(f"Unsupported plan mode: {mode} (use {', '.join(PLAN_MODES)})")
+    return mode
+
+def session_id(value):
+    """Prefix cache session for a /process ``session`` field or X-Session-Id header, or None."""
+    value = value or request.headers.get('X-Session-Id')
+    if not value:
+        return None
+    if not isinstance(value, str) or len(value) > 128:
+        raise ValueError("session must be a string of at most 128 characters")
+    return value
+
+def process_key(source_hash, operations, output, preview, mode):
+    return make_key(source_hash, 'process', [operations, output, mode] + ([preview] if preview else []))
+
+def process_clip(clip, operations, output, preview=None, mode=PLAN_MODE):
+    """
+    Filter every frame of an animated image or video and encode the result.
+
+    Returns (encoded bytes, encode info, animation info, plan) for the response.
+    """
+    try:
+        scale = min(1, preview / max(clip.width, clip.height)) if preview else 1
+        # Preview and video frame sizes are only known once decoded
+        plan = plan_operations(
+            operations, max(1, round(clip.width * scale)), max(1, round(clip.height * scale)), mode=mode,
+            frames=clip.frame_count, exact_size=not preview and clip.format != 'video'
+        )
+        profiler.annotate(operations=plan.operations, width=clip.width, height=clip.height, frames=clip.frame_count)
+        frames = frame_pool.map(
+            clip.frames(preview), plan.operations,
+            on_error=lambda operation, e: print(f"Error applying {operation['type']}: {str(e)}"),
+            tiling=TILING
+        )
+        with metrics.stage('frames'):
+            encoded, encode_info = encode_clip(frames, clip, **output)
+    finally:
+        clip.close()
+    animation = {key: encode_info.pop(key) for key in ('frames', 'width', 'height', 'fps')}
+    return encoded, encode_info, animation, plan.to_dict()
+
+def render_still(source, source_hash, operations, preview=None, mode=PLAN_MODE, session=None):
+    """
+    Decode a still image from ``source`` and run a /process chain on it.
+    Returns (PIL image, plan, number of steps resumed from prefix_cache).
+
+    With a ``session`` the frame after every step is kept, keyed by the
+    source hash, preview edge and the planned steps up to it, and the chain
+    resumes from the longest prefix the session already has a frame for.
+    """
+    on_error = lambda operation, e: print(f"Error applying {operation['type']}: {str(e)}")
+    source_key = make_key(source_hash, 'source', [preview])
+    size = prefix_cache.source_size(session, source_key) if session else None
+    image = None
+    if size is None:
+        with metrics.stage('decode'):
+            image = stream_to_image(source, preview)
+        metrics.input_image(image)
+        size = image.size
+        if session:
+            prefix_cache.remember_source(session, source_key, size)
+    plan = plan_operations(operations, size[0], size[1], mode=mode)
+    profiler.annotate(operations=plan.operations, width=size[0], height=size[1])
+
+    if not session:
+        # Apply each operation in sequence on a single ndarray
+        return run_pipeline(image, plan.operations, on_error, TILING, metrics.on_step, step_splitter), plan, 0
+
+    keys = prefix_keys(source_key, plan.operations)
+    start, frame = prefix_cache.resume(session, keys)
+    if frame is None:
+        if image is None:
+            # The session's frames of this source were evicted
+            with metrics.stage('decode'):
+                image = stream_to_image(source, preview)
+        frame = image_to_frame(image)
+        prefix_cache.put(session, keys[0], frame)
+    frame = run_frame_pipeline(
+        frame, plan.operations[start:], on_error, TILING, metrics.on_step,
+        on_checkpoint=lambda done, checkpoint: prefix_cache.put(session, keys[start + done], checkpoint),
+        splitter=step_splitter
+    )
+    return frame_to_image(frame), plan, start
+
+def render(source, source_hash, operations, output, preview=None, mode=PLAN_MODE, session=None):
+    """
+    Run one /process request on a seekable ``source`` stream.
+
+    Returns (result, encoded, reused_steps): the JSON result dict, the
+    encoded bytes and the number of steps resumed from the session's prefix
+    cache. On a result_cache hit encoded and reused_steps are None; clips
+    never use the prefix cache.
+    """
+    cache_key = process_key(source_hash, operations, output, preview, mode)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached, None, None
+
+    clip = open_clip(source, CLIP_MAX_FRAMES)
+    if clip is not None:
+        encoded, encode_info, animation, plan = process_clip(clip, operations, output, preview, mode)
+        result = {
+            'status': 'success',
+            'image': f'data:{encode_info["mimetype"]};base64,{base64.b64encode(encoded).decode()}',
+            'encode': encode_info,
+            'animation': animation,
+            'plan': plan
+        }
+        result_cache.put(cache_key, result)
+        return result, encoded, 0
+
+    image, plan, reused_steps = render_still(source, source_hash, operations, preview, mode, session)
+
+    # Encode and convert back to base64
+    with metrics.stage('encode'):
+        encoded, encode_info = encode_image(image, **output)
+    with metrics.stage('base64'):
+        processed_image = base64.b64encode(encoded).decode()
+
+    result = {
+        'status': 'success',
+        'image': f'data:{encode_info["mimetype"]};base64,{processed_image}',
+        'encode': encode_info,
+        'plan': plan.to_dict()
+    }
+    if preview:
+        result['preview'] = {'width': image.width, 'height': image.height}
+    result_cache.put(cache_key, result)
+    return result, encoded, reused_steps
+
+def process_chain(image_data, operations, output, preview=None, mode=PLAN_MODE, session=None):
+    """
+    Decode, filter and encode one /process request; returns the JSON result dict.
+
+    With ``preview`` (a longest-edge length) the chain runs on a downscaled
+    proxy for interactive feedback; the full render is a separate request.
+    Animated GIF/WebP/PNG and video inputs run the chain on every frame and
+    the result has an 'animation' entry with the frame count, size and
+    frames per second. The chain is planned for the decoded frame size with
+    ``mode``; the steps that ran and the estimated cost are under 'plan'.
+    With a ``session``, 'reused_steps' says how many steps were resumed
+    from the prefix cache.
+    """
+    result, _, reused_steps = render(io.BytesIO(image_data), hash_bytes(image_data), operations, output, preview,
+                                     mode, session)
+    if session and reused_steps is not None:
+        return dict(result, reused_steps=reused_steps)
+    return result
+
+def process_upload(filename, operations, output, preview=None, mode=PLAN_MODE, session=None):
+    """process_chain for an uploaded file, which is hashed once by upload_store rather than per request."""
+    meta = upload_store.metadata(filename)
+    with open(upload_store.path(filename), 'rb') as source:
+        result, _, reused_steps = render(source, meta['sha256'], operations, output, preview, mode, session)
+    if session and reused_steps is not None:
+        return dict(result, reused_steps=reused_steps)
+    return result
+
+BINARY_MIMETYPES = ('multipart/form-data', 'application/octet-stream')
+
 @app.route('/process', methods=['POST'])
 def process_image_route():
+    if request.mimetype in BINARY_MIMETYPES or request.mimetype.startswith('image/'):
+        return process_image_binary()
+
     try:
         data = request.json
-        if not data or 'image' not in data or 'operations' not in data:
+        if not data or ('image' not in data and 'filename' not in data) or 'operations' not in data:
             return jsonify({
                 'status': 'error',
                 'message': 'Missing required fields'
             }), 400
 
-        image_data = data['image']
-        operations = data['operations']
-        
-        # Convert base64 to PIL Image
-        image = base64_to_image(image_data)
-        
-        # Define available processors
-        processors = {
-            'threshold': apply_threshold,
-            'edge_detection': apply_edge_detection,
-            'noise_reduction': apply_noise_reduction,
-            'morphological': apply_morphological_operation,
-            'color_transformation': apply_color_transformation,
-            'special_effect': apply_special_effect,
-            'geometric': apply_geometric_transform
-        }
-        
-        # Apply each operation in sequence
-        for operation in operations:
-            if 'type' not in operation or 'params' not in operation:
-                continue
-                
-            processor = processors.get(operation['type'])
-            if processor:
-                try:
-                    image = processor(image, **operation['params'])
-                except Exception as e:
-                    print(f"Error applying {operation['type']}: {str(e)}")
-                    continue
-        
-        # Convert back to base64
-        processed_image = image_to_base64(image)
+        operations = normalize_operations(data['operations'])
+        check_operations(operations)
+        options = (output_options(data), preview_edge(data.get('preview')), plan_mode(data.get('plan')),
+                   session_id(data.get('session')))
+        if 'image' not in data:
+            return jsonify(process_upload(secure_filename(data['filename']), operations, *options))
+        with metrics.stage('base64'):
+            image_data = base64_to_bytes(data['image'])
+        return jsonify(process_chain(image_data, operations, *options))
         
+    except FileNotFoundError:
+        return jsonify({'status': 'error', 'message': 'File not found.'}), 404
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        print(f"Processing error: {str(e)}")
         return jsonify({
-            'status': 'success',
-            'image': f'data:image/png;base64,{processed_image}'
-        })
-        
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+def process_image_binary():
+    """
+    Binary variant of /process.
+
+    Accepts either multipart/form-data with an ``image`` file and an
+    ``operations`` JSON field, or the raw image bytes as the request body with
+    the operations JSON in the ``operations`` query parameter or the
+    ``X-Operations`` header. The output encoding fields (output_format,
+    output_quality, compression_level, output_profile) are read from the form
+    or query string, as are ``preview``, ``plan`` and ``session`` (or the
+    X-Session-Id header). Responds with the
+    encoded image bytes; the encode time and size are reported in the
+    X-Encode-Time-Ms and X-Encoded-Bytes headers, the plan's estimated cost
+    and number of rewrites in X-Plan-Estimated-Ms and X-Plan-Rewrites.
+    Animated images and videos are filtered frame by frame; their frame
+    count and throughput are reported in X-Frames and X-Frames-Per-Second.
+    Steps resumed from the session's prefix cache are counted in X-Reused-Steps.
+    """
+    try:
+        if request.mimetype == 'multipart/form-data':
+            if 'image' not in request.files:
+                return jsonify({'status': 'error', 'message': 'Missing required fields'}), 400
+            # Werkzeug has already spooled the part; hash it and rewind for the decoder
+            source = request.files['image'].stream
+            source_hash = hash_stream(source)
+            source.seek(0)
+            operations_json = request.form.get('operations')
+            output = output_options(request.form)
+            preview = preview_edge(request.form.get('preview'))
+            mode = plan_mode(request.form.get('plan'))
+            session = session_id(request.form.get('session'))
+        else:
+            source, source_hash = spool_stream(request.stream)
+            operations_json = request.args.get('operations') or request.headers.get('X-Operations')
+            output = output_options(request.args)
+            preview = preview_edge(request.args.get('preview'))
+            mode = plan_mode(request.args.get('plan'))
+            session = session_id(request.args.get('session'))
+
+        if not operations_json:
+            return jsonify({'status': 'error', 'message': 'Missing required fields'}), 400
+        operations = normalize_operations(json.loads(operations_json))
+        check_operations(operations)
+
+        result, encoded, reused_steps = render(source, source_hash, operations, output, preview, mode, session)
+        if encoded is None:
+            encoded = base64.b64decode(result['image'].split(',')[1])
+        return encoded_response(encoded, result['encode'], result.get('animation'), result.get('plan'),
+                                reused_steps if session else None)
+
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
         print(f"Processing error: {str(e)}")
         return jsonify({
@@ -231,52 +574,219 @@ def process_image_route():
             'message': str(e)
         }), 500
 
+@app.route('/process/plan', methods=['POST'])
+def plan_route():
+    """
+    Validate a /process chain and return its plan for a frame size, without
+    running it. Takes ``operations``, ``width`` and ``height``, and optionally
+    ``plan`` (the mode) and ``frames``.
+    """
+    try:
+        data = request.json
+        if not data or 'operations' not in data or 'width' not in data or 'height' not in data:
+            return jsonify({'status': 'error', 'message': 'Missing required fields'}), 400
+        operations = normalize_operations(data['operations'])
+        check_operations(operations)
+        plan = plan_operations(operations, int(data['width']), int(data['height']), mode=plan_mode(data.get('plan')),
+                               frames=int(data.get('frames', 1)))
+        return jsonify({'status': 'success', 'plan': plan.to_dict()})
+    except (TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+@app.route('/process/split/stats', methods=['GET'])
+def split_stats():
+    return jsonify(step_splitter.stats())
+
+@app.route('/batch', methods=['POST'])
+def batch_process():
+    """
+    Apply one operation list to many files in UPLOAD_FOLDER in parallel.
+
+    Body: {"filenames": [...], "operations": [...], "format": "ndjson" | "zip"}
+    plus the optional output encoding fields. Results are streamed back in
+    completion order.
+    """
+    try:
+        data = request.get_json()
+        filenames = data['filenames']
+        operations = data['operations']
+        response_format = data.get('format', 'ndjson')
+
+        if not isinstance(filenames, list) or not filenames:
+            return jsonify({'success': False, 'error': 'filenames must be a non-empty list'}), 400
+        if response_format not in ('ndjson', 'zip'):
+            return jsonify({'success': False, 'error': f'Unsupported format: {response_format}'}), 400
+        validate_operations(operations)
+        output = output_options(data)
+
+        results = run_batch(app.config['UPLOAD_FOLDER'], filenames, operations, output, BATCH_WORKERS, TILING)
+        if response_format == 'zip':
+            return Response(zip_stream(results), mimetype='application/zip',
+                            headers={'Content-Disposition': 'attachment; filename=batch.zip'})
+        return Response(ndjson_stream(results), mimetype='application/x-ndjson')
+
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f'Missing parameter: {str(e)}'}), 400
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"Batch processing error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def run_process_image_job(filename, operation, output, params):
+    """Run process_image from a job thread and unwrap its JSON response."""
+    with app.app_context():
+        rv = process_image(filename, operation, output=output, **params)
+    response, status_code = rv if isinstance(rv, tuple) else (rv, rv.status_code)
+    return response.get_json(), status_code
+
+def run_process_chain_job(image_data, operations, output, mode=PLAN_MODE):
+    try:
+        return process_chain(image_data, operations, output, mode=mode), 200
+    except ValueError as e:
+        return {'status': 'error', 'message': str(e)}, 400
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue a slow operation and return its job id immediately.
+
+    Body: {"operation": "remove-background" | "upscale" | ..., "filename": ..., "params": {...}}
+    or {"operation": "process", "image": ..., "operations": [...], "plan": ...},
+    plus the optional output encoding fields. Process chains are validated
+    like /process before the job is queued.
+    """
+    try:
+        data = request.get_json()
+        operation = data['operation']
+        output = output_options(data)
+
+        if operation == 'process':
+            operations = normalize_operations(data['operations'])
+            check_operations(operations)
+            mode = plan_mode(data.get('plan'))
+            image_data = base64_to_bytes(data['image'])
+            uses_nlmeans = any(op['params'].get('method') == 'nlmeans' for op in operations)
+            job = job_manager.submit('nlmeans' if uses_nlmeans else 'default', 'process',
+                                     run_process_chain_job, image_data, operations, output, mode)
+        elif operation in FILE_OPERATIONS:
+            filename = data['filename']
+            params = data.get('params', {})
+            job_class = operation if operation in job_manager.concurrency else 'default'
+            job = job_manager.submit(job_class, f"{operation} {filename}",
+                                     run_process_image_job, filename, operation, output, params)
+        else:
+            return jsonify({'success': False, 'error': f'Unsupported operation: {operation}'}), 400
+
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/jobs/{job.id}',
+            'result_url': f'/jobs/{job.id}/result'
+        }), 202
+
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f'Missing parameter: {str(e)}'}), 400
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error submitting job: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/jobs/stats', methods=['GET'])
+def job_stats():
+    return jsonify(job_manager.stats())
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found.'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found.'}), 404
+    if job.status == CANCELLED:
+        return jsonify({'success': False, 'error': 'Job was cancelled.'}), 410
+    if job.status == FAILED and job.result is None:
+        return jsonify({'success': False, 'error': job.error}), 500
+    if job.status not in (DONE, FAILED):
+        return jsonify(job.to_dict()), 202
+    return jsonify(job.result), job.status_code
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found.'}), 404
+    if not job_manager.cancel(job_id):
+        return jsonify({'success': False, 'error': f'Job is already {job.status}.'}), 409
+    return jsonify({'success': True, 'job_id': job_id, 'status': CANCELLED})
+
 @app.route('/filters', methods=['GET'])
 def get_available_filters():
-    return jsonify({
-        'threshold': {
-            'methods': ['binary', 'adaptive', 'otsu', 'triangle'],
-            'params': {
-                'threshold': {'min': 0, 'max': 255, 'default': 127},
-                'block_size': {'min': 3, 'max': 21, 'default': 11},
-                'c': {'min': -10, 'max': 10, 'default': 2}
-            }
-        },
-        'edge_detection': {
-            'methods': ['canny', 'sobel', 'laplace', 'prewitt', 'roberts'],
-            'params': {
-                'sigma': {'min': 0.1, 'max': 5.0, 'default': 2.0},
-                'low_threshold': {'min': 0, 'max': 255, 'default': 100},
-                'high_threshold': {'min': 0, 'max': 255, 'default': 200}
-            }
-        },
-        'noise_reduction': {
-            'methods': ['gaussian', 'median', 'bilateral', 'nlmeans', 'wavelet'],
-            'params': {
-                'kernel_size': {'min': 3, 'max': 15, 'default': 5},
-                'sigma': {'min': 0.1, 'max': 5.0, 'default': 1.5}
-            }
-        },
-        'morphological': {
-            'operations': ['dilate', 'erode', 'opening', 'closing', 'gradient', 'tophat', 'blackhat'],
-            'params': {
-                'kernel_size': {'min': 3, 'max': 15, 'default': 5},
-                'iterations': {'min': 1, 'max': 10, 'default': 1}
-            }
-        },
-        'color_transformation': {
-            'methods': ['rgb_to_hsv', 'rgb_to_lab', 'gamma', 'equalize', 'autocontrast'],
-            'params': {
-                'gamma': {'min': 0.1, 'max': 5.0, 'default': 1.0}
-            }
-        },
-        'special_effect': {
-            'effects': ['cartoon', 'oil_painting', 'pencil_sketch', 'watercolor', 'pixelate'],
-            'params': {
-                'strength': {'min': 0.1, 'max': 1.0, 'default': 0.5}
-            }
-        }
-    })
+    return jsonify(FILTERS)
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+@app.route('/cache/prefix/stats', methods=['GET'])
+def prefix_cache_stats():
+    return jsonify(prefix_cache.stats())
+
+@app.route('/cache/prefix/<session>', methods=['DELETE'])
+def drop_prefix_session(session):
+    """Free a session's intermediate frames, e.g. when its editor is closed."""
+    return jsonify({'success': True, 'freed_bytes': prefix_cache.drop_session(session)})
+
+@app.route('/uploads/stats', methods=['GET'])
+def upload_stats():
+    return jsonify(upload_store.stats())
+
+@app.route('/uploads/usage', methods=['GET'])
+def upload_usage():
+    """Disk usage of UPLOAD_FOLDER as of the last sweep; ?refresh=1 rescans it (without deleting anything)."""
+    return jsonify(upload_sweeper.usage(refresh=request.args.get('refresh') == '1'))
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def admin_authorized():
+    # Without ADMIN_TOKEN the captured stacks and operation lists are served to no one
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+@app.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    if not admin_authorized():
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    return jsonify({'success': True, 'profiler': profiler.stats(), 'profiles': profiler.list()})
+
+@app.route('/admin/profiles/<capture_id>', methods=['GET'])
+def download_profile(capture_id):
+    """Folded stacks of one capture (flamegraph.pl, speedscope), or its description with ?format=json."""
+    if not admin_authorized():
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    try:
+        if request.args.get('format') == 'json':
+            with open(profiler.capture_path(capture_id, '.json')) as f:
+                return jsonify(json.load(f))
+        with open(profiler.capture_path(capture_id)) as f:
+            return Response(f.read(), mimetype='text/plain', headers={
+                'Content-Disposition': f'attachment; filename={capture_id}.folded'
+            })
+    except FileNotFoundError:
+        return jsonify({'success': False, 'error': 'Profile not found'}), 404
+
+@app.route('/debug/startup', methods=['GET'])
+def startup_report():
+    return jsonify(dict(lazy_imports.report(), boot_ms=BOOT_MS))
 
 @app.route('/test', methods=['GET'])
 def test():
@@ -287,19 +797,45 @@ def test():
 
 @app.route('/upload', methods=['POST'])
 def upload_image():
+    """
+    Store an image in UPLOAD_FOLDER.
+
+    Accepts multipart/form-data with an ``image`` file, or the raw image
+    bytes as the request body with the filename in the ``filename`` query
+    parameter or the ``X-Filename`` header. Raw bodies are streamed straight
+    to disk. Identical content is stored once however many names it has.
+    """
     try:
-        if 'image' not in request.files:
-            return jsonify({'error': 'No image part'}), 400
+        # Reject oversized bodies before Werkzeug parses or spools them
+        if request.content_length and request.content_length > UPLOAD_MAX_BYTES + 64 * 1024:
+            return jsonify({'error': f'Upload exceeds {UPLOAD_MAX_BYTES} bytes'}), 413
+
+        if request.mimetype == 'multipart/form-data':
+            if 'image' not in request.files:
+                return jsonify({'error': 'No image part'}), 400
 
-        image = request.files['image']
-        if image.filename == '':
-            return jsonify({'error': 'No selected image'}), 400
+            image = request.files['image']
+            if image.filename == '':
+                return jsonify({'error': 'No selected image'}), 400
+            filename, stream = image.filename, image.stream
+        else:
+            filename = request.args.get('filename') or request.headers.get('X-Filename')
+            if not filename:
+                return jsonify({'error': 'No filename'}), 400
+            stream = request.stream
 
-        filename = image.filename
-        image.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+        filename = secure_filename(filename)
+        if not filename:
+            return jsonify({'error': 'Invalid filename'}), 400
+        meta, deduplicated = upload_store.save(stream, filename, UPLOAD_MAX_BYTES, UPLOAD_MAX_PIXELS)
 
-        return jsonify({'filename': filename, 'message': 'Image uploaded successfully'}), 200
+        result = {'filename': filename, 'message': 'Image uploaded successfully', 'deduplicated': deduplicated}
+        if meta:
+            result.update({key: meta[key] for key in ('sha256', 'size', 'width', 'height', 'format')})
+        return jsonify(result), 200
 
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         print(e)
         return jsonify({'error': str(e)}), 500
@@ -310,8 +846,10 @@ def compress():
         data = request.get_json()
         filename = data['filename']
         quality = int(data.get('quality', 85))  # Default to 85 if not provided
+        # Optional bounding box; larger images are downscaled (aspect kept)
+        bounds = {key: int(data[key]) for key in ('max_width', 'max_height') if data.get(key)}
 
-        result = process_image(filename, 'compress', quality=quality)
+        result = process_image(filename, 'compress', quality=quality, output=output_options(data), **bounds)
         return result
     except KeyError as e:
         return jsonify({'success': False, 'error': f'Missing parameter: {str(e)}'}), 400
@@ -331,15 +869,15 @@ def resize_image():
         if resize_option == 'dimensions':
             width = int(data['width'])
             height = int(data['height'])
-            result = process_image(filename, 'resize', width=width, height=height, format=format, quality=quality)
+            result = process_image(filename, 'resize', width=width, height=height, format=format, quality=quality, output=output_options(data))
         elif resize_option == 'percent':
             percent = float(data['percent'])
-            result = process_image(filename, 'resize', percent=percent, format=format, quality=quality)
+            result = process_image(filename, 'resize', percent=percent, format=format, quality=quality, output=output_options(data))
         elif resize_option == 'resolution':
             width = int(data['width'])
             height = int(data['height'])
             dpi = int(data.get('dpi', 72))
-            result = process_image(filename, 'resize', width=width, height=height, format=format, quality=quality, dpi=dpi)
+            result = process_image(filename, 'resize', width=width, height=height, format=format, quality=quality, dpi=dpi, output=output_options(data))
 
         return result
 
@@ -363,7 +901,7 @@ def crop_image():
         right = int(data['right'])
         bottom = int(data['bottom'])
 
-        result = process_image(filename, 'crop', left=left, top=top, right=right, bottom=bottom)
+        result = process_image(filename, 'crop', left=left, top=top, right=right, bottom=bottom, output=output_options(data))
         return result
 
     except KeyError as e:
@@ -385,7 +923,7 @@ def convert_to_jpg():
         if not filename:
             return jsonify({'error': 'No filename provided'}), 400
 
-        img_str = process_image(filename, 'convert-to-jpg')
+        img_str = process_image(filename, 'convert-to-jpg', output=output_options(data))
         return jsonify({'image': img_str, 'message': 'Image converted to JPG successfully'}), 200
 
     except FileNotFoundError:
@@ -402,8 +940,9 @@ def upscale_image():
         data = request.get_json()
         filename = data['filename']
         method = data.get('method', 'lanczos')
+        scale = float(data.get('scale', 2))
 
-        result = process_image(filename, 'upscale', method=method)
+        result = process_image(filename, 'upscale', method=method, scale=scale, output=output_options(data))
         return result
 
     except KeyError as e:
@@ -422,7 +961,7 @@ def remove_background():
         data = request.get_json()
         filename = data['filename']
 
-        result = process_image(filename, 'remove-background')
+        result = process_image(filename, 'remove-background', output=output_options(data))
         return result
 
     except KeyError as e:
@@ -435,6 +974,10 @@ def remove_background():
         print(e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/remove-background/stats', methods=['GET'])
+def remove_background_stats():
+    return jsonify(background_removal.stats())
+
 @app.route('/watermark', methods=['POST'])
 def add_watermark():
     try:
@@ -447,7 +990,7 @@ def add_watermark():
         height = int(data['height'])
         opacity = float(data.get('opacity', 0.5))
 
-        result = process_image(filename, 'watermark', watermark_filename=watermark_filename, x=x, y=y, width=width, height=height, opacity=opacity)
+        result = process_image(filename, 'watermark', watermark_filename=watermark_filename, x=x, y=y, width=width, height=height, opacity=opacity, output=output_options(data))
         return result
 
     except KeyError as e:
@@ -465,18 +1008,32 @@ def blur_face():
     try:
         data = request.get_json()
         filename = data['filename']
-        
-        result = process_image(filename, 'blur_face')
+        method = data.get('method', 'blur')
+        strength = float(data.get('strength', 0.5))
+
+        result = process_image(filename, 'blur_face', method=method, strength=strength, output=output_options(data))
         return result
 
     except KeyError as e:
         return jsonify({'success': False, 'error': f'Missing parameter: {str(e)}'}), 400
     except FileNotFoundError:
         return jsonify({'success': False, 'error': 'Image not found'}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/blur-face/stats', methods=['GET'])
+def blur_face_stats():
+    try:
+        return jsonify(face_blur.stats())
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+
+BOOT_MS = round((time.perf_counter() - _boot_started) * 1000, 2)
+
+# Development server; run serve.py in production
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     app.run(debug=True, host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Importing this module puts the backend directory on sys.path, so a script
+run as ``python benchmarks/<name>.py`` can import ``utils`` and ``app``
+after it.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def synthetic_frame(megapixels):
+    """
+    A 4:3 RGB uint8 frame of about ``megapixels``: colour gradients plus
+    seeded noise, so runs are repeatable and the content is neither flat
+    nor pure noise.
+    """
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 200, width, dtype=np.float32)
+    y = np.linspace(0, 200, height, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1).astype(np.uint8)
+    return base + rng.integers(0, 55, size=base.shape, dtype=np.uint8)
+
+
+def best_of(repeat, fn, prepare=None):
+    """
+    Run ``fn`` ``repeat`` times; returns (last result, best seconds).
+
+    Parameters:
+    - repeat: number of runs
+    - fn: the timed call
+    - prepare: called untimed before every run, its result passed to ``fn``
+      (e.g. ``frame.copy`` for steps that work in place)
+    """
+    best, result = None, None
+    for _ in range(repeat):
+        args = () if prepare is None else (prepare(),)
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def measure(fn):
+    """
+    Run ``fn`` once under tracemalloc; returns (result, seconds, bytes
+    still allocated when it returns, peak bytes allocated during it).
+    """
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current, peak
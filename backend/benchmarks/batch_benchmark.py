@@ -0,0 +1,69 @@
+"""
+Throughput of the /batch executor at 1, 4 and N process-pool workers.
+
+Usage (from the backend directory):
+    python benchmarks/batch_benchmark.py [--files 64] [--megapixels 2]
+
+Synthetic JPEGs are written to a temporary upload folder and run through a
+resize -> watermark -> compress chain, the typical bulk workload.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+import _common  # noqa: F401 (puts the backend directory on sys.path)
+from utils.batch import default_workers, run_batch
+
+
+def make_uploads(folder, count, megapixels):
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    filenames = []
+    for i in range(count):
+        filename = f"bench_{i}.jpg"
+        Image.fromarray(np.roll(base, i, axis=1)).save(os.path.join(folder, filename), quality=90)
+        filenames.append(filename)
+    Image.new('RGBA', (200, 100), (255, 255, 255, 200)).save(os.path.join(folder, 'watermark.png'))
+    return filenames, width, height
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--files', type=int, default=64)
+    parser.add_argument('--megapixels', type=float, default=2)
+    args = parser.parse_args()
+
+    workers = sorted({1, 4, default_workers()})
+    with tempfile.TemporaryDirectory() as folder:
+        filenames, width, height = make_uploads(folder, args.files, args.megapixels)
+        operations = [
+            {'operation': 'resize', 'params': {'width': width // 2, 'height': height // 2}},
+            {'operation': 'watermark', 'params': {'watermark_filename': 'watermark.png',
+                                                  'x': 10, 'y': 10, 'width': 200, 'height': 100}},
+            {'operation': 'compress', 'params': {'quality': 75}},
+        ]
+
+        print(f"{args.files} files at {width}x{height}\n")
+        print(f"{'workers':>8}{'seconds':>10}{'files/s':>10}{'speedup':>10}")
+        baseline = None
+        for count in workers:
+            # Warm the pool so process start-up is not part of the measurement
+            list(run_batch(folder, filenames[:count], operations, max_workers=count))
+            start = time.perf_counter()
+            results = list(run_batch(folder, filenames, operations, max_workers=count))
+            elapsed = time.perf_counter() - start
+            failed = [r for r in results if not r['success']]
+            if failed:
+                print(f"{len(failed)} files failed: {failed[0]['error']}")
+            baseline = baseline or elapsed
+            print(f"{count:>8}{elapsed:>10.2f}{len(results) / elapsed:>10.1f}{baseline / elapsed:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Clip throughput and peak memory against clip length.
+
+Usage (from the backend directory):
+    python benchmarks/clip_benchmark.py [--frames 40,400] [--size 960x720] [--formats gif,webp] [--workers 2]
+
+Every run posts a synthetic animated GIF (a bar sweeping over a flat
+background) to /process with a Gaussian blur, in a fresh process, and
+reports frames per second and how far peak RSS grew during the request. The growth should stay roughly flat as the clip gets longer,
+since only --workers * 2 frames are in flight at once.
+"""
+import argparse
+import base64
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+import _common  # noqa: F401 (puts the backend directory on sys.path)
+
+
+def clip_bytes(frames, width, height):
+    def generate():
+        for index in range(frames):
+            frame = np.zeros((height, width, 3), np.uint8)
+            frame[..., 2] = 80
+            start = (index * 7) % width
+            frame[:, start:start + 60] = 250
+            yield Image.fromarray(frame)
+
+    images = generate()
+    buffered = io.BytesIO()
+    next(images).save(buffered, 'GIF', save_all=True, append_images=images, duration=40)
+    return buffered.getvalue()
+
+
+def post_clip(client, data, output_format):
+    return client.post('/process', json={
+        'image': base64.b64encode(data).decode(),
+        'output_format': output_format,
+        'operations': [{'type': 'noise_reduction', 'params': {'method': 'gaussian', 'kernel_size': 5}}]
+    })
+
+
+def run_one(path, output_format):
+    with open(path, 'rb') as f:
+        data = f.read()
+    from app import app
+
+    client = app.test_client()
+    # A small clip first, so the lazy imports are not counted
+    post_clip(client, clip_bytes(2, 64, 48), output_format)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    response = post_clip(client, data, output_format)
+    growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    result = response.get_json()
+    frames = result.get('animation', {}).get('frames')
+    if response.status_code != 200:
+        print(f"{frames:>7}{output_format:>7}  failed: {result.get('message')}")
+        return
+    print(f"{frames:>7}{output_format:>7}{len(data) // 1024:>10}{result['encode']['bytes'] // 1024:>11}"
+          f"{result['animation']['fps']:>8.1f}{growth / 1024:>13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--frames', default='40,400', help='comma-separated clip lengths')
+    parser.add_argument('--size', default='960x720', help='frame size, WIDTHxHEIGHT')
+    parser.add_argument('--formats', default='gif,webp', help='comma-separated output formats')
+    parser.add_argument('--workers', type=int, default=2, help='FRAME_WORKERS for the app')
+    parser.add_argument('--write', nargs=2, help=argparse.SUPPRESS)
+    parser.add_argument('--one', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.size.split('x'))
+    if args.write:
+        with open(args.write[0], 'wb') as f:
+            f.write(clip_bytes(int(args.write[1]), width, height))
+        return
+    if args.one:
+        run_one(args.one[0], args.one[1])
+        return
+
+    env = dict(os.environ, FRAME_WORKERS=str(args.workers))
+    print(f"{width}x{height}, {args.workers} frame worker(s)\n")
+    print(f"{'frames':>7}{'format':>7}{'input KB':>10}{'output KB':>11}{'fps':>8}{'peak +MB':>13}")
+    for frames in (int(count) for count in args.frames.split(',')):
+        # Pillow holds the whole clip while writing the test GIF, and peak
+        # RSS carries over to child processes, so every step gets its own
+        with tempfile.NamedTemporaryFile(suffix='.gif') as clip:
+            subprocess.run([sys.executable, __file__, '--size', args.size, '--write', clip.name, str(frames)],
+                           check=True)
+            for output_format in args.formats.split(','):
+                subprocess.run([sys.executable, __file__, '--one', clip.name, output_format], env=env, check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Face blur latency and faces per second against image size.
+
+Usage (from the backend directory):
+    python benchmarks/face_blur_benchmark.py [--sizes 0.3,2,12,48] [--grid 3] [--max-edges 480,640,0]
+
+The test image is a grid of copies of scikit-image's astronaut portrait,
+scaled to each size, so every run has --grid squared faces to find. Detect
+is the cascade on the downscaled copy (max edge 0 detects at full
+resolution, for comparison); blur is the in-place blur of the detected
+regions. Faces per second counts the faces found over detect + blur time.
+"""
+import argparse
+
+import numpy as np
+
+from _common import best_of
+from utils.face_blur import FaceDetector, anonymize_regions
+from utils.lazy_imports import load
+
+
+def test_image(megapixels, grid):
+    from skimage import data
+
+    cv2 = load('cv2')
+    tile = np.tile(data.astronaut(), (grid, grid, 1))
+    edge = int((megapixels * 1e6) ** 0.5)
+    return cv2.resize(tile, (edge, edge), interpolation=cv2.INTER_AREA)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='0.3,2,12,48', help='comma-separated megapixel sizes')
+    parser.add_argument('--grid', type=int, default=3, help='portraits per row and column')
+    parser.add_argument('--max-edges', default='480,640,0', help='detection max edges; 0 is full resolution')
+    parser.add_argument('--method', choices=('blur', 'pixelate'), default='blur')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    detectors = {}
+    for max_edge in (int(edge) for edge in args.max_edges.split(',')):
+        detectors[max_edge] = FaceDetector(max_edge=max_edge or 10 ** 9)
+
+    print(f"{'MP':>6}{'max edge':>10}{'faces':>7}{'detect ms':>11}{'blur ms':>9}{'total ms':>10}{'faces/s':>9}")
+    for megapixels in sorted(float(size) for size in args.sizes.split(',')):
+        image = test_image(megapixels, args.grid)
+        for max_edge, detector in detectors.items():
+            # A full-resolution cascade on the largest sizes takes minutes
+            if not max_edge and megapixels > 12:
+                continue
+            boxes, detect = best_of(args.repeat, lambda: detector.detect(image))
+            # The copy is not part of the blur
+            _, blur = best_of(args.repeat, lambda work: anonymize_regions(work, boxes, args.method),
+                              prepare=image.copy)
+            total = detect + blur
+            print(f"{megapixels:>6g}{max_edge or 'full':>10}{len(boxes):>7}{detect * 1000:>11.1f}"
+                  f"{blur * 1000:>9.1f}{total * 1000:>10.1f}{len(boxes) / total:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+Time every /filters method at several image sizes and write diffable JSON.
+
+Usage (from the backend directory):
+    python benchmarks/filter_benchmark.py [--sizes 0.3,2,12,48] [--repeat 1] [--output results.json]
+    python benchmarks/filter_benchmark.py --sizes 0.3,2 --compare baseline.json
+
+Every method listed in utils.pipeline.FILTERS runs with the /filters
+defaults, and the kernel-size and iteration dependent ones also run at the
+top of their range. Each case runs through the ndarray functions in
+utils/image_processing.py on a seeded synthetic image, so results are
+reproducible. Time is the best of --repeat runs. Peak memory comes from
+tracemalloc, which sees numpy and OpenCV output buffers but not
+allocations made internally by OpenCV. A preset slower than --budget
+seconds is skipped at the larger sizes. With --compare, cases more than
+--tolerance times (and --min-delta-ms) slower than the baseline file are
+reported and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from _common import synthetic_frame
+from utils.pipeline import ARRAY_PROCESSORS, FILTERS
+
+# Key of the method list in FILTERS and the parameter it is passed as
+VARIANT_KEYS = {'methods': 'method', 'operations': 'operation', 'effects': 'effect'}
+
+# Extra presets that show how the kernel-size/iteration dependent methods scale
+SCALING_PRESETS = {
+    ('threshold', 'adaptive'): [{'block_size': 21}],
+    ('noise_reduction', 'gaussian'): [{'kernel_size': 15}],
+    ('noise_reduction', 'median'): [{'kernel_size': 15}],
+    ('noise_reduction', 'bilateral'): [{'kernel_size': 15}],
+    ('morphological', 'dilate'): [{'kernel_size': 15}, {'iterations': 10}],
+    ('morphological', 'erode'): [{'kernel_size': 15}, {'iterations': 10}],
+    ('morphological', 'opening'): [{'kernel_size': 15}],
+    ('morphological', 'closing'): [{'kernel_size': 15}],
+    ('morphological', 'gradient'): [{'kernel_size': 15}],
+    ('morphological', 'tophat'): [{'kernel_size': 15}],
+    ('morphological', 'blackhat'): [{'kernel_size': 15}]
+}
+
+
+def presets():
+    """Yield (name, operation type, params) for every benchmarked case."""
+    for op_type, spec in FILTERS.items():
+        list_key = next(key for key in VARIANT_KEYS if key in spec)
+        defaults = {name: value['default'] for name, value in spec['params'].items()}
+        for variant in spec[list_key]:
+            params = dict(defaults, **{VARIANT_KEYS[list_key]: variant})
+            yield f'{op_type}.{variant}', op_type, params
+            for overrides in SCALING_PRESETS.get((op_type, variant), []):
+                suffix = ','.join(f'{key}={value}' for key, value in overrides.items())
+                yield f'{op_type}.{variant}[{suffix}]', op_type, dict(params, **overrides)
+
+
+def run_case(frame, processor, params, repeat):
+    best = None
+    peak = 0
+    for _ in range(repeat):
+        # Processors may overwrite their input
+        work = frame.copy()
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = processor(work, **params)
+        elapsed = time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best = elapsed if best is None else min(best, elapsed)
+    result = np.asarray(result)
+    return {
+        'seconds': round(best, 6),
+        'peak_bytes': peak,
+        'output_shape': list(result.shape),
+        'output_dtype': str(result.dtype),
+        'output_bytes': int(result.nbytes)
+    }
+
+
+def environment():
+    versions = {'python': platform.python_version(), 'numpy': np.__version__, 'pillow': Image.__version__}
+    for name, module in (('opencv', 'cv2'), ('scikit-image', 'skimage')):
+        try:
+            versions[name] = __import__(module).__version__
+        except ImportError:
+            versions[name] = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'versions': versions
+    }
+
+
+def compare(results, baseline_path, tolerance, min_delta_ms):
+    with open(baseline_path) as f:
+        baseline = {case['id']: case for case in json.load(f)['results']}
+    regressions = 0
+    print(f"\n{'case':<58}{'old ms':>10}{'new ms':>10}{'ratio':>8}")
+    for case in results:
+        old = baseline.get(case['id'])
+        if not old or 'seconds' not in old or 'seconds' not in case:
+            continue
+        ratio = case['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        flag = ''
+        if ratio > tolerance and (case['seconds'] - old['seconds']) * 1000 > min_delta_ms:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{case['id']:<58}{old['seconds'] * 1000:>10.1f}{case['seconds'] * 1000:>10.1f}{ratio:>7.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='0.3,2,12,48', help='comma-separated megapixel sizes')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--budget', type=float, default=60, help='skip a preset at larger sizes after this many seconds')
+    parser.add_argument('--only', default='', help='only run cases whose name starts with this')
+    parser.add_argument('--output', default='filter_benchmark.json')
+    parser.add_argument('--compare', help='baseline JSON written by an earlier run')
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='ignore slowdowns smaller than this, which are timer noise')
+    args = parser.parse_args()
+
+    sizes = sorted(float(size) for size in args.sizes.split(','))
+    cases = [case for case in presets() if case[0].startswith(args.only)]
+    over_budget = {}
+    results = []
+
+    # Run every case once on a tiny frame so lazy imports (OpenCV,
+    # scikit-image submodules) are not timed
+    tiny = synthetic_frame(0.001)
+    for _, op_type, params in cases:
+        try:
+            ARRAY_PROCESSORS[op_type](tiny.copy(), **params)
+        except Exception:
+            pass
+
+    print(f"{'case':<58}{'MP':>6}{'ms':>11}{'peak MB':>9}")
+    for megapixels in sizes:
+        frame = synthetic_frame(megapixels)
+        for name, op_type, params in cases:
+            case = {
+                'id': f'{name}@{megapixels:g}MP',
+                'type': op_type,
+                'params': params,
+                'megapixels': megapixels,
+                'width': frame.shape[1],
+                'height': frame.shape[0]
+            }
+            if name in over_budget:
+                case['skipped'] = f'over budget at {over_budget[name]:g}MP'
+            else:
+                try:
+                    case.update(run_case(frame, ARRAY_PROCESSORS[op_type], params, args.repeat))
+                    if case['seconds'] > args.budget:
+                        over_budget[name] = megapixels
+                    print(f"{name:<58}{megapixels:>6g}{case['seconds'] * 1000:>11.1f}"
+                          f"{case['peak_bytes'] / 2 ** 20:>9.1f}")
+                except Exception as e:
+                    case['error'] = f'{type(e).__name__}: {e}'
+                    print(f"{name:<58}{megapixels:>6g}  error: {case['error']}")
+            results.append(case)
+        del frame
+
+    with open(args.output, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2, sort_keys=True)
+    print(f"\nWrote {len(results)} cases to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance, args.min_delta_ms)
+        print(f"\n{regressions} regression(s) over {args.tolerance:g}x")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+How morphology and blur cost scales with kernel size and iterations.
+
+Usage (from the backend directory):
+    python benchmarks/kernel_benchmark.py [--megapixels 12] [--kernels 3,5,9,15,31,61] [--repeat 3]
+    python benchmarks/kernel_benchmark.py --verify
+
+The first table times the ndarray functions in utils/image_processing.py
+for every kernel size; "us/tap" divides by the kernel width, so a flat
+column means linear (separable) cost and a falling one sub-linear cost.
+Morphology is also run with iterations, which OpenCV folds into one larger
+rectangle.
+
+--verify runs the alternative engines for large rectangular kernels
+against the current outputs and reports whether each is bit-exact and how
+fast it is:
+- collapsed: N iterations of a k x k rectangle as one rectangle of
+  N * (k - 1) + 1
+- separable: a 1 x k row pass followed by a k x 1 column pass
+- doubling: running min/max built from log2(k) cv2.max/cv2.min passes
+  over shifted views, whose cost barely depends on k
+- sepFilter2D: the Gaussian as two float 1-D passes; OpenCV's GaussianBlur
+  uses fixed-point arithmetic for uint8, so this one is not expected to match
+The exit status is 1 if an engine expected to be exact is not.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from _common import best_of, synthetic_frame
+from utils.image_processing import morphological_array, noise_reduction_array
+from utils.lazy_imports import load
+
+
+def scaling_cases(kernels):
+    """Yield (name, kernel size, function) for the scaling table."""
+    for k in kernels:
+        yield 'dilate', k, lambda a, k=k: morphological_array(a, 'dilate', k)
+        yield 'dilate x10', k, lambda a, k=k: morphological_array(a, 'dilate', k, 10)
+        yield 'opening', k, lambda a, k=k: morphological_array(a, 'opening', k)
+        if k <= 31:
+            yield 'gaussian', k, lambda a, k=k: noise_reduction_array(a, 'gaussian', k, 1.5)
+        if k <= 15:
+            yield 'median', k, lambda a, k=k: noise_reduction_array(a, 'median', k)
+
+
+def window(a, k, axis, op, neutral):
+    """op over a centred window of k along ``axis`` by doubling, with neutral borders like OpenCV."""
+    left = k // 2
+    pad = [(0, 0)] * a.ndim
+    pad[axis] = (left, k - 1 - left)
+    current = np.pad(a, pad, constant_values=neutral)
+
+    def span(array, start, length):
+        index = [slice(None)] * array.ndim
+        index[axis] = slice(start, start + length)
+        return array[tuple(index)]
+
+    width, length = 1, current.shape[axis]
+    while width * 2 <= k:
+        length -= width
+        current = op(span(current, 0, length), span(current, width, length))
+        width *= 2
+    # current[x] now covers [x, x + width); two overlapping spans cover k
+    return op(span(current, 0, a.shape[axis]), span(current, k - width, a.shape[axis]))
+
+
+def verify_cases(kernels):
+    """Yield (name, k, reference, engine, expect exact) for --verify."""
+    cv2 = load('cv2')
+    for k in kernels:
+        square = np.ones((k, k), np.uint8)
+        row, column = np.ones((1, k), np.uint8), np.ones((k, 1), np.uint8)
+        big = 10 * (k - 1) + 1
+        yield ('dilate x10 / collapsed', k,
+               lambda a, k=k: morphological_array(a, 'dilate', k, 10),
+               lambda a, big=big: cv2.dilate(a, np.ones((big, big), np.uint8)), True)
+        yield ('dilate / separable', k,
+               lambda a, square=square: cv2.dilate(a, square),
+               lambda a, row=row, column=column: cv2.dilate(cv2.dilate(a, row), column), True)
+        yield ('dilate / doubling', k,
+               lambda a, square=square: cv2.dilate(a, square),
+               lambda a, k=k: window(window(a, k, 1, cv2.max, 0), k, 0, cv2.max, 0), True)
+        yield ('erode / doubling', k,
+               lambda a, square=square: cv2.erode(a, square),
+               lambda a, k=k: window(window(a, k, 1, cv2.min, 255), k, 0, cv2.min, 255), True)
+        if k <= 31:
+            kernel = cv2.getGaussianKernel(k, 1.5)
+            yield ('gaussian / sepFilter2D', k,
+                   lambda a, k=k: cv2.GaussianBlur(a, (k, k), 1.5),
+                   lambda a, kernel=kernel: cv2.sepFilter2D(a, -1, kernel, kernel,
+                                                            borderType=cv2.BORDER_REFLECT_101), False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--megapixels', type=float, default=12)
+    parser.add_argument('--kernels', default='3,5,9,15,31,61', help='comma-separated kernel sizes')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--verify', action='store_true', help='compare alternative engines with the current outputs')
+    args = parser.parse_args()
+
+    kernels = [int(k) for k in args.kernels.split(',')]
+    frame = synthetic_frame(args.megapixels)
+    # Import OpenCV and warm its thread pool outside the timings
+    morphological_array(frame[:64, :64].copy())
+    print(f"{frame.shape[1]}x{frame.shape[0]} RGB, {load('cv2').getNumThreads()} OpenCV thread(s)\n")
+
+    if not args.verify:
+        print(f"{'case':<14}{'k':>5}{'ms':>10}{'us/tap':>10}")
+        for name, k, function in scaling_cases(kernels):
+            _, seconds = best_of(args.repeat, function, prepare=frame.copy)
+            print(f"{name:<14}{k:>5}{seconds * 1000:>10.1f}{seconds * 1e6 / k:>10.0f}")
+        return
+
+    failures = 0
+    print(f"{'engine':<26}{'k':>5}{'current ms':>12}{'engine ms':>11}{'exact':>7}")
+    for name, k, reference, engine, expect_exact in verify_cases(kernels):
+        expected, reference_seconds = best_of(args.repeat, reference, prepare=frame.copy)
+        result, engine_seconds = best_of(args.repeat, engine, prepare=frame.copy)
+        exact = result.shape == expected.shape and np.array_equal(result, expected)
+        if expect_exact and not exact:
+            failures += 1
+        print(f"{name:<26}{k:>5}{reference_seconds * 1000:>12.1f}{engine_seconds * 1000:>11.1f}"
+              f"{'yes' if exact else 'no':>7}")
+    print(f"\n{failures} engine(s) expected to be exact differ from the current output")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Load-test a running server and report requests per second and latency.
+
+Usage (from the backend directory, with the server already running):
+    python benchmarks/load_test.py [--url http://127.0.0.1:5000] [--scenario process]
+                                   [--concurrency 8] [--duration 20]
+
+Scenarios:
+- test: GET /test, the framework overhead alone
+- filters: GET /filters
+- process: POST /process with a base64 image and a short filter chain; each
+  request uses a different image so the result cache is not hit
+- binary: the same chain posted as raw image bytes
+
+Each client thread keeps one HTTP/1.1 connection open. Compare
+``python app.py`` with ``python serve.py`` at the same concurrency.
+"""
+import argparse
+import base64
+import http.client
+import io
+import itertools
+import json
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+from PIL import Image
+
+CHAIN = [
+    {'type': 'noise_reduction', 'params': {'method': 'gaussian', 'kernel_size': 5}},
+    {'type': 'threshold', 'params': {'method': 'otsu'}}
+]
+
+
+def image_bytes(seed, megapixels):
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(seed)
+    buffer = io.BytesIO()
+    Image.fromarray(rng.integers(0, 255, (height, width, 3), dtype=np.uint8)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def make_request(scenario, counter, megapixels):
+    """Return (method, path, body, headers) for the next request of a scenario."""
+    if scenario == 'test':
+        return 'GET', '/test', None, {}
+    if scenario == 'filters':
+        return 'GET', '/filters', None, {}
+    data = image_bytes(next(counter), megapixels)
+    if scenario == 'binary':
+        path = '/process?operations=' + urllib.parse.quote(json.dumps(CHAIN))
+        return 'POST', path, data, {'Content-Type': 'image/jpeg'}
+    body = json.dumps({'image': base64.b64encode(data).decode(), 'operations': CHAIN})
+    return 'POST', '/process', body, {'Content-Type': 'application/json'}
+
+
+def client(url, scenario, megapixels, deadline, counter, latencies, errors, lock):
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=120)
+    while time.perf_counter() < deadline:
+        method, path, body, headers = make_request(scenario, counter, megapixels)
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            ok = False
+            connection.close()
+            connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=120)
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors.append(elapsed)
+    connection.close()
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--scenario', choices=('test', 'filters', 'process', 'binary'), default='process')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--megapixels', type=float, default=0.3, help='image size for the process scenarios')
+    args = parser.parse_args()
+
+    url = urllib.parse.urlparse(args.url)
+    # Image seeds; itertools.count is safe to share between threads
+    counter = itertools.count()
+    latencies, errors, lock = [], [], threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=client, args=(url, args.scenario, args.megapixels, deadline,
+                                              counter, latencies, errors, lock))
+        for _ in range(args.concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{args.scenario} x{args.concurrency} for {elapsed:.1f}s against {args.url}")
+    print(f"{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    print(f"{len(latencies):>10}{len(errors):>8}{len(latencies) / elapsed:>9.1f}"
+          f"{percentile(latencies, 0.5) * 1000:>9.1f}{percentile(latencies, 0.95) * 1000:>9.1f}"
+          f"{percentile(latencies, 0.99) * 1000:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Compare the legacy PIL-per-step /process chain with the fused ndarray pipeline.
+
+Usage (from the backend directory):
+    python benchmarks/pipeline_benchmark.py [--megapixels 12] [--repeat 3]
+
+For every step it reports wall time, the bytes still held when the step
+returns and the peak allocation during the step. Both are tracked with
+tracemalloc: numpy and OpenCV output buffers go through the Python
+allocator and show up here, PIL's own image buffers do not.
+"""
+import argparse
+
+import numpy as np
+from PIL import Image
+
+from _common import measure, synthetic_frame
+from utils.image_processing import (
+    apply_noise_reduction,
+    apply_morphological_operation,
+    apply_color_transformation,
+    apply_special_effect
+)
+from utils.pipeline import ARRAY_PROCESSORS, image_to_frame, frame_to_image
+
+CHAIN = [
+    {'type': 'noise_reduction', 'params': {'method': 'gaussian', 'kernel_size': 5, 'sigma': 1.5}},
+    {'type': 'noise_reduction', 'params': {'method': 'median', 'kernel_size': 5}},
+    {'type': 'morphological', 'params': {'operation': 'dilate', 'kernel_size': 3, 'iterations': 1}},
+    {'type': 'color_transformation', 'params': {'method': 'gamma', 'gamma': 1.2}},
+    {'type': 'special_effect', 'params': {'effect': 'pixelate', 'strength': 0.2}},
+]
+
+LEGACY_PROCESSORS = {
+    'noise_reduction': apply_noise_reduction,
+    'morphological': apply_morphological_operation,
+    'color_transformation': apply_color_transformation,
+    'special_effect': apply_special_effect
+}
+
+
+def run_legacy(image):
+    steps = []
+    for operation in CHAIN:
+        processor = LEGACY_PROCESSORS[operation['type']]
+        image, elapsed, current, peak = measure(lambda: processor(image, **operation['params']))
+        steps.append((elapsed, current, peak))
+    return image, steps
+
+
+def run_fused(image):
+    steps = []
+    frame, elapsed, current, peak = measure(lambda: image_to_frame(image))
+    steps.append(('to ndarray', elapsed, current, peak))
+    for operation in CHAIN:
+        processor = ARRAY_PROCESSORS[operation['type']]
+        frame, elapsed, current, peak = measure(lambda: processor(frame, **operation['params']))
+        steps.append((operation['params'].get('method') or operation['params'].get('operation')
+                      or operation['params'].get('effect'), elapsed, current, peak))
+    image, elapsed, current, peak = measure(lambda: frame_to_image(frame))
+    steps.append(('to PIL', elapsed, current, peak))
+    return image, steps
+
+
+def mb(n):
+    return n / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--megapixels', type=float, default=12)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    image = Image.fromarray(synthetic_frame(args.megapixels))
+    print(f"Input: {image.width}x{image.height} ({image.width * image.height / 1e6:.1f} MP)\n")
+
+    legacy_best = fused_best = None
+    for _ in range(args.repeat):
+        legacy_out, legacy = run_legacy(image)
+        fused_out, fused = run_fused(image)
+        if legacy_best is None or sum(s[0] for s in legacy) < sum(s[0] for s in legacy_best):
+            legacy_best = legacy
+        if fused_best is None or sum(s[1] for s in fused) < sum(s[1] for s in fused_best):
+            fused_best = fused
+
+    if not np.array_equal(np.asarray(legacy_out), np.asarray(fused_out)):
+        print("WARNING: fused output differs from legacy output")
+
+    print("Legacy chain (PIL -> ndarray -> PIL per step)")
+    print(f"{'step':<14}{'ms':>10}{'retained MB':>13}{'peak MB':>12}")
+    for operation, (elapsed, current, peak) in zip(CHAIN, legacy_best):
+        name = list(operation['params'].values())[0]
+        print(f"{name:<14}{elapsed * 1000:>10.1f}{mb(current):>13.1f}{mb(peak):>12.1f}")
+    print(f"{'total':<14}{sum(s[0] for s in legacy_best) * 1000:>10.1f}"
+          f"{mb(sum(s[1] for s in legacy_best)):>13.1f}\n")
+
+    print("Fused chain (single ndarray)")
+    print(f"{'step':<14}{'ms':>10}{'retained MB':>13}{'peak MB':>12}")
+    for name, elapsed, current, peak in fused_best:
+        print(f"{name:<14}{elapsed * 1000:>10.1f}{mb(current):>13.1f}{mb(peak):>12.1f}")
+    print(f"{'total':<14}{sum(s[1] for s in fused_best) * 1000:>10.1f}"
+          f"{mb(sum(s[2] for s in fused_best)):>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+First-request latency and steady-state throughput of background removal.
+
+Usage (from the backend directory):
+    python benchmarks/rembg_benchmark.py [--images 32] [--clients 4] [--batch-sizes 1,4]
+
+Each configuration runs in a fresh interpreter so the first request really
+is cold. The "cold" column includes importing rembg and building the session;
+"warm first" is the first request after background_removal.warm_up().
+REMBG_THREADS and REMBG_SESSIONS from the environment are passed through.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from _common import BACKEND_DIR
+
+
+def synthetic_images(count, size=(1024, 768)):
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    images = []
+    for i in range(count):
+        array = np.full((size[1], size[0], 3), 230, dtype=np.uint8)
+        cx, cy = size[0] // 2 + i % 50, size[1] // 2
+        yy, xx = np.ogrid[:size[1], :size[0]]
+        subject = (xx - cx) ** 2 / 300 ** 2 + (yy - cy) ** 2 / 250 ** 2 < 1
+        array[subject] = rng.integers(0, 120, size=(int(subject.sum()), 3), dtype=np.uint8)
+        images.append(Image.fromarray(array))
+    return images
+
+
+def run_child(images_count, clients, warm):
+    images = synthetic_images(images_count + 1)
+
+    start = time.perf_counter()
+    from utils import background_removal
+    if warm:
+        background_removal.warm_up()
+        start = time.perf_counter()
+    background_removal.remove_background(images[0])
+    first_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(background_removal.remove_background, images[1:]))
+    elapsed = time.perf_counter() - start
+
+    stats = background_removal.stats()
+    print(json.dumps({
+        'first_ms': first_ms,
+        'images_per_s': images_count / elapsed,
+        'inferences': stats['inferences'],
+        'load_ms': stats['load_ms']
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--images', type=int, default=32)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--batch-sizes', default='1,4')
+    parser.add_argument('--child', choices=['cold', 'warm'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.images, args.clients, args.child == 'warm')
+        return
+
+    print(f"{'batch':>6}{'mode':>7}{'first ms':>11}{'images/s':>10}{'inferences':>12}{'load ms':>10}")
+    for batch_size in [int(b) for b in args.batch_sizes.split(',')]:
+        for mode in ('cold', 'warm'):
+            env = dict(os.environ, REMBG_BATCH_SIZE=str(batch_size))
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', mode,
+                 '--images', str(args.images), '--clients', str(args.clients)],
+                cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True
+            ).stdout
+            r = json.loads(output.strip().splitlines()[-1])
+            print(f"{batch_size:>6}{mode:>7}{r['first_ms']:>11.1f}{r['images_per_s']:>10.2f}"
+                  f"{r['inferences']:>12}{sum(r['load_ms']):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
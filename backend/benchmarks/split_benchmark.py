@@ -0,0 +1,115 @@
+"""
+How split /process steps scale from 1 to N threads.
+
+Usage (from the backend directory):
+    python benchmarks/split_benchmark.py [--megapixels 12] [--threads 1,2,4,8] [--concurrent 1,2,4] [--repeat 3]
+
+The first table runs every splittable step (utils/parallel.py) through a
+StepSplitter with each thread budget and reports the time, the speedup over
+one thread and whether the output equals the unsplit step exactly; the exit
+status is 1 if any differs. Threads beyond the CPUs this process may use
+cannot speed anything up.
+
+The second table runs --concurrent requests at once, each splitting a Sobel
+step, against one shared splitter with the largest thread budget. Wall time
+should stay close to the single-request time times requests / threads,
+rather than growing from oversubscription, and "split" counts the steps
+that got more than one thread.
+"""
+import argparse
+import sys
+import threading
+import time
+
+import numpy as np
+
+from _common import best_of, synthetic_frame
+from utils.batch import default_workers
+from utils.parallel import StepSplitter, split_kind
+from utils.pipeline import apply_step
+
+CASES = [
+    {'type': 'edge_detection', 'params': {'method': 'sobel'}},
+    {'type': 'edge_detection', 'params': {'method': 'prewitt'}},
+    {'type': 'edge_detection', 'params': {'method': 'roberts'}},
+    {'type': 'edge_detection', 'params': {'method': 'laplace'}},
+    {'type': 'noise_reduction', 'params': {'method': 'wavelet'}},
+]
+
+
+def scaling(frame, thread_counts, repeat):
+    print(f"{'operation':<28}{'split':>8}" + ''.join(f"{f'{n} thr ms':>12}" for n in thread_counts)
+          + f"{'speedup':>9}  equal")
+    mismatches = 0
+    for operation in CASES:
+        whole = apply_step(frame.copy(), operation)
+        times = []
+        equal = True
+        for threads in thread_counts:
+            splitter = StepSplitter(threads, min_megapixels=0)
+            result, seconds = best_of(repeat, lambda: apply_step(frame.copy(), operation, splitter=splitter))
+            equal = equal and result.shape == whole.shape and np.array_equal(result, whole)
+            times.append(seconds)
+        mismatches += not equal
+        name = f"{operation['type']}:{operation['params']['method']}"
+        print(f"{name:<28}{split_kind(operation['type'], operation['params']):>8}"
+              + ''.join(f"{seconds * 1000:>12.1f}" for seconds in times)
+              + f"{times[0] / times[-1]:>8.2f}x  {'yes' if equal else 'NO'}")
+    return mismatches
+
+
+def contention(frame, threads, request_counts):
+    operation = CASES[0]
+    print(f"\n{threads}-thread splitter shared by concurrent requests ({operation['params']['method']})\n")
+    print(f"{'requests':>9}{'wall ms':>10}{'ms/request':>12}{'split':>7}{'whole':>7}")
+    for requests in request_counts:
+        splitter = StepSplitter(threads, min_megapixels=0)
+        barrier = threading.Barrier(requests)
+
+        def request():
+            barrier.wait()
+            apply_step(frame.copy(), operation, splitter=splitter)
+
+        workers = [threading.Thread(target=request) for _ in range(requests)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        stats = splitter.stats()
+        print(f"{requests:>9}{elapsed * 1000:>10.1f}{elapsed * 1000 / requests:>12.1f}"
+              f"{stats['split_steps']:>7}{stats['contended_steps']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--megapixels', type=float, default=12)
+    parser.add_argument('--threads', default=None,
+                        help='comma-separated thread budgets (default: powers of two up to the CPUs)')
+    parser.add_argument('--concurrent', default='1,2,4', help='comma-separated concurrent request counts')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    cpus = default_workers()
+    if args.threads:
+        thread_counts = [int(count) for count in args.threads.split(',')]
+    else:
+        thread_counts = [1]
+        while thread_counts[-1] * 2 <= cpus:
+            thread_counts.append(thread_counts[-1] * 2)
+        if thread_counts[-1] != cpus:
+            thread_counts.append(cpus)
+
+    frame = synthetic_frame(args.megapixels)
+    print(f"Input: {frame.shape[1]}x{frame.shape[0]}, {cpus} CPU(s) available\n")
+    mismatches = scaling(frame, thread_counts, args.repeat)
+    contention(frame, thread_counts[-1], [int(count) for count in args.concurrent.split(',')])
+
+    if mismatches:
+        print(f"\n{mismatches} operation(s) differ between split and whole execution")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Measure thumbnail and preview latency with and without reduced-scale decoding.
+
+Usage (from the backend directory):
+    python benchmarks/thumbnail_benchmark.py [--megapixels 24] [--repeat 3]
+
+Thumbnails compare the previous path (full decode, then resize) with a JPEG
+draft decode at the scale decode_size picks. Previews compare a full-resolution
+/process chain with the same chain on a proxy of the given longest edge.
+PSNR is between each pair of outputs.
+"""
+import argparse
+import io
+
+import numpy as np
+from PIL import Image
+
+from _common import best_of
+from utils.operations import decode_size
+from utils.pipeline import run_pipeline
+
+THUMBNAIL_EDGES = (160, 320, 1024)
+PREVIEW_EDGES = (512, 1024)
+PREVIEW_CHAIN = [
+    {'type': 'noise_reduction', 'params': {'method': 'gaussian', 'kernel_size': 5}},
+    {'type': 'color_transformation', 'params': {'method': 'gamma', 'gamma': 1.2}}
+]
+
+
+def psnr(a, b):
+    mse = np.mean((np.asarray(a, dtype=np.float32) - np.asarray(b, dtype=np.float32)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+
+def thumbnail_full(data, size):
+    return Image.open(io.BytesIO(data)).resize(size)
+
+
+def thumbnail_draft(data, size):
+    img = Image.open(io.BytesIO(data))
+    draft = decode_size('resize', img.width, img.height, width=size[0], height=size[1])
+    if draft:
+        img.draft(img.mode, draft)
+    return img.resize(size, reducing_gap=3.0)
+
+
+def preview(data, edge):
+    img = Image.open(io.BytesIO(data))
+    if edge:
+        img.thumbnail((edge, edge))
+    return run_pipeline(img.convert('RGB'), PREVIEW_CHAIN)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--megapixels', type=float, default=24)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    width = int((args.megapixels * 1e6 * 3 / 2) ** 0.5)
+    height = int(width * 2 / 3)
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 200, width, dtype=np.float32)
+    y = np.linspace(0, 200, height, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(base + rng.integers(0, 55, size=base.shape, dtype=np.uint8)).save(buffer, 'JPEG', quality=90)
+    data = buffer.getvalue()
+
+    # Import OpenCV before timing anything
+    preview(data, 64)
+
+    print(f"Source: {width}x{height} JPEG, {len(data) / 2 ** 20:.1f} MB, best of {args.repeat}\n")
+    print(f"{'thumbnail':<12}{'full ms':>10}{'draft ms':>10}{'speedup':>9}{'PSNR dB':>9}")
+    for edge in THUMBNAIL_EDGES:
+        size = (edge, max(1, round(edge * height / width)))
+        old, old_s = best_of(args.repeat, lambda: thumbnail_full(data, size))
+        new, new_s = best_of(args.repeat, lambda: thumbnail_draft(data, size))
+        print(f"{f'{size[0]}x{size[1]}':<12}{old_s * 1000:>10.1f}{new_s * 1000:>10.1f}"
+              f"{old_s / new_s:>8.1f}x{psnr(old, new):>9.1f}")
+
+    full, full_s = best_of(args.repeat, lambda: preview(data, None))
+    print(f"\n{'preview':<12}{'ms':>10}{'speedup':>9}{'PSNR dB':>9}")
+    print(f"{'full':<12}{full_s * 1000:>10.1f}{1:>8.1f}x{'-':>9}")
+    for edge in PREVIEW_EDGES:
+        proxy, proxy_s = best_of(args.repeat, lambda: preview(data, edge))
+        print(f"{edge:<12}{proxy_s * 1000:>10.1f}{full_s / proxy_s:>8.1f}x"
+              f"{psnr(proxy, full.resize(proxy.size, reducing_gap=3.0)):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
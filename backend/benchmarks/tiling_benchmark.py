@@ -0,0 +1,74 @@
+"""
+Check tiled execution against whole-image execution and compare their cost.
+
+Usage (from the backend directory):
+    python benchmarks/tiling_benchmark.py [--megapixels 12] [--memory-mb 16]
+
+For every tileable filter the tiled output must equal the whole-image output
+exactly; the script exits non-zero if any differs. Peak allocation is tracked
+with tracemalloc and does not include the input frame. The "tiled" column
+says whether /process tiles the step: filters that run in place allocate
+nothing whole, so tiling them only costs memory and time.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from _common import measure, synthetic_frame
+from utils.pipeline import ARRAY_PROCESSORS
+from utils.tiling import run_tiled, tile_halo, worth_tiling
+
+CASES = [
+    ('noise_reduction', {'method': 'gaussian', 'kernel_size': 15, 'sigma': 3.0}),
+    ('noise_reduction', {'method': 'median', 'kernel_size': 5}),
+    ('noise_reduction', {'method': 'bilateral', 'kernel_size': 9}),
+    ('morphological', {'operation': 'dilate', 'kernel_size': 5, 'iterations': 3}),
+    ('morphological', {'operation': 'erode', 'kernel_size': 7, 'iterations': 1}),
+    ('morphological', {'operation': 'opening', 'kernel_size': 5}),
+    ('morphological', {'operation': 'closing', 'kernel_size': 5}),
+    ('morphological', {'operation': 'gradient', 'kernel_size': 5}),
+    ('morphological', {'operation': 'tophat', 'kernel_size': 9}),
+    ('morphological', {'operation': 'blackhat', 'kernel_size': 9}),
+    ('edge_detection', {'method': 'sobel'}),
+    ('edge_detection', {'method': 'prewitt'}),
+    ('edge_detection', {'method': 'roberts'}),
+    ('edge_detection', {'method': 'laplace'}),
+    ('threshold', {'method': 'binary', 'threshold': 100}),
+    ('threshold', {'method': 'adaptive', 'block_size': 15, 'c': 2}),
+    ('threshold', {'method': 'otsu'}),
+    ('threshold', {'method': 'triangle'}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--megapixels', type=float, default=12)
+    parser.add_argument('--memory-mb', type=int, default=16)
+    args = parser.parse_args()
+
+    frame = synthetic_frame(args.megapixels)
+    print(f"Input: {frame.shape[1]}x{frame.shape[0]}, tile memory {args.memory_mb} MB\n")
+    print(f"{'operation':<34}{'halo':>5}{'whole ms':>10}{'tiled ms':>10}"
+          f"{'whole MB':>10}{'tiled MB':>10}  tiled  equal")
+
+    mismatches = 0
+    for op_type, params in CASES:
+        processor = ARRAY_PROCESSORS[op_type]
+        whole, whole_s, _, whole_peak = measure(lambda: processor(frame.copy(), **params))
+        tiled, tiled_s, _, tiled_peak = measure(
+            lambda: run_tiled(frame, op_type, params, processor, args.memory_mb))
+        equal = whole.shape == tiled.shape and np.array_equal(whole, tiled)
+        mismatches += not equal
+        name = f"{op_type}:{list(params.values())[0]}"
+        print(f"{name:<34}{tile_halo(op_type, params):>5}{whole_s * 1000:>10.1f}{tiled_s * 1000:>10.1f}"
+              f"{whole_peak / 2 ** 20:>10.1f}{tiled_peak / 2 ** 20:>10.1f}"
+              f"  {'yes' if worth_tiling(op_type, params) else 'no':<5}  {'yes' if equal else 'NO'}")
+
+    if mismatches:
+        print(f"\n{mismatches} operation(s) differ between tiled and whole-image execution")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Compare the JSON/base64 and binary transports of /process.
+
+Usage (from the backend directory):
+    python benchmarks/transport_benchmark.py [--megapixels 12] [--repeat 5]
+
+Each transport runs in its own subprocess so the reported peak RSS is not
+polluted by the other one. Requests go through Flask's test client with the
+result cache disabled, so every request decodes, filters and encodes.
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from _common import BACKEND_DIR
+
+OPERATIONS = [{'type': 'noise_reduction', 'params': {'method': 'gaussian', 'kernel_size': 5, 'sigma': 1.5}}]
+
+
+def synthetic_png(megapixels):
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(0)
+    image = Image.fromarray(rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8))
+    buffered = io.BytesIO()
+    image.save(buffered, format='PNG', compress_level=1)
+    return buffered.getvalue()
+
+
+def run_child(mode, megapixels, repeat):
+    os.environ['RESULT_CACHE_MAX_MB'] = '0'
+    import base64
+    import app as backend_app
+
+    client = backend_app.app.test_client()
+    payload = synthetic_png(megapixels)
+    body = 'data:image/png;base64,' + base64.b64encode(payload).decode() if mode == 'json' else None
+
+    timings = []
+    peaks = []
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        if mode == 'json':
+            response = client.post('/process', json={'image': body, 'operations': OPERATIONS})
+            sent, received = len(body), len(response.data)
+        else:
+            response = client.post('/process?operations=' + json.dumps(OPERATIONS),
+                                   data=payload, content_type='image/png')
+            sent, received = len(payload), len(response.data)
+        timings.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        assert response.status_code == 200, response.data[:200]
+
+    print(json.dumps({
+        'mode': mode,
+        'sent_bytes': sent,
+        'received_bytes': received,
+        'best_ms': min(timings) * 1000,
+        'mean_ms': sum(timings) / len(timings) * 1000,
+        'traced_peak_mb': max(peaks) / (1024 * 1024),
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--megapixels', type=float, default=12)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--mode', choices=['json', 'binary'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_child(args.mode, args.megapixels, args.repeat)
+        return
+
+    print(f"{'mode':<8}{'sent MB':>10}{'recv MB':>10}{'best ms':>10}{'mean ms':>10}"
+          f"{'traced MB':>11}{'RSS MB':>10}")
+    for mode in ('json', 'binary'):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--mode', mode,
+             '--megapixels', str(args.megapixels), '--repeat', str(args.repeat)],
+            cwd=BACKEND_DIR, check=True, capture_output=True, text=True
+        ).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(f"{r['mode']:<8}{r['sent_bytes'] / 2 ** 20:>10.1f}{r['received_bytes'] / 2 ** 20:>10.1f}"
+              f"{r['best_ms']:>10.1f}{r['mean_ms']:>10.1f}{r['traced_peak_mb']:>11.1f}{r['max_rss_mb']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Compare the OpenCV upscale engine with the previous scikit-image path.
+
+Usage (from the backend directory):
+    python benchmarks/upscale_benchmark.py [--megapixels 2] [--scale 2]
+
+The previous path ran skimage.transform.resize (float64 output, orders 0/1/3/5)
+and scaled the result back to uint8. Peak allocation is tracked with
+tracemalloc; PSNR is between the two outputs.
+"""
+import argparse
+
+import numpy as np
+from PIL import Image
+
+from _common import measure
+from utils.upscale import UPSCALE_METHODS, upscale_image
+
+
+def skimage_upscale(img, scale, method):
+    from skimage.transform import resize
+
+    width = round(img.width * scale)
+    height = round(img.height * scale)
+    resized_array = resize(np.array(img), (height, width), order={
+        'nearest': 0,
+        'bilinear': 1,
+        'bicubic': 3,
+        'lanczos': 5
+    }[method], anti_aliasing=True)
+    return Image.fromarray((resized_array * 255).astype(np.uint8))
+
+
+def psnr(a, b):
+    mse = np.mean((np.asarray(a, dtype=np.float32) - np.asarray(b, dtype=np.float32)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--megapixels', type=float, default=2)
+    parser.add_argument('--scale', type=float, default=2)
+    args = parser.parse_args()
+
+    width = int((args.megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 200, width, dtype=np.float32)
+    y = np.linspace(0, 200, height, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1).astype(np.uint8)
+    img = Image.fromarray(base + rng.integers(0, 55, size=base.shape, dtype=np.uint8))
+
+    # Import OpenCV and scikit-image before timing anything
+    upscale_image(img.resize((8, 8)), 2)
+    skimage_upscale(img.resize((8, 8)), 2, 'nearest')
+
+    print(f"Input: {width}x{height}, scale {args.scale}\n")
+    print(f"{'method':<10}{'skimage ms':>12}{'opencv ms':>11}{'skimage MB':>12}{'opencv MB':>11}{'PSNR dB':>9}")
+    for method in UPSCALE_METHODS:
+        old, old_s, _, old_peak = measure(lambda: skimage_upscale(img, args.scale, method))
+        new, new_s, _, new_peak = measure(lambda: upscale_image(img, args.scale, method))
+        print(f"{method:<10}{old_s * 1000:>12.1f}{new_s * 1000:>11.1f}{old_peak / 2 ** 20:>12.1f}"
+              f"{new_peak / 2 ** 20:>11.1f}{psnr(old, new):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Production server: the app preloaded into a pool of prefork gunicorn workers.
+
+Usage (from the backend directory):
+    python serve.py
+
+Configuration (environment):
+- BIND: address to listen on (default 0.0.0.0:$PORT, PORT defaults to 5000)
+- WEB_WORKERS: worker processes (default: one per CPU this process may use)
+- WEB_THREADS: request threads per worker (default 2)
+- WEB_TIMEOUT: seconds before a silent worker is restarted (default 120)
+- WEB_MAX_REQUESTS: recycle a worker after this many requests (default 0, never)
+- NATIVE_THREADS: OpenCV/BLAS/OpenMP/onnxruntime threads per worker
+  (default: CPUs divided by workers, at least 1)
+- WEB_PIN_WORKERS=1: pin each worker to its own slice of the CPUs; a worker
+  restarted after a crash or WEB_MAX_REQUESTS takes over the free slice
+
+Workers x native threads is kept within the CPUs so one busy request cannot
+starve the others. /batch process pools and the /process frame pool for
+animations and video default to NATIVE_THREADS workers for the same reason,
+as does the thread budget for splitting single /process steps.
+The native thread caps have to be in the environment before numpy and
+OpenCV are imported, so they are set before the app is.
+
+Caches, metrics and background jobs are per worker. A /jobs id is only
+known to the worker that accepted it, so without sticky sessions use
+WEB_WORKERS=1 with more WEB_THREADS when clients poll jobs.
+"""
+import os
+import sys
+
+def available_cpus():
+    """CPUs this process may run on, honouring taskset and container cpusets."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+CPUS = available_cpus()
+WORKERS = int(os.getenv('WEB_WORKERS', 0)) or len(CPUS)
+THREADS = int(os.getenv('WEB_THREADS', 2))
+NATIVE_THREADS = int(os.getenv('NATIVE_THREADS', 0)) or max(1, len(CPUS) // WORKERS)
+
+for name in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+             'VECLIB_MAXIMUM_THREADS', 'OPENCV_FOR_THREADS_NUM', 'REMBG_THREADS', 'BATCH_WORKERS',
+             'FRAME_WORKERS', 'SPLIT_THREADS'):
+    os.environ.setdefault(name, str(NATIVE_THREADS))
+
+PIN_CPUS = max(1, len(CPUS) // WORKERS)
+
+def pre_fork(server, worker):
+    # Runs in the master, which knows the live workers: the new one (first
+    # start, crash or recycle alike) takes the slice the fewest of them use
+    used = [0] * max(1, len(CPUS) // PIN_CPUS)
+    for live in server.WORKERS.values():
+        if getattr(live, 'cpu_slot', None) is not None:
+            used[live.cpu_slot] += 1
+    worker.cpu_slot = used.index(min(used))
+
+def post_fork(server, worker):
+    if os.getenv('WEB_PIN_WORKERS') == '1' and hasattr(os, 'sched_setaffinity'):
+        first = worker.cpu_slot * PIN_CPUS
+        os.sched_setaffinity(0, CPUS[first:first + PIN_CPUS])
+    # OpenCV imported by the master (PRELOAD_OPERATIONS) keeps its own thread count
+    if 'cv2' in sys.modules:
+        sys.modules['cv2'].setNumThreads(int(os.environ['OPENCV_FOR_THREADS_NUM']))
+
+def options():
+    return {
+        'bind': os.getenv('BIND', f"0.0.0.0:{os.getenv('PORT', 5000)}"),
+        'workers': WORKERS,
+        'threads': THREADS,
+        'worker_class': 'gthread' if THREADS > 1 else 'sync',
+        'timeout': int(os.getenv('WEB_TIMEOUT', 120)),
+        'max_requests': int(os.getenv('WEB_MAX_REQUESTS', 0)),
+        'max_requests_jitter': int(os.getenv('WEB_MAX_REQUESTS', 0)) // 10,
+        'preload_app': True,
+        'pre_fork': pre_fork,
+        'post_fork': post_fork,
+        'accesslog': os.getenv('WEB_ACCESS_LOG') or None
+    }
+
+def main():
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("gunicorn is not installed (pip install gunicorn); it is not available on Windows, "
+              "use 'python app.py' there for development")
+        sys.exit(1)
+
+    class ServeApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options().items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import app
+            return app
+
+    print(f"Serving with {WORKERS} worker(s) x {THREADS} thread(s), "
+          f"{NATIVE_THREADS} native thread(s) per worker on CPUs {CPUS}")
+    ServeApplication().run()
+
+if __name__ == '__main__':
+    main()
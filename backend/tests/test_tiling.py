@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from utils.pipeline import ARRAY_PROCESSORS, apply_step
+from utils.tiling import TilingPolicy, iter_strips, run_regions, run_tiled, tile_halo, tile_size, worth_tiling
+
+# Small enough that a 300x220 frame is cut into several tiles with borders on every side
+MEMORY_MB = 0.05
+
+CASES = [
+    ('noise_reduction', {'method': 'gaussian', 'kernel_size': 15, 'sigma': 3.0}),
+    ('noise_reduction', {'method': 'median', 'kernel_size': 5}),
+    ('noise_reduction', {'method': 'bilateral', 'kernel_size': 9}),
+    ('morphological', {'operation': 'dilate', 'kernel_size': 5, 'iterations': 3}),
+    ('morphological', {'operation': 'erode', 'kernel_size': 7, 'iterations': 1}),
+    ('morphological', {'operation': 'opening', 'kernel_size': 5}),
+    ('morphological', {'operation': 'closing', 'kernel_size': 5}),
+    ('morphological', {'operation': 'gradient', 'kernel_size': 5}),
+    ('morphological', {'operation': 'tophat', 'kernel_size': 9}),
+    ('morphological', {'operation': 'blackhat', 'kernel_size': 9}),
+    ('edge_detection', {'method': 'sobel'}),
+    ('edge_detection', {'method': 'prewitt'}),
+    ('edge_detection', {'method': 'roberts'}),
+    ('edge_detection', {'method': 'laplace'}),
+    ('threshold', {'method': 'binary', 'threshold': 100}),
+    ('threshold', {'method': 'adaptive', 'block_size': 15, 'c': 2}),
+    ('threshold', {'method': 'otsu'}),
+    ('threshold', {'method': 'triangle'}),
+]
+
+def case_id(case):
+    op_type, params = case
+    return f"{op_type}:{list(params.values())[0]}"
+
+@pytest.fixture(params=['rgb', 'gray'])
+def frame(request):
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 200, 300, dtype=np.float32)
+    y = np.linspace(0, 200, 220, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1).astype(np.uint8)
+    frame = base + rng.integers(0, 55, size=base.shape, dtype=np.uint8)
+    return frame if request.param == 'rgb' else np.ascontiguousarray(frame[..., 0])
+
+def whole(frame, op_type, params):
+    return ARRAY_PROCESSORS[op_type](frame.copy(), **params)
+
+@pytest.mark.parametrize('case', CASES, ids=case_id)
+def test_tiled_matches_whole(frame, case):
+    op_type, params = case
+    channels = frame.shape[2] if frame.ndim == 3 else 1
+    assert tile_size(MEMORY_MB, op_type, channels, tile_halo(op_type, params)) < min(frame.shape[:2])
+
+    expected = whole(frame, op_type, params)
+    tiled = run_tiled(frame, op_type, params, ARRAY_PROCESSORS[op_type], MEMORY_MB)
+    assert tiled.shape == expected.shape
+    assert np.array_equal(tiled, expected)
+
+@pytest.mark.parametrize('case', CASES, ids=case_id)
+def test_strips_match_whole(frame, case):
+    op_type, params = case
+    expected = whole(frame, op_type, params)
+    regions = iter_strips(frame.shape[0], frame.shape[1], 4)
+    assert np.array_equal(run_regions(frame, op_type, params, ARRAY_PROCESSORS[op_type], regions), expected)
+
+def test_tiling_leaves_the_input_alone(frame):
+    original = frame.copy()
+    run_tiled(frame, 'morphological', {'operation': 'dilate', 'kernel_size': 5}, ARRAY_PROCESSORS['morphological'],
+              MEMORY_MB)
+    assert np.array_equal(frame, original)
+
+@pytest.mark.parametrize('op_type, params', [
+    ('edge_detection', {'method': 'canny'}),
+    ('noise_reduction', {'method': 'nlmeans'}),
+    ('color_transformation', {'method': 'grayscale'}),
+])
+def test_global_operations_are_not_tiled(op_type, params):
+    assert tile_halo(op_type, params) is None
+    assert not worth_tiling(op_type, params)
+
+@pytest.mark.parametrize('case', CASES, ids=case_id)
+def test_apply_step_with_policy_matches_whole(frame, case):
+    op_type, params = case
+    policy = TilingPolicy(memory_mb=MEMORY_MB, min_megapixels=0)
+    expected = whole(frame, op_type, params)
+    result = apply_step(frame.copy(), {'type': op_type, 'params': params}, tiling=policy)
+    assert np.array_equal(result, expected)
+
+def test_in_place_filters_run_whole():
+    assert not worth_tiling('noise_reduction', {'method': 'gaussian'})
+    assert not worth_tiling('noise_reduction', {'method': 'median'})
+    assert not worth_tiling('morphological', {'operation': 'opening'})
+    assert worth_tiling('noise_reduction', {'method': 'bilateral'})
+    assert worth_tiling('edge_detection', {'method': 'sobel'})
@@ -1 +1,19 @@
-from .image_processing import *
\ No newline at end of file
+# The filters live in image_processing, which imports OpenCV and scikit-image.
+# They are resolved on first attribute access so that importing any other
+# utils module stays cheap.
+_IMAGE_PROCESSING_NAMES = (
+    'threshold_array', 'apply_threshold',
+    'edge_detection_array', 'apply_edge_detection',
+    'noise_reduction_array', 'apply_noise_reduction',
+    'morphological_array', 'apply_morphological_operation',
+    'color_transformation_array', 'apply_color_transformation',
+    'special_effect_array', 'apply_special_effect',
+    'geometric_transform_array', 'apply_geometric_transform',
+    'denoise_wavelet'
+)
+
+def __getattr__(name):
+    if name in _IMAGE_PROCESSING_NAMES:
+        from . import image_processing
+        return getattr(image_processing, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
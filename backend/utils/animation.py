@@ -0,0 +1,318 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import GifImagePlugin, Image
+
+from .encoder import FORMAT_ALIASES
+from .lazy_imports import load
+from .pipeline import run_frame_pipeline
+
+# Multi-frame inputs (animated GIF/WebP/PNG and video files) are streamed: a
+# frame is decoded only when the worker pool has room for it, frames are
+# filtered in parallel, and the encoder writes them out in order as they
+# come back. At most ``max_in_flight`` frames are held at once, so memory
+# does not grow with the length of the clip.
+
+# Output formats a clip can be written as, and the default for each source
+DEFAULT_OUTPUT = {'gif': 'gif', 'webp': 'webp', 'png': 'webp', 'video': 'mp4'}
+ANIMATION_OUTPUTS = ('gif', 'webp')
+VIDEO_OUTPUTS = ('mp4', 'gif')
+
+MIMETYPES = {'gif': 'image/gif', 'webp': 'image/webp', 'mp4': 'video/mp4'}
+
+class AnimatedImage:
+    """Frames of an animated GIF, WebP or PNG, decoded one at a time by PIL."""
+
+    def __init__(self, image):
+        self.image = image
+        self.format = image.format.lower()
+        self.width, self.height = image.size
+        self.frame_count = image.n_frames
+        self.loop = image.info.get('loop', 0)
+
+    def frames(self, max_edge=None):
+        """Yield (RGB ndarray, duration in ms) for every frame."""
+        for index in range(self.frame_count):
+            self.image.seek(index)
+            frame = self.image.convert('RGB')
+            if max_edge:
+                frame.thumbnail((max_edge, max_edge))
+            yield np.array(frame), self.image.info.get('duration', 100)
+
+    def close(self):
+        self.image.close()
+
+class VideoClip:
+    """Frames of a video file, decoded one at a time by OpenCV."""
+
+    format = 'video'
+    loop = 0
+    max_frames = 0
+
+    def __init__(self, capture, path):
+        cv2 = load('cv2')
+        self.capture = capture
+        self.path = path
+        self.fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        # Containers only give an estimate; the stream ends where it ends
+        self.frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    def frames(self, max_edge=None):
+        cv2 = load('cv2')
+        duration = 1000 / self.fps
+        read = 0
+        while True:
+            ok, frame = self.capture.read()
+            if not ok:
+                return
+            read += 1
+            if self.max_frames and read > self.max_frames:
+                raise ValueError(f"Clips are limited to {self.max_frames} frames")
+            if max_edge and max(frame.shape[:2]) > max_edge:
+                scale = max_edge / max(frame.shape[:2])
+                size = (max(1, round(frame.shape[1] * scale)), max(1, round(frame.shape[0] * scale)))
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), duration
+
+    def close(self):
+        self.capture.release()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def _open_video(stream):
+    # OpenCV only reads video from a path
+    stream.seek(0)
+    with tempfile.NamedTemporaryFile(prefix='clip-', suffix='.video', delete=False) as f:
+        shutil.copyfileobj(stream, f)
+        path = f.name
+    capture = load('cv2').VideoCapture(path)
+    if capture.isOpened() and capture.get(load('cv2').CAP_PROP_FRAME_COUNT) > 0:
+        return VideoClip(capture, path)
+    capture.release()
+    os.remove(path)
+    return None
+
+def open_clip(stream, max_frames=0):
+    """
+    An AnimatedImage or VideoClip for a multi-frame input, or None for a
+    still image or anything unreadable (which then takes the still path
+    and fails there as before). The stream is rewound when None is returned.
+
+    Clips with more than ``max_frames`` frames (0 for no limit) raise ValueError.
+    """
+    try:
+        image = Image.open(stream)
+    except Exception:
+        clip = _open_video(stream)
+        stream.seek(0)
+    else:
+        if not getattr(image, 'is_animated', False):
+            stream.seek(0)
+            return None
+        clip = AnimatedImage(image)
+    if clip is not None and max_frames:
+        clip.max_frames = max_frames
+        if clip.frame_count > max_frames:
+            clip.close()
+            raise ValueError(f"Clips are limited to {max_frames} frames")
+    return clip
+
+class FramePool:
+    """
+    Threads that filter the frames of clips, shared by all requests of a
+    process. OpenCV releases the GIL, so frames run in parallel.
+
+    Parameters:
+    - workers: filter threads
+    - max_in_flight: most frames decoded but not yet handed to the encoder, per clip
+    """
+
+    def __init__(self, workers, max_in_flight):
+        self.workers = workers
+        self.max_in_flight = max(max_in_flight, workers)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='frames')
+                self._pid = os.getpid()
+            return self._executor
+
+    def map(self, frames, operations, on_error=None, tiling=None):
+        """Yield (filtered frame, duration) in input order as they complete."""
+        executor = self._get_executor()
+        failed = set()
+
+        # Every frame hits the same failing step; report it once per clip
+        def report(operation, e):
+            if on_error and id(operation) not in failed:
+                failed.add(id(operation))
+                on_error(operation, e)
+
+        pending = deque()
+        for frame, duration in frames:
+            pending.append((executor.submit(run_frame_pipeline, frame, operations, report, tiling), duration))
+            if len(pending) >= self.max_in_flight:
+                future, duration = pending.popleft()
+                yield future.result(), duration
+        while pending:
+            future, duration = pending.popleft()
+            yield future.result(), duration
+
+class _FrameSequence(Image.Image):
+    # A multi-frame image whose frames are pulled from an iterator when the
+    # WebP writer seeks to them, so Pillow never holds more than one.
+    # Durations are appended as frames arrive; the writer reads each one
+    # after adding its frame.
+
+    def __init__(self, frames, frame_count):
+        super().__init__()
+        self._frames = frames
+        self.n_frames = frame_count
+        self.durations = []
+        self._index = -1
+        self._next()
+
+    def _next(self):
+        try:
+            array, duration = next(self._frames)
+        except StopIteration:
+            raise EOFError("no more frames") from None
+        frame = Image.fromarray(array)
+        self.im = frame.im
+        self._mode = frame.mode
+        self._size = frame.size
+        self.durations.append(round(duration))
+        self._index += 1
+
+    def seek(self, frame):
+        # Frames only go forward; the writer's final seek back is ignored
+        if frame == self._index + 1:
+            self._next()
+
+    def tell(self):
+        return self._index
+
+    def load(self):
+        return None
+
+def _write_gif(fp, frames, loop):
+    first = True
+    for array, duration in frames:
+        frame = Image.fromarray(array).convert('P', palette=Image.Palette.ADAPTIVE)
+        if first:
+            header, _ = GifImagePlugin.getheader(frame, info={'loop': loop})
+            for chunk in header:
+                fp.write(chunk)
+            first = False
+        # Each frame is a full frame with its own palette
+        for chunk in GifImagePlugin.getdata(frame, duration=round(duration), disposal=1, include_color_table=True):
+            fp.write(chunk)
+    fp.write(b';')
+
+def _write_mp4(path, frames, fps):
+    cv2 = load('cv2')
+    writer = None
+    try:
+        for array, _ in frames:
+            if writer is None:
+                writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps,
+                                         (array.shape[1], array.shape[0]), array.ndim == 3)
+                if not writer.isOpened():
+                    raise ValueError("This server cannot write mp4 video")
+            writer.write(cv2.cvtColor(array, cv2.COLOR_RGB2BGR) if array.ndim == 3 else array)
+    finally:
+        if writer is not None:
+            writer.release()
+
+class _Counted:
+    # Counts the frames and the size of the first one on the way to the encoder
+    def __init__(self, frames):
+        self._frames = frames
+        self.count = 0
+        self.size = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        array, duration = next(self._frames)
+        if self.size is None:
+            self.size = (array.shape[1], array.shape[0])
+        self.count += 1
+        return array, duration
+
+def output_format(clip, format=None):
+    """Format a clip is written as: the requested one if the clip allows it, else its default."""
+    if format is None:
+        return DEFAULT_OUTPUT[clip.format]
+    format = FORMAT_ALIASES.get(format.lower(), format.lower())
+    allowed = VIDEO_OUTPUTS if isinstance(clip, VideoClip) else ANIMATION_OUTPUTS
+    if format not in allowed:
+        raise ValueError(f"Unsupported output format for {'video' if isinstance(clip, VideoClip) else 'animations'}: "
+                         f"{format} (use {' or '.join(allowed)})")
+    return format
+
+def encode_clip(frames, clip, format=None, quality=None, compress_level=None, profile=None):
+    """
+    Encode filtered (ndarray, duration) frames in order as they arrive.
+
+    GIF and mp4 are written frame by frame; WebP frames go into libwebp's
+    animation encoder one at a time. Returns (encoded bytes, info) like
+    utils.encoder.encode_image, with the frame count, size and frames per
+    second (decode, filter and encode together) added to info.
+    """
+    format = output_format(clip, format)
+    counted = _Counted(frames)
+    start = time.perf_counter()
+
+    if format == 'gif':
+        buffered = io.BytesIO()
+        _write_gif(buffered, counted, clip.loop)
+        data = buffered.getvalue()
+    elif format == 'webp':
+        sequence = _FrameSequence(counted, clip.frame_count)
+        options = {'quality': quality} if quality is not None else {}
+        if profile in ('fast', 'small'):
+            options['method'] = {'fast': 0, 'small': 6}[profile]
+        buffered = io.BytesIO()
+        sequence.save(buffered, format='WEBP', save_all=True, duration=sequence.durations, loop=clip.loop,
+                      **options)
+        data = buffered.getvalue()
+    else:
+        fd, path = tempfile.mkstemp(prefix='clip-', suffix='.mp4')
+        os.close(fd)
+        try:
+            _write_mp4(path, counted, getattr(clip, 'fps', 25.0))
+            with open(path, 'rb') as f:
+                data = f.read()
+        finally:
+            os.remove(path)
+
+    elapsed = time.perf_counter() - start
+    if not counted.count:
+        raise ValueError("The clip has no readable frames")
+    return data, {
+        'format': format,
+        'mimetype': MIMETYPES[format],
+        'bytes': len(data),
+        'encode_ms': round(elapsed * 1000, 2),
+        'frames': counted.count,
+        'width': counted.size[0],
+        'height': counted.size[1],
+        'fps': round(counted.count / elapsed, 2) if elapsed else 0
+    }
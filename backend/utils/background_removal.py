@@ -0,0 +1,213 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# rembg sessions are expensive to build (model load + ONNX graph init), so each
+# worker process keeps a small pool of them and reuses them across requests.
+MODEL_NAME = os.getenv('REMBG_MODEL', 'u2net')
+SESSION_COUNT = max(1, int(os.getenv('REMBG_SESSIONS', 1)))
+# ONNX runtime intra-op threads per session; 0 keeps onnxruntime's default
+THREADS = int(os.getenv('REMBG_THREADS', 0))
+# With a batch size above 1, concurrent requests waiting up to
+# REMBG_BATCH_WINDOW_MS are grouped into one inference call.
+BATCH_SIZE = max(1, int(os.getenv('REMBG_BATCH_SIZE', 1)))
+BATCH_WINDOW_MS = float(os.getenv('REMBG_BATCH_WINDOW_MS', 10))
+
+# Models that share U2netSession's pre/post-processing and can be batched
+BATCHABLE_MODELS = ('u2net', 'u2netp', 'u2net_human_seg', 'silueta')
+
+def _create_session(model_name, threads):
+    from rembg import new_session
+
+    if threads:
+        try:
+            import onnxruntime as ort
+            from rembg.sessions import sessions_class
+            session_class = next(c for c in sessions_class if c.name() == model_name)
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+            return session_class(model_name, options)
+        except (ImportError, StopIteration, TypeError):
+            pass
+    return new_session(model_name)
+
+class SessionPool:
+    """Fixed-size pool of rembg sessions, created on first use (or by warm())."""
+
+    def __init__(self, model_name=MODEL_NAME, size=SESSION_COUNT, threads=THREADS):
+        self.model_name = model_name
+        self.size = size
+        self.threads = threads
+        self.pid = os.getpid()
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self.load_ms = []
+        self.inferences = 0
+        self.images = 0
+
+    def _new_session(self):
+        start = time.perf_counter()
+        session = _create_session(self.model_name, self.threads)
+        self.load_ms.append(round((time.perf_counter() - start) * 1000, 2))
+        return session
+
+    def warm(self):
+        """Create every session in the pool up front."""
+        while True:
+            with self._lock:
+                if self._created >= self.size:
+                    return
+                self._created += 1
+            try:
+                self._idle.put(self._new_session())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+    @contextmanager
+    def session(self):
+        with self._lock:
+            create = self._idle.empty() and self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                session = self._new_session()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        else:
+            session = self._idle.get()
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
+
+    def stats(self):
+        return {
+            'model': self.model_name,
+            'sessions': self._created,
+            'max_sessions': self.size,
+            'idle': self._idle.qsize(),
+            'threads': self.threads or 'default',
+            'load_ms': self.load_ms,
+            'inferences': self.inferences,
+            'images': self.images
+        }
+
+def _cutout(img, mask):
+    empty = Image.new('RGBA', img.size, 0)
+    return Image.composite(img.convert('RGBA'), empty, mask)
+
+def _predict_masks(session, images):
+    """One mask per image, using a single batched inference where the model allows it."""
+    if len(images) > 1 and session.model_name in BATCHABLE_MODELS:
+        inputs = [session.normalize(img, (0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320))
+                  for img in images]
+        name = next(iter(inputs[0]))
+        try:
+            outputs = session.inner_session.run(None, {name: np.concatenate([i[name] for i in inputs])})
+        except Exception as e:
+            # Models exported with a fixed batch dimension fall back to one call per image
+            print(f"Batched background removal failed, running images one by one: {e}")
+        else:
+            masks = []
+            for pred, img in zip(outputs[0][:, 0, :, :], images):
+                pred = (pred - pred.min()) / (pred.max() - pred.min())
+                mask = Image.fromarray((pred * 255).astype('uint8'), mode='L')
+                masks.append(mask.resize(img.size, Image.Resampling.LANCZOS))
+            return masks, 1
+    return [session.predict(img)[0] for img in images], len(images)
+
+class RemovalBatcher:
+    """Collects concurrent requests into batches; one dispatcher thread per pooled session."""
+
+    def __init__(self, pool, batch_size=BATCH_SIZE, window_ms=BATCH_WINDOW_MS):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.window = window_ms / 1000
+        self._queue = queue.Queue()
+        for i in range(pool.size):
+            threading.Thread(target=self._dispatch, name=f"rembg-batcher-{i}", daemon=True).start()
+
+    def submit(self, img):
+        future = Future()
+        self._queue.put((img, future))
+        return future
+
+    def _dispatch(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(items) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            images = [ImageOps.exif_transpose(img) for img, _ in items]
+            try:
+                with self.pool.session() as session:
+                    masks, calls = _predict_masks(session, images)
+                self.pool.inferences += calls
+                self.pool.images += len(images)
+                for (_, future), img, mask in zip(items, images, masks):
+                    future.set_result(_cutout(img, mask))
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+
+_pool = None
+_batcher = None
+_init_lock = threading.Lock()
+
+def get_pool():
+    """The session pool of the current process (rebuilt after a fork)."""
+    global _pool, _batcher
+    with _init_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = SessionPool()
+            _batcher = None
+        return _pool
+
+def _get_batcher():
+    global _batcher
+    pool = get_pool()
+    with _init_lock:
+        if _batcher is None:
+            _batcher = RemovalBatcher(pool)
+        return _batcher
+
+def warm_up():
+    """Load the model sessions now instead of on the first request."""
+    get_pool().warm()
+
+def remove_background(img):
+    """Remove the background of a PIL image using a pooled rembg session."""
+    if BATCH_SIZE > 1:
+        return _get_batcher().submit(img).result()
+
+    from rembg import remove
+
+    pool = get_pool()
+    with pool.session() as session:
+        result = remove(img, session=session)
+    pool.inferences += 1
+    pool.images += 1
+    return result
+
+def stats():
+    return dict(get_pool().stats(), batch_size=BATCH_SIZE, batch_window_ms=BATCH_WINDOW_MS)
@@ -0,0 +1,216 @@
+import base64
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from PIL import Image
+
+from .encoder import encode_image
+from .operations import FILE_OPERATIONS, apply_file_operation, decode_size, resolve_params
+from .pipeline import ARRAY_PROCESSORS, run_pipeline
+from .upload_store import UploadStore
+
+def default_workers():
+    """Number of CPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(max_workers):
+    """Return a process pool with ``max_workers`` workers, created once and reused."""
+    with _pools_lock:
+        pool = _pools.get(max_workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=max_workers)
+            _pools[max_workers] = pool
+        return pool
+
+_worker_stores = {}
+
+def _worker_store(upload_folder):
+    # Per-worker store so repeated watermarks are prepared once per process.
+    # Workers read the shared index but never write it; the app owns it.
+    store = _worker_stores.get(upload_folder)
+    if store is None:
+        store = UploadStore(upload_folder, cache_bytes=64 * 1024 * 1024, persist=False)
+        _worker_stores[upload_folder] = store
+    return store
+
+def validate_operations(operations):
+    """
+    Check a batch operation list up front.
+
+    Each step is either a filename-endpoint operation,
+    ``{'operation': 'resize', 'params': {...}}``, or a /process filter,
+    ``{'type': 'noise_reduction', 'params': {...}}``.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("operations must be a non-empty list")
+    for step in operations:
+        if not isinstance(step, dict):
+            raise ValueError("Each operation must be an object")
+        if 'operation' in step:
+            if step['operation'] not in FILE_OPERATIONS:
+                raise ValueError(f"Unsupported operation: {step['operation']}")
+        elif step.get('type') not in ARRAY_PROCESSORS:
+            raise ValueError(f"Unsupported operation: {step.get('type')}")
+        if not isinstance(step.get('params', {}), dict):
+            raise ValueError("params must be an object")
+
+def process_file(upload_folder, filename, operations, output=None, tiling=None):
+    """
+    Run an operation list on one upload. Executed inside a pool worker.
+
+    Consecutive filter steps are run as one ndarray pipeline. Returns a dict
+    with the encoded bytes under 'data' on success, or an 'error' message.
+    """
+    start = time.perf_counter()
+    try:
+        if os.path.basename(filename) != filename:
+            raise ValueError("Invalid filename")
+        img_path = os.path.join(upload_folder, filename)
+        img = Image.open(img_path)
+        original_size = os.path.getsize(img_path)
+        img_format = img.format.lower()
+        save_options = {}
+
+        first = operations[0]
+        if 'operation' in first:
+            # A leading downscale only decodes what it needs (JPEG DCT scaling)
+            params = resolve_params(first['operation'], img.width, img.height, first.get('params', {}))
+            operations = [dict(first, params=params)] + operations[1:]
+            size = decode_size(first['operation'], img.width, img.height, **params)
+            if size:
+                img.draft(img.mode, size)
+
+        filters = []
+        for step in operations + [None]:
+            if step is not None and 'operation' not in step:
+                filters.append({'type': step['type'], 'params': step.get('params', {})})
+                continue
+            if filters:
+                img = run_pipeline(img if img.mode == 'RGB' else img.convert('RGB'), filters, tiling=tiling)
+                filters = []
+            if step is not None:
+                img, img_format, step_options = apply_file_operation(
+                    img, img_format, step['operation'], upload_folder,
+                    store=_worker_store(upload_folder), **step.get('params', {})
+                )
+                save_options.update(step_options)
+
+        if output:
+            encoded, encode_info = encode_image(img, **output)
+        else:
+            encoded, encode_info = encode_image(img, format=img_format, **save_options)
+
+        return {
+            'filename': filename,
+            'success': True,
+            'data': encoded,
+            'format': encode_info['format'],
+            'original_size': round(original_size / 1024, 2),
+            'compressed_size': round(len(encoded) / 1024, 2),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+        }
+    except FileNotFoundError:
+        return {'filename': filename, 'success': False, 'error': 'File not found.'}
+    except Exception as e:
+        return {'filename': filename, 'success': False, 'error': str(e)}
+
+def run_batch(upload_folder, filenames, operations, output=None, max_workers=None, tiling=None):
+    """
+    Fan an operation list out over a process pool and yield per-file results
+    in completion order.
+
+    At most two files per worker are in flight so memory stays bounded
+    however long the file list is.
+    """
+    max_workers = max_workers or default_workers()
+    pool = get_pool(max_workers)
+    queue = iter(filenames)
+    pending = {}
+
+    def submit(count):
+        for filename in queue:
+            future = pool.submit(process_file, upload_folder, filename, operations, output, tiling)
+            pending[future] = filename
+            count -= 1
+            if count == 0:
+                break
+
+    submit(max_workers * 2)
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            filename = pending.pop(future)
+            try:
+                yield future.result()
+            except Exception as e:
+                yield {'filename': filename, 'success': False, 'error': str(e)}
+        submit(len(done))
+
+def ndjson_stream(results):
+    """Serialise batch results as newline-delimited JSON with base64 images."""
+    for result in results:
+        if 'data' in result:
+            result = dict(result, img=base64.b64encode(result.pop('data')).decode('utf-8'))
+        yield json.dumps(result) + '\n'
+
+class _ChunkWriter(io.RawIOBase):
+    """Unseekable sink that lets zipfile write entries as a stream of chunks."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _entry_name(filename, img_format, used):
+    # a.png and a.jpg both compress to a.jpeg; extractors would keep only one,
+    # so later ones get a -2, -3, ... suffix. Compared case-insensitively, as
+    # on the filesystems the archive may be extracted to.
+    stem = os.path.splitext(filename)[0]
+    entry = f"{stem}.{img_format}"
+    count = 1
+    while entry.casefold() in used:
+        count += 1
+        entry = f"{stem}-{count}.{img_format}"
+    used.add(entry.casefold())
+    return entry
+
+def zip_stream(results):
+    """
+    Serialise batch results as a zip archive, yielding each file's bytes as
+    soon as it is written. Entry names are unique. A manifest.json with
+    per-file metadata (including each file's entry name) and errors is added last.
+    """
+    sink = _ChunkWriter()
+    manifest = []
+    used = {'manifest.json'}
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for result in results:
+            data = result.pop('data', None)
+            if data is not None:
+                result['entry'] = _entry_name(result['filename'], result['format'], used)
+                archive.writestr(result['entry'], data)
+            manifest.append(result)
+            yield sink.drain()
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+    yield sink.drain()
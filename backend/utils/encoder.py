@@ -0,0 +1,111 @@
+import io
+import time
+
+from PIL import Image
+
+# Encoding profiles for processed images:
+# - default: what the API has always returned (PNG at zlib level 6)
+# - fast: lowest encode time; JPEG for opaque images, PNG at zlib level 1 otherwise
+# - small: smallest output; WebP (keeps alpha) at its slowest, tightest method
+PROFILES = ('default', 'fast', 'small')
+
+FORMAT_ALIASES = {'jpg': 'jpeg'}
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+def output_options(data):
+    """
+    Pick the output encoding fields out of a request payload (JSON body,
+    form or query args) and return them as process_image/encode_image kwargs.
+    """
+    options = {}
+    if data.get('output_format'):
+        options['format'] = str(data['output_format'])
+    if data.get('output_quality') not in (None, ''):
+        options['quality'] = int(data['output_quality'])
+    if data.get('compression_level') not in (None, ''):
+        options['compress_level'] = int(data['compression_level'])
+    if data.get('output_profile'):
+        options['profile'] = str(data['output_profile'])
+    return options
+
+def resolve_encoding(image, format=None, quality=None, compress_level=None, profile=None):
+    """
+    Resolve an output policy into a PIL format name and save() keyword arguments.
+
+    Parameters:
+    - format: output format ('png', 'jpeg', 'webp', or any format PIL can write);
+      chosen by the profile when omitted
+    - quality: 1-100, used by JPEG and WebP
+    - compress_level: zlib level 0-9, used by PNG
+    - profile: one of PROFILES, supplies defaults for the fields above
+    """
+    profile = profile or 'default'
+    if profile not in PROFILES:
+        raise ValueError(f"Unsupported output profile: {profile}")
+    if quality is not None and not 1 <= quality <= 100:
+        raise ValueError("Output quality must be between 1 and 100")
+    if compress_level is not None and not 0 <= compress_level <= 9:
+        raise ValueError("Compression level must be between 0 and 9")
+
+    if format is None:
+        if profile == 'fast':
+            format = 'png' if has_alpha(image) else 'jpeg'
+        elif profile == 'small':
+            format = 'webp'
+        else:
+            format = 'png'
+    format = format.lower()
+    format = FORMAT_ALIASES.get(format, format)
+    if format.upper() not in Image.SAVE:
+        Image.init()
+        if format.upper() not in Image.SAVE:
+            raise ValueError(f"Unsupported output format: {format}")
+
+    # The default profile leaves unspecified settings to PIL's own defaults
+    options = {}
+    if quality is not None:
+        options['quality'] = quality
+    if format == 'png':
+        if compress_level is None:
+            compress_level = {'fast': 1, 'small': 9}.get(profile)
+        if compress_level is not None:
+            options['compress_level'] = compress_level
+    elif format == 'jpeg':
+        if quality is None and profile != 'default':
+            options['quality'] = {'fast': 85, 'small': 75}[profile]
+        if profile == 'small':
+            options['optimize'] = True
+    elif format == 'webp' and profile != 'default':
+        # method trades encode speed for size: 0 is fastest, 6 smallest
+        options['method'] = {'fast': 0, 'small': 6}[profile]
+
+    return format, options
+
+def encode_image(image, format=None, quality=None, compress_level=None, profile=None, **save_options):
+    """
+    Encode a PIL image according to an output policy.
+
+    Extra keyword arguments are passed to Image.save and override the policy.
+    Returns (encoded bytes, info) where info has the format, mimetype,
+    encoded size in bytes and encode time in milliseconds.
+    """
+    format, options = resolve_encoding(image, format, quality, compress_level, profile)
+    options.update(save_options)
+
+    if format == 'jpeg' and image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+
+    start = time.perf_counter()
+    buffered = io.BytesIO()
+    image.save(buffered, format=format.upper(), **options)
+    encode_ms = (time.perf_counter() - start) * 1000
+
+    data = buffered.getvalue()
+    return data, {
+        'format': format,
+        'mimetype': Image.MIME.get(format.upper(), 'application/octet-stream'),
+        'bytes': len(data),
+        'encode_ms': round(encode_ms, 2)
+    }
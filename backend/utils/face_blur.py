@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from .lazy_imports import load
+
+# The Haar cascade is loaded once per worker process and shared by its
+# threads. Detection runs on a copy scaled down to FACE_DETECT_MAX_EDGE, so
+# its cost does not grow with the upload; only the detected regions of the
+# full-size frame are blurred.
+CASCADE = os.getenv('FACE_CASCADE', 'haarcascade_frontalface_default.xml')
+DETECT_MAX_EDGE = int(os.getenv('FACE_DETECT_MAX_EDGE', 640))
+
+BLUR_METHODS = ('blur', 'pixelate')
+
+# Grow each box so hairline, ears and chin are covered too
+BOX_PADDING = 0.15
+
+def _cascade_path(cv2, name):
+    if os.path.isfile(name):
+        return name
+    return os.path.join(cv2.data.haarcascades, name)
+
+class FaceDetector:
+    """Frontal face detector around an OpenCV Haar cascade."""
+
+    def __init__(self, cascade=CASCADE, max_edge=DETECT_MAX_EDGE):
+        cv2 = load('cv2')
+        if not hasattr(cv2, 'CascadeClassifier'):
+            raise RuntimeError("Face detection needs OpenCV's CascadeClassifier (opencv-python 4.x)")
+        start = time.perf_counter()
+        self.classifier = cv2.CascadeClassifier(_cascade_path(cv2, cascade))
+        if self.classifier.empty():
+            raise RuntimeError(f"Could not load face cascade: {cascade}")
+        self.load_ms = round((time.perf_counter() - start) * 1000, 2)
+        self.cascade = cascade
+        self.max_edge = max_edge
+        self.pid = os.getpid()
+        # detectMultiScale keeps per-call state in the classifier
+        self._lock = threading.Lock()
+        self.images = 0
+        self.faces = 0
+        self.detect_seconds = 0.0
+
+    def detect(self, img_array):
+        """
+        Face boxes (x0, y0, x1, y1) in ``img_array`` coordinates.
+
+        The frame is converted to grey at detection scale, so colour and
+        greyscale uint8 frames (with or without alpha) are accepted.
+        """
+        cv2 = load('cv2')
+        start = time.perf_counter()
+        height, width = img_array.shape[:2]
+        scale = min(1.0, self.max_edge / max(width, height))
+        small = img_array
+        if scale < 1:
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            small = cv2.resize(img_array, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_RGBA2GRAY if small.shape[2] == 4 else cv2.COLOR_RGB2GRAY)
+        small = cv2.equalizeHist(small)
+
+        with self._lock:
+            found = self.classifier.detectMultiScale(small, scaleFactor=1.1, minNeighbors=5, minSize=(24, 24))
+
+        boxes = []
+        for x, y, w, h in np.asarray(found).reshape(-1, 4) / scale:
+            pad_x, pad_y = w * BOX_PADDING, h * BOX_PADDING
+            boxes.append((
+                max(0, int(x - pad_x)), max(0, int(y - pad_y)),
+                min(width, int(np.ceil(x + w + pad_x))), min(height, int(np.ceil(y + h + pad_y)))
+            ))
+
+        self.images += 1
+        self.faces += len(boxes)
+        self.detect_seconds += time.perf_counter() - start
+        return boxes
+
+    def stats(self):
+        return {
+            'cascade': self.cascade,
+            'detect_max_edge': self.max_edge,
+            'load_ms': self.load_ms,
+            'images': self.images,
+            'faces': self.faces,
+            'detect_ms_mean': round(self.detect_seconds * 1000 / self.images, 2) if self.images else 0
+        }
+
+_detector = None
+_init_lock = threading.Lock()
+
+def get_detector():
+    """The face detector of the current process (rebuilt after a fork)."""
+    global _detector
+    with _init_lock:
+        if _detector is None or _detector.pid != os.getpid():
+            _detector = FaceDetector()
+        return _detector
+
+def anonymize_regions(img_array, boxes, method='blur', strength=0.5):
+    """
+    Blur or pixelate the given (x0, y0, x1, y1) regions of ``img_array`` in place.
+
+    Parameters:
+    - method: 'blur' (stack blur, constant cost per pixel whatever the radius)
+      or 'pixelate' (mosaic of roughly 4 to 16 blocks across the face)
+    - strength: 0.1 to 1.0, larger hides more detail
+    """
+    if method not in BLUR_METHODS:
+        raise ValueError(f"Unsupported blur method: {method}")
+    strength = min(1.0, max(0.1, float(strength)))
+    cv2 = load('cv2')
+    for x0, y0, x1, y1 in boxes:
+        region = img_array[y0:y1, x0:x1]
+        height, width = region.shape[:2]
+        if width < 2 or height < 2:
+            continue
+        if method == 'blur':
+            # Kernel up to about half the face size; must be odd
+            ksize = max(3, int(max(width, height) * strength / 2) | 1)
+            region[...] = cv2.stackBlur(region, (ksize, ksize))
+        else:
+            blocks = max(4, round(16 * (1.1 - strength)))
+            small = cv2.resize(region, (min(blocks, width), min(blocks, height)), interpolation=cv2.INTER_AREA)
+            cv2.resize(small, (width, height), dst=region, interpolation=cv2.INTER_NEAREST)
+    return img_array
+
+def blur_faces(img, method='blur', strength=0.5):
+    """
+    Detect faces in a PIL image and blur or pixelate only those regions.
+
+    Returns (image, number of faces). Palette and other modes OpenCV cannot
+    work on are converted to RGB (RGBA if they have transparency) first.
+    """
+    if img.mode == 'P':
+        img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    elif img.mode not in ('L', 'RGB', 'RGBA'):
+        img = img.convert('RGB')
+    img_array = np.array(img)
+    boxes = get_detector().detect(img_array)
+    if not boxes:
+        return img, 0
+    return Image.fromarray(anonymize_regions(img_array, boxes, method, strength)), len(boxes)
+
+def stats():
+    return get_detector().stats()
@@ -1,8 +1,35 @@
 import cv2
 import numpy as np
 from PIL import Image
-from skimage import exposure, filters, feature, color, morphology
-from scipy import ndimage
+
+from . import lut
+
+# Every filter comes in two flavours: a ``*_array`` function that works on a
+# uint8 ndarray and may reuse (overwrite) its input buffer, and the original
+# ``apply_*`` function that takes and returns a PIL image. The pipeline
+# executor chains the array versions so a frame is only converted at the edges.
+# scikit-image is imported inside the functions that use it, so loading this
+# module only costs OpenCV.
+
+def to_gray(img_array):
+    """Grey conversion of an RGB frame; single-channel frames are returned as they are."""
+    if img_array.ndim == 2:
+        return img_array
+    return cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+
+def threshold_array(img_array, method='binary', threshold=127, block_size=11, c=2):
+    """Array version of apply_threshold. Returns a single-channel uint8 array."""
+    gray = to_gray(img_array)
+    
+    methods = {
+        'binary': lambda: cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY)[1],
+        'adaptive': lambda: cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                                                cv2.THRESH_BINARY, block_size, c),
+        'otsu': lambda: cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1],
+        'triangle': lambda: cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_TRIANGLE)[1]
+    }
+    
+    return methods.get(method, methods['binary'])()
 
 def apply_threshold(image, method='binary', threshold=127, block_size=11, c=2):
     """
@@ -14,18 +41,25 @@ def apply_threshold(image, method='binary', threshold=127, block_size=11, c=2):
     - block_size: neighborhood size for adaptive method
     - c: constant subtracted from mean for adaptive method
     """
-    gray = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2GRAY)
+    return Image.fromarray(threshold_array(np.array(image), method, threshold, block_size, c))
+
+def edge_detection_array(img_array, method='canny', sigma=2, low_threshold=100, high_threshold=200):
+    """Array version of apply_edge_detection. Returns a single-channel uint8 array."""
+    from skimage import feature, filters
+
+    gray = to_gray(img_array)
     
     methods = {
-        'binary': lambda: cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY)[1],
-        'adaptive': lambda: cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                                cv2.THRESH_BINARY, block_size, c),
-        'otsu': lambda: cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1],
-        'triangle': lambda: cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_TRIANGLE)[1]
+        'canny': lambda: feature.canny(gray, sigma=sigma, low_threshold=low_threshold, 
+                                     high_threshold=high_threshold),
+        'sobel': lambda: filters.sobel(gray),
+        'laplace': lambda: np.absolute(cv2.Laplacian(gray, cv2.CV_64F)),
+        'prewitt': lambda: filters.prewitt(gray),
+        'roberts': lambda: filters.roberts(gray)
     }
     
-    thresh = methods.get(method, methods['binary'])()
-    return Image.fromarray(thresh)
+    edges = methods.get(method, methods['canny'])()
+    return (edges * 255).astype(np.uint8)
 
 def apply_edge_detection(image, method='canny', sigma=2, low_threshold=100, high_threshold=200):
     """
@@ -36,20 +70,26 @@ def apply_edge_detection(image, method='canny', sigma=2, low_threshold=100, high
     - sigma: Gaussian smoothing parameter
     - low_threshold/high_threshold: Thresholds for Canny edge detection
     """
-    img_array = np.array(image)
-    gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-    
+    return Image.fromarray(edge_detection_array(np.array(image), method, sigma,
+                                                low_threshold, high_threshold))
+
+def noise_reduction_array(img_array, method='gaussian', kernel_size=5, sigma=1.5, map_fn=map):
+    """
+    Array version of apply_noise_reduction.
+
+    The gaussian and median filters write their result back into ``img_array``.
+    ``map_fn`` runs the wavelet method's channels (see denoise_wavelet).
+    """
     methods = {
-        'canny': lambda: feature.canny(gray, sigma=sigma, low_threshold=low_threshold, 
-                                     high_threshold=high_threshold),
-        'sobel': lambda: filters.sobel(gray),
-        'laplace': lambda: np.absolute(cv2.Laplacian(gray, cv2.CV_64F)),
-        'prewitt': lambda: filters.prewitt(gray),
-        'roberts': lambda: filters.roberts(gray)
+        'gaussian': lambda: cv2.GaussianBlur(img_array, (kernel_size, kernel_size), sigma,
+                                             dst=img_array),
+        'median': lambda: cv2.medianBlur(img_array, kernel_size, dst=img_array),
+        'bilateral': lambda: cv2.bilateralFilter(img_array, kernel_size, 75, 75),
+        'nlmeans': lambda: cv2.fastNlMeansDenoisingColored(img_array, None, 10, 10, 7, 21),
+        'wavelet': lambda: denoise_wavelet(img_array, map_fn)
     }
     
-    edges = methods.get(method, methods['canny'])()
-    return Image.fromarray((edges * 255).astype(np.uint8))
+    return methods.get(method, methods['gaussian'])()
 
 def apply_noise_reduction(image, method='gaussian', kernel_size=5, sigma=1.5):
     """
@@ -60,18 +100,31 @@ def apply_noise_reduction(image, method='gaussian', kernel_size=5, sigma=1.5):
     - kernel_size: size of the kernel for filtering
     - sigma: standard deviation for Gaussian filter
     """
-    img_array = np.array(image)
+    return Image.fromarray(noise_reduction_array(np.array(image), method, kernel_size, sigma))
+
+def morphological_array(img_array, operation='dilate', kernel_size=5, iterations=1):
+    """
+    Array version of apply_morphological_operation. Every operation writes
+    its result back into ``img_array``.
+
+    OpenCV already runs a rectangular element as separate row and column
+    passes and folds ``iterations`` into one larger rectangle, so the cost
+    grows linearly with kernel_size and iterations rather than with the
+    kernel area (see benchmarks/kernel_benchmark.py).
+    """
+    kernel = np.ones((kernel_size, kernel_size), np.uint8)
     
-    methods = {
-        'gaussian': lambda: cv2.GaussianBlur(img_array, (kernel_size, kernel_size), sigma),
-        'median': lambda: cv2.medianBlur(img_array, kernel_size),
-        'bilateral': lambda: cv2.bilateralFilter(img_array, kernel_size, 75, 75),
-        'nlmeans': lambda: cv2.fastNlMeansDenoisingColored(img_array, None, 10, 10, 7, 21),
-        'wavelet': lambda: denoise_wavelet(img_array)
+    operations = {
+        'dilate': lambda: cv2.dilate(img_array, kernel, dst=img_array, iterations=iterations),
+        'erode': lambda: cv2.erode(img_array, kernel, dst=img_array, iterations=iterations),
+        'opening': lambda: cv2.morphologyEx(img_array, cv2.MORPH_OPEN, kernel, dst=img_array),
+        'closing': lambda: cv2.morphologyEx(img_array, cv2.MORPH_CLOSE, kernel, dst=img_array),
+        'gradient': lambda: cv2.morphologyEx(img_array, cv2.MORPH_GRADIENT, kernel, dst=img_array),
+        'tophat': lambda: cv2.morphologyEx(img_array, cv2.MORPH_TOPHAT, kernel, dst=img_array),
+        'blackhat': lambda: cv2.morphologyEx(img_array, cv2.MORPH_BLACKHAT, kernel, dst=img_array)
     }
     
-    result = methods.get(method, methods['gaussian'])()
-    return Image.fromarray(result)
+    return operations.get(operation, operations['dilate'])()
 
 def apply_morphological_operation(image, operation='dilate', kernel_size=5, iterations=1):
     """
@@ -82,53 +135,43 @@ def apply_morphological_operation(image, operation='dilate', kernel_size=5, iter
     - kernel_size: size of the structuring element
     - iterations: number of times to apply the operation
     """
-    img_array = np.array(image)
-    kernel = np.ones((kernel_size, kernel_size), np.uint8)
-    
-    operations = {
-        'dilate': lambda: cv2.dilate(img_array, kernel, iterations=iterations),
-        'erode': lambda: cv2.erode(img_array, kernel, iterations=iterations),
-        'opening': lambda: cv2.morphologyEx(img_array, cv2.MORPH_OPEN, kernel),
-        'closing': lambda: cv2.morphologyEx(img_array, cv2.MORPH_CLOSE, kernel),
-        'gradient': lambda: cv2.morphologyEx(img_array, cv2.MORPH_GRADIENT, kernel),
-        'tophat': lambda: cv2.morphologyEx(img_array, cv2.MORPH_TOPHAT, kernel),
-        'blackhat': lambda: cv2.morphologyEx(img_array, cv2.MORPH_BLACKHAT, kernel)
-    }
-    
-    result = operations.get(operation, operations['dilate'])()
-    return Image.fromarray(result)
+    return Image.fromarray(morphological_array(np.array(image), operation, kernel_size, iterations))
+
+def color_transformation_array(img_array, method='rgb_to_hsv', gamma=1.0, factor=1.0, in_black=0, in_white=255,
+                               out_black=0, out_white=255, points=None):
+    """Array version of apply_color_transformation. Value adjustments are a single table lookup."""
+    table = lut.color_table(method, gamma, factor, in_black, in_white, out_black, out_white, points)
+    if table is not None:
+        return lut.apply_table(img_array, table)
 
-def apply_color_transformation(image, method='rgb_to_hsv', gamma=1.0):
-    """
-    Apply advanced color space transformations and adjustments.
-    
-    Parameters:
-    - method: 'rgb_to_hsv', 'rgb_to_lab', 'gamma', 'equalize', 'autocontrast'
-    - gamma: gamma correction value
-    """
-    img_array = np.array(image)
-    
     transformations = {
         'rgb_to_hsv': lambda: cv2.cvtColor(img_array, cv2.COLOR_RGB2HSV),
         'rgb_to_lab': lambda: cv2.cvtColor(img_array, cv2.COLOR_RGB2LAB),
-        'gamma': lambda: np.clip(((img_array / 255) ** gamma) * 255, 0, 255).astype(np.uint8),
-        'equalize': lambda: exposure.equalize_hist(img_array),
-        'autocontrast': lambda: exposure.rescale_intensity(img_array)
+        'grayscale': lambda: to_gray(img_array),
+        'equalize': lambda: lut.apply_table(img_array, lut.equalize_table(img_array)),
+        'autocontrast': lambda: lut.apply_table(img_array, lut.autocontrast_table(img_array))
     }
     
-    result = transformations.get(method, transformations['rgb_to_hsv'])()
-    return Image.fromarray(result)
+    return transformations.get(method, transformations['rgb_to_hsv'])()
 
-def apply_special_effect(image, effect='cartoon', strength=1.0):
+def apply_color_transformation(image, method='rgb_to_hsv', gamma=1.0, factor=1.0, in_black=0, in_white=255,
+                               out_black=0, out_white=255, points=None):
     """
-    Apply advanced artistic effects.
+    Apply advanced color space transformations and adjustments.
     
     Parameters:
-    - effect: 'cartoon', 'oil_painting', 'pencil_sketch', 'watercolor', 'pixelate'
-    - strength: intensity of the effect (0.0 to 1.0)
+    - method: 'rgb_to_hsv', 'rgb_to_lab', 'grayscale', 'gamma', 'equalize',
+      'autocontrast', 'brightness', 'contrast', 'levels', 'curves'
+    - gamma: gamma correction value, also the midtone gamma for levels
+    - factor: brightness or contrast factor, 1.0 leaves the image unchanged
+    - in_black, in_white, out_black, out_white: input and output ranges for levels
+    - points: [[input, output], ...] control points for curves
     """
-    img_array = np.array(image)
-    
+    return Image.fromarray(color_transformation_array(np.array(image), method, gamma, factor, in_black, in_white,
+                                                      out_black, out_white, points))
+
+def special_effect_array(img_array, effect='cartoon', strength=1.0):
+    """Array version of apply_special_effect."""
     def cartoon_effect():
         gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
         gray = cv2.medianBlur(gray, 5)
@@ -146,7 +189,7 @@ def apply_special_effect(image, effect='cartoon', strength=1.0):
         pixel_size = int(max(h, w) * 0.03 * strength)
         if pixel_size < 1: pixel_size = 1
         small = cv2.resize(img_array, (w // pixel_size, h // pixel_size))
-        return cv2.resize(small, (w, h), interpolation=cv2.INTER_NEAREST)
+        return cv2.resize(small, (w, h), dst=img_array, interpolation=cv2.INTER_NEAREST)
     
     effects = {
         'cartoon': cartoon_effect,
@@ -157,25 +200,51 @@ def apply_special_effect(image, effect='cartoon', strength=1.0):
         'pixelate': pixelate_effect
     }
     
-    result = effects.get(effect, effects['cartoon'])()
-    return Image.fromarray(result)
+    return effects.get(effect, effects['cartoon'])()
 
-def denoise_wavelet(image):
-    """Helper function for wavelet denoising"""
-    from skimage.restoration import denoise_wavelet as skimage_denoise_wavelet
-    return (skimage_denoise_wavelet(image, multichannel=True, 
-                                  convert2ycbcr=True) * 255).astype(np.uint8)
-
-def apply_geometric_transform(image, operation='resize', **params):
+def apply_special_effect(image, effect='cartoon', strength=1.0):
     """
-    Apply geometric transformations.
+    Apply advanced artistic effects.
     
     Parameters:
-    - operation: 'resize', 'rotate', 'affine', 'perspective'
-    - params: transformation-specific parameters
+    - effect: 'cartoon', 'oil_painting', 'pencil_sketch', 'watercolor', 'pixelate'
+    - strength: intensity of the effect (0.0 to 1.0)
     """
-    img_array = np.array(image)
-    
+    return Image.fromarray(special_effect_array(np.array(image), effect, strength))
+
+def denoise_wavelet(image, map_fn=map):
+    """
+    Helper function for wavelet denoising.
+
+    Colour frames are denoised in YCbCr, one channel at a time as
+    skimage.restoration.denoise_wavelet(convert2ycbcr=True) does, with the
+    channels handed to ``map_fn`` so a thread pool can run them together.
+    """
+    from skimage import color, img_as_float
+    from skimage.restoration import denoise_wavelet as skimage_denoise_wavelet
+
+    if image.ndim == 2:
+        if image.min() == image.max():
+            # A flat frame has no noise to remove, and skimage's estimate would divide by zero
+            return image
+        return (skimage_denoise_wavelet(image) * 255).astype(np.uint8)
+
+    ycbcr = color.rgb2ycbcr(img_as_float(image))
+
+    def denoise(index):
+        channel = ycbcr[..., index]
+        low, high = channel.min(), channel.max()
+        if high == low:
+            return channel
+        # Each channel is denoised on the 0..1 range, then scaled back
+        return skimage_denoise_wavelet((channel - low) / (high - low)) * (high - low) + low
+
+    denoised = np.stack(list(map_fn(denoise, range(3))), axis=-1)
+    rgb = np.clip(color.ycbcr2rgb(denoised), 0, 1)
+    return (rgb * 255).astype(np.uint8)
+
+def geometric_transform_array(img_array, operation='resize', **params):
+    """Array version of apply_geometric_transform."""
     operations = {
         'resize': lambda: cv2.resize(img_array, (params.get('width'), params.get('height'))),
         'rotate': lambda: cv2.rotate(img_array, params.get('angle')),
@@ -185,5 +254,14 @@ def apply_geometric_transform(image, operation='resize', **params):
                                                  (img_array.shape[1], img_array.shape[0]))
     }
     
-    result = operations.get(operation, operations['resize'])()
-    return Image.fromarray(result)
\ No newline at end of file
+    return operations.get(operation, operations['resize'])()
+
+def apply_geometric_transform(image, operation='resize', **params):
+    """
+    Apply geometric transformations.
+    
+    Parameters:
+    - operation: 'resize', 'rotate', 'affine', 'perspective'
+    - params: transformation-specific parameters
+    """
+    return Image.fromarray(geometric_transform_array(np.array(image), operation, **params))
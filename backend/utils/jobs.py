@@ -0,0 +1,168 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+def parse_concurrency(spec, default=2):
+    """
+    Parse a per-class concurrency spec such as
+    ``"remove-background=1,upscale=2,default=4"`` into a dict.
+    """
+    limits = {'default': default}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, value = item.split('=', 1)
+            limits[name.strip()] = max(1, int(value))
+    return limits
+
+class Job:
+    def __init__(self, job_class, description):
+        self.id = uuid.uuid4().hex
+        self.job_class = job_class
+        self.description = description
+        self.status = QUEUED
+        self.result = None
+        self.status_code = None
+        self.error = None
+        self.future = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        info = {
+            'job_id': self.id,
+            'class': self.job_class,
+            'status': self.status,
+            'description': self.description,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if self.started_at:
+            info['wait_ms'] = round((self.started_at - self.submitted_at) * 1000, 2)
+        if self.finished_at and self.started_at:
+            info['run_ms'] = round((self.finished_at - self.started_at) * 1000, 2)
+        if self.error:
+            info['error'] = self.error
+        return info
+
+class JobManager:
+    """
+    Runs slow operations in the background on one bounded thread pool per
+    operation class, so e.g. background removal cannot starve upscales.
+
+    Finished jobs are kept for ``result_ttl`` seconds (and at most
+    ``max_finished`` of them) so clients can poll for the result.
+    """
+
+    def __init__(self, concurrency, result_ttl=600, max_finished=1000):
+        self.concurrency = concurrency
+        self.result_ttl = result_ttl
+        self.max_finished = max_finished
+        self._executors = {}
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._waits = {}
+
+    def _executor(self, job_class):
+        executor = self._executors.get(job_class)
+        if executor is None:
+            workers = self.concurrency.get(job_class, self.concurrency['default'])
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"job-{job_class}")
+            self._executors[job_class] = executor
+        return executor
+
+    def submit(self, job_class, description, fn, *args, **kwargs):
+        """
+        Queue ``fn(*args, **kwargs)`` in ``job_class``. ``fn`` must return a
+        (result dict, HTTP status) pair.
+        """
+        job = Job(job_class, description)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            job.future = self._executor(job_class).submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        with self._lock:
+            if job.status == CANCELLED:
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+            waits = self._waits.setdefault(job.job_class, deque(maxlen=100))
+            waits.append(job.started_at - job.submitted_at)
+        try:
+            result, status_code = fn(*args, **kwargs)
+            job.result = result
+            job.status_code = status_code
+            job.status = DONE if status_code < 400 else FAILED
+            if job.status == FAILED:
+                job.error = result.get('error') or result.get('message')
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued job. Returns False if it already started or finished."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return False
+            job.future.cancel()
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            return True
+
+    def _prune(self):
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.finished_at]
+        excess = len(finished) - self.max_finished
+        for job in finished:
+            if excess > 0 or now - job.finished_at > self.result_ttl:
+                del self._jobs[job.id]
+                excess -= 1
+
+    def stats(self):
+        """Queue depth, running count and recent wait times per operation class."""
+        with self._lock:
+            classes = {}
+            for name in set(self.concurrency) | set(self._executors):
+                classes[name] = {
+                    'workers': self.concurrency.get(name, self.concurrency['default']),
+                    'queued': 0,
+                    'running': 0
+                }
+            for job in self._jobs.values():
+                if job.status in (QUEUED, RUNNING):
+                    classes[job.job_class][job.status] += 1
+            for name, waits in self._waits.items():
+                ordered = sorted(waits)
+                classes[name]['wait_ms'] = {
+                    'mean': round(sum(ordered) / len(ordered) * 1000, 2),
+                    'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+                    'max': round(ordered[-1] * 1000, 2)
+                }
+            now = time.time()
+            oldest = [now - job.submitted_at for job in self._jobs.values() if job.status == QUEUED]
+            return {
+                'classes': classes,
+                'queued': sum(c['queued'] for c in classes.values()),
+                'running': sum(c['running'] for c in classes.values()),
+                'oldest_queued_ms': round(max(oldest) * 1000, 2) if oldest else 0
+            }
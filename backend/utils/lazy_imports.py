@@ -0,0 +1,131 @@
+"""
+On-demand loading of the heavy image libraries.
+
+The app only imports Flask, PIL and numpy at start-up; OpenCV, scikit-image,
+SciPy and rembg are imported the first time an operation needs them. load()
+records how long each import took and how much resident memory it added so
+the cost is visible at /debug/startup.
+
+Run ``python -m utils.lazy_imports`` from the backend directory for a
+per-module report measured in fresh interpreters.
+"""
+import importlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Heavy modules each operation needs, used for preloading
+OPERATION_MODULES = {
+    'process': ['cv2', 'utils.image_processing', 'skimage.feature', 'skimage.filters'],
+    'threshold': ['cv2', 'utils.image_processing'],
+    'edge_detection': ['cv2', 'utils.image_processing', 'skimage.feature', 'skimage.filters'],
+    'noise_reduction': ['cv2', 'utils.image_processing', 'skimage.restoration'],
+    'morphological': ['cv2', 'utils.image_processing'],
+    'color_transformation': ['cv2', 'utils.image_processing'],
+    'special_effect': ['cv2', 'utils.image_processing'],
+    'geometric': ['cv2', 'utils.image_processing'],
+    'upscale': ['cv2'],
+    'blur-face': ['cv2', 'utils.face_blur'],
+    'remove-background': ['rembg']
+}
+
+REPORT_MODULES = [
+    'numpy', 'PIL.Image', 'flask', 'cv2', 'scipy.ndimage', 'skimage.exposure', 'skimage.feature',
+    'skimage.filters', 'skimage.restoration', 'skimage.transform', 'rembg'
+]
+
+_loaded = OrderedDict()
+_lock = threading.Lock()
+
+def current_rss_mb():
+    """Resident set size of this process in MB."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        # Peak rather than current RSS, but the best portable fallback
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+def _package_name(name):
+    # utils.* modules are imported relative to this package so the names work
+    # both when the backend directory is on sys.path and as the backend package.
+    if name.startswith('utils.'):
+        return '.' + name[len('utils.'):], __package__
+    return name, None
+
+def load(name):
+    """Import a module, recording the import time and RSS growth the first time."""
+    module_name, package = _package_name(name)
+    with _lock:
+        if name in _loaded:
+            return importlib.import_module(module_name, package)
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        module = importlib.import_module(module_name, package)
+        _loaded[name] = {
+            'ms': round((time.perf_counter() - start) * 1000, 2),
+            'mb': round(current_rss_mb() - rss_before, 2)
+        }
+        return module
+
+def preload(operations):
+    """Import the modules for a list of operation names (see OPERATION_MODULES)."""
+    for operation in operations:
+        for name in OPERATION_MODULES.get(operation, [operation]):
+            try:
+                load(name)
+            except ImportError as e:
+                print(f"Error preloading {name}: {e}")
+
+def report():
+    """Modules loaded on demand in this process, with their import cost."""
+    with _lock:
+        loaded = dict(_loaded)
+    return {
+        'loaded': loaded,
+        'heavy_modules_in_memory': [name for name in REPORT_MODULES if name in sys.modules],
+        'rss_mb': round(current_rss_mb(), 2)
+    }
+
+_MEASURE = """
+import json, sys, time
+sys.path.insert(0, {path!r})
+from utils.lazy_imports import current_rss_mb
+before = current_rss_mb()
+start = time.perf_counter()
+import {module}
+print(json.dumps({{'ms': (time.perf_counter() - start) * 1000, 'mb': current_rss_mb() - before}}))
+"""
+
+def measure_imports(modules):
+    """Import each module in a fresh interpreter; returns {module: {'ms', 'mb'} or {'error'}}."""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = OrderedDict()
+    for module in modules:
+        proc = subprocess.run(
+            [sys.executable, '-c', _MEASURE.format(path=backend_dir, module=module)],
+            cwd=backend_dir, capture_output=True, text=True
+        )
+        if proc.returncode == 0:
+            results[module] = json.loads(proc.stdout.strip().splitlines()[-1])
+        else:
+            results[module] = {'error': proc.stderr.strip().splitlines()[-1] if proc.stderr else 'failed'}
+    return results
+
+def main():
+    modules = sys.argv[1:] or REPORT_MODULES + ['app']
+    print(f"{'module':<22}{'ms':>10}{'MB':>10}")
+    for module, result in measure_imports(modules).items():
+        if 'error' in result:
+            print(f"{module:<22}{'-':>10}{'-':>10}  {result['error']}")
+        else:
+            print(f"{module:<22}{result['ms']:>10.1f}{result['mb']:>10.1f}")
+
+if __name__ == '__main__':
+    main()
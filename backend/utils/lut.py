@@ -0,0 +1,119 @@
+from functools import lru_cache
+
+import numpy as np
+
+from .lazy_imports import load
+
+# Pointwise operations map every uint8 value through a 256-entry table, so a
+# whole chain of them costs one lookup per pixel. Tables that only depend on
+# the parameters are built once per parameter set and cached; equalize and
+# autocontrast depend on the image and are built from its histogram.
+
+_LEVELS = np.arange(256, dtype=np.float64)
+
+def _freeze(table):
+    table.setflags(write=False)
+    return table
+
+def _to_uint8(values):
+    return np.clip(np.rint(values), 0, 255).astype(np.uint8)
+
+def as_uint8(img_array):
+    """The array itself if it is uint8, otherwise a copy clipped to 0..255."""
+    if img_array.dtype == np.uint8:
+        return img_array
+    return np.clip(img_array, 0, 255).astype(np.uint8)
+
+@lru_cache(maxsize=256)
+def gamma_table(gamma):
+    # Truncates like the float implementation it replaces, so results are unchanged
+    return _freeze(np.clip(((_LEVELS / 255) ** gamma) * 255, 0, 255).astype(np.uint8))
+
+@lru_cache(maxsize=256)
+def contrast_table(factor):
+    """Stretch (factor > 1) or flatten values around mid-grey."""
+    return _freeze(_to_uint8((_LEVELS - 128) * factor + 128))
+
+@lru_cache(maxsize=256)
+def brightness_table(factor):
+    """Scale values, 0 gives black and 1 leaves the image unchanged."""
+    return _freeze(_to_uint8(_LEVELS * factor))
+
+@lru_cache(maxsize=256)
+def threshold_table(threshold):
+    """Same result as cv2.threshold(..., THRESH_BINARY) with maxval 255."""
+    return _freeze(np.where(_LEVELS > threshold, 255, 0).astype(np.uint8))
+
+@lru_cache(maxsize=256)
+def levels_table(in_black=0, in_white=255, gamma=1.0, out_black=0, out_white=255):
+    """Photo-editor levels: clip the input range, apply a midtone gamma, map to the output range."""
+    span = max(in_white - in_black, 1)
+    values = np.clip((_LEVELS - in_black) / span, 0, 1) ** (1 / gamma)
+    return _freeze(_to_uint8(out_black + values * (out_white - out_black)))
+
+@lru_cache(maxsize=256)
+def curves_table(points):
+    """Piecewise-linear curve through ((input, output), ...) control points."""
+    points = sorted(points)
+    return _freeze(_to_uint8(np.interp(_LEVELS, [p[0] for p in points], [p[1] for p in points])))
+
+def equalize_table(img_array):
+    """Histogram equalisation over all channels together, as skimage.exposure.equalize_hist does."""
+    img_array = as_uint8(img_array)
+    # calcHist counts the uint8 values directly; np.bincount would widen them to int64 first
+    hist = load('cv2').calcHist([img_array.reshape(-1, 1)], [0], None, [256], [0, 256]).ravel()
+    cdf = np.cumsum(hist, dtype=np.float64) / img_array.size
+    return _to_uint8(cdf * 255)
+
+def autocontrast_table(img_array):
+    """Stretch the image's own min..max range to 0..255, as skimage.exposure.rescale_intensity does."""
+    img_array = as_uint8(img_array)
+    low, high = int(img_array.min()), int(img_array.max())
+    if high == low:
+        return np.arange(256, dtype=np.uint8)
+    return np.clip((_LEVELS - low) * 255 / (high - low), 0, 255).astype(np.uint8)
+
+def compose(first, then):
+    """Table equivalent to applying ``first`` and then ``then``."""
+    return then[first]
+
+def apply_table(img_array, table):
+    """Look every value up in ``table``, overwriting ``img_array`` when it is uint8."""
+    img_array = as_uint8(img_array)
+    return load('cv2').LUT(img_array, table, dst=img_array)
+
+def color_table(method='rgb_to_hsv', gamma=1.0, factor=1.0, in_black=0, in_white=255, out_black=0, out_white=255,
+                points=None):
+    """Cached table for a parameter-only color_transformation method, or None."""
+    if method == 'gamma':
+        return gamma_table(float(gamma))
+    if method == 'contrast':
+        return contrast_table(float(factor))
+    if method == 'brightness':
+        return brightness_table(float(factor))
+    if method == 'levels':
+        return levels_table(in_black, in_white, float(gamma), out_black, out_white)
+    if method == 'curves':
+        return curves_table(tuple(tuple(point) for point in points or ((0, 0), (255, 255))))
+    return None
+
+def _binary_threshold(method='binary', threshold=127, block_size=11, c=2):
+    # Same signature and method fallback as image_processing.threshold_array
+    if method in ('adaptive', 'otsu', 'triangle'):
+        return None
+    return threshold_table(float(threshold))
+
+def pointwise_table(op_type, params):
+    """
+    Table for a /process step that maps each value independently, or None.
+
+    Returns (table, to_gray): binary threshold works on the grey conversion
+    of a colour frame, so it is fused only after that conversion.
+    """
+    if op_type == 'color_transformation':
+        table = color_table(**params)
+        return (table, False) if table is not None else None
+    if op_type == 'threshold':
+        table = _binary_threshold(**params)
+        return (table, True) if table is not None else None
+    return None
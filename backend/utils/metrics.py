@@ -0,0 +1,206 @@
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from .planner import VARIANTS, known_variant
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+MEGAPIXEL_BUCKETS = (0.1, 0.5, 1, 2, 4, 8, 12, 24, 48, 100)
+BYTES_BUCKETS = tuple(2 ** 20 * 4 ** i for i in range(7))  # 1 MB .. 4 GB
+
+def _escape(value):
+    # Label values in the Prometheus text format escape \\, " and newlines
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values=(), amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labels, label_values)} {_number(value)}')
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        names = self.labels + ('le',)
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets + ('+Inf',), series):
+                    lines.append(f'{self.name}_bucket{_labels(names, label_values + (bound,))} {count}')
+                labels = _labels(self.labels, label_values)
+                lines.append(f'{self.name}_sum{labels} {_number(series[-1])}')
+                lines.append(f'{self.name}_count{labels} {series[-2]}')
+        return lines
+
+def operation_name(operation):
+    """
+    Metric label for a /process step, e.g. 'noise_reduction.gaussian'.
+    Steps outside the /filters schema are all 'other', so requests cannot
+    add series.
+    """
+    op_type, params = operation.get('type'), operation.get('params')
+    if op_type in VARIANTS and isinstance(params, dict):
+        name, default = VARIANTS[op_type]
+        variant = params.get(name, default)
+        if known_variant(op_type, variant):
+            return f"{op_type}.{variant}"
+    return 'other'
+
+class Metrics:
+    """
+    Request instrumentation exported in the Prometheus text format.
+
+    Every request gets a breakdown of its stages (decode, each operation,
+    encode, base64) that is also aggregated into histograms, together with
+    the input megapixels and the peak allocation. Stages recorded outside a
+    request (job threads) still feed the histograms.
+
+    Parameters:
+    - trace_malloc: measure peak allocation with tracemalloc (accurate, but
+      slows allocation-heavy code; concurrent requests share one peak). When
+      off, the peak is the largest frame the request held.
+    """
+
+    def __init__(self, trace_malloc=False):
+        self.trace_malloc = trace_malloc
+        self._local = threading.local()
+        self.requests = Counter('imgproc_requests_total', 'Requests served.', ('endpoint', 'status'))
+        self.request_seconds = Histogram('imgproc_request_seconds', 'Request latency.',
+                                         SECONDS_BUCKETS, ('endpoint',))
+        self.stage_seconds = Histogram('imgproc_stage_seconds', 'Decode, encode and base64 time.',
+                                       SECONDS_BUCKETS, ('stage',))
+        self.operation_seconds = Histogram('imgproc_operation_seconds', 'Time spent in each operation.',
+                                           SECONDS_BUCKETS, ('operation',))
+        self.input_megapixels = Histogram('imgproc_input_megapixels', 'Decoded input size.',
+                                          MEGAPIXEL_BUCKETS, ('endpoint',))
+        self.megapixels = Counter('imgproc_megapixels_total', 'Megapixels decoded, for throughput.',
+                                  ('endpoint',))
+        self.peak_bytes = Histogram('imgproc_request_peak_bytes', 'Peak allocation per request.',
+                                    BYTES_BUCKETS, ('endpoint',))
+        if trace_malloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _current(self):
+        return getattr(self._local, 'request', None)
+
+    def begin(self, endpoint):
+        """Start recording a request on this thread."""
+        if self.trace_malloc:
+            tracemalloc.reset_peak()
+        self._local.request = {
+            'endpoint': endpoint,
+            'start': time.perf_counter(),
+            'timings': [],
+            'peak_bytes': 0,
+            'megapixels': 0
+        }
+
+    def end(self, status):
+        """
+        Finish the request on this thread and aggregate it. Returns its
+        [(stage, ms), ...] breakdown, or None if no request was started.
+        """
+        current = self._current()
+        if current is None:
+            return None
+        self._local.request = None
+        endpoint = current['endpoint']
+        self.requests.inc((endpoint, status))
+        self.request_seconds.observe((endpoint,), time.perf_counter() - current['start'])
+        if current['megapixels']:
+            self.input_megapixels.observe((endpoint,), current['megapixels'])
+            peak = tracemalloc.get_traced_memory()[1] if self.trace_malloc else current['peak_bytes']
+            self.peak_bytes.observe((endpoint,), peak)
+        return current['timings']
+
+    def _record(self, histogram, name, seconds):
+        histogram.observe((name,), seconds)
+        current = self._current()
+        if current is not None:
+            current['timings'].append((name, seconds * 1000))
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(self.stage_seconds, name, time.perf_counter() - start)
+
+    @contextmanager
+    def operation(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(self.operation_seconds, name, time.perf_counter() - start)
+
+    def on_step(self, operation, seconds, frame):
+        """run_frame_pipeline callback for a completed /process step."""
+        self._record(self.operation_seconds, operation_name(operation), seconds)
+        self._note_bytes(frame.nbytes)
+
+    def input_image(self, image):
+        """Record the decoded input of the current request."""
+        megapixels = image.width * image.height / 1e6
+        current = self._current()
+        endpoint = current['endpoint'] if current is not None else 'background'
+        self.megapixels.inc((endpoint,), megapixels)
+        if current is not None:
+            current['megapixels'] += megapixels
+        self._note_bytes(image.width * image.height * len(image.getbands()))
+
+    def _note_bytes(self, nbytes):
+        current = self._current()
+        if current is not None:
+            current['peak_bytes'] = max(current['peak_bytes'], nbytes)
+
+    def render(self):
+        lines = []
+        for metric in (self.requests, self.request_seconds, self.stage_seconds, self.operation_seconds,
+                       self.input_megapixels, self.megapixels, self.peak_bytes):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+def server_timing(timings):
+    """Format a stage breakdown as a Server-Timing header value."""
+    return ', '.join(f'{name};dur={ms:.2f}' for name, ms in timings)
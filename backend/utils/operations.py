@@ -0,0 +1,144 @@
+import os
+
+from PIL import Image, ImageEnhance
+
+from .background_removal import remove_background
+from .face_blur import blur_faces
+from .upscale import upscale_image
+
+# Operations served by the filename-based endpoints (/compress, /resize, ...)
+FILE_OPERATIONS = (
+    'compress', 'resize', 'crop', 'convert-to-jpg', 'upscale',
+    'remove-background', 'watermark', 'blur_face'
+)
+
+def resize_target(source_width, source_height, /, **kwargs):
+    """Output size of a resize step: explicit width/height, or percent of the source."""
+    if kwargs.get('width') and kwargs.get('height'):
+        return int(kwargs['width']), int(kwargs['height'])
+    if kwargs.get('percent'):
+        scale = float(kwargs['percent']) / 100
+        return max(1, round(source_width * scale)), max(1, round(source_height * scale))
+    raise ValueError("Resize needs width and height, or percent")
+
+def compress_target(source_width, source_height, /, max_width=None, max_height=None, **kwargs):
+    """Size a compress step shrinks the source to, or None if it already fits max_width/max_height."""
+    scale = min(
+        max_width / source_width if max_width else 1,
+        max_height / source_height if max_height else 1
+    )
+    if scale >= 1:
+        return None
+    return max(1, round(source_width * scale)), max(1, round(source_height * scale))
+
+def resolve_params(operation, source_width, source_height, params):
+    """
+    Pin size parameters that are relative to the source (resize by percent)
+    to absolute values, so the step gives the same result on a frame that
+    was decoded at reduced scale.
+    """
+    if operation == 'resize' and not (params.get('width') and params.get('height')) and params.get('percent'):
+        target_width, target_height = resize_target(source_width, source_height, **params)
+        params = dict(params, width=target_width, height=target_height)
+        del params['percent']
+    return params
+
+def decode_size(operation, source_width, source_height, /, **kwargs):
+    """
+    Smallest frame an operation needs from the source, or None if it needs
+    full resolution. JPEG uploads are then decoded at a reduced DCT scale
+    (Image.draft) instead of decoding every pixel and throwing most of them
+    away in the resize.
+    """
+    try:
+        if operation == 'resize':
+            target = resize_target(source_width, source_height, **kwargs)
+        elif operation == 'compress':
+            target = compress_target(source_width, source_height, **kwargs)
+        else:
+            return None
+    except (TypeError, ValueError):
+        return None
+    if target is None:
+        return None
+    # Keep twice the target like Image.thumbnail does, so the final resample
+    # still has real pixels to filter
+    draft = (target[0] * 2, target[1] * 2)
+    if draft[0] >= source_width or draft[1] >= source_height:
+        return None
+    return draft
+
+def prepare_watermark(path, width, height, opacity):
+    """Open a watermark image, resize it and scale its alpha by ``opacity``."""
+    watermark = Image.open(path).convert("RGBA")
+
+    # Resize watermark
+    watermark = watermark.resize((width, height))
+
+    # Adjust opacity
+    alpha = watermark.split()[3]
+    alpha = ImageEnhance.Brightness(alpha).enhance(opacity)
+    watermark.putalpha(alpha)
+    return watermark
+
+def apply_file_operation(img, img_format, operation, upload_folder, store=None, **kwargs):
+    """
+    Apply one filename-endpoint operation to an opened upload.
+
+    Parameters:
+    - img: PIL image opened from the upload folder
+    - img_format: lower-case format the result should be saved in by default
+    - operation: one of FILE_OPERATIONS
+    - upload_folder: folder other referenced uploads (watermarks) are read from
+    - store: optional utils.upload_store.UploadStore that caches prepared watermarks
+    - kwargs: operation parameters
+
+    Returns (image, output format, extra save options).
+    """
+    save_options = {}
+
+    if operation == 'compress':
+        quality = kwargs.get('quality', 85)
+        save_options = {'optimize': True, 'quality': quality}
+        target = compress_target(img.width, img.height, **kwargs)
+        if target:
+            img = img.resize(target, reducing_gap=3.0)
+    elif operation == 'resize':
+        img = img.resize(resize_target(img.width, img.height, **kwargs), reducing_gap=3.0)
+    elif operation == 'crop':
+        left = kwargs.get('left')
+        top = kwargs.get('top')
+        right = kwargs.get('right')
+        bottom = kwargs.get('bottom')
+        img = img.crop((left, top, right, bottom))
+    elif operation == 'convert-to-jpg':
+        img = img.convert('RGB')
+        img_format = 'jpeg'
+    elif operation == 'upscale':
+        method = kwargs.get('method', 'lanczos')
+        scale = kwargs.get('scale', 2.0)
+        img = upscale_image(img, scale=scale, method=method)
+    elif operation == 'remove-background':
+        img = remove_background(img)
+        img_format = 'png'  # Save as PNG to preserve transparency
+    elif operation == 'watermark':
+        watermark_filename = kwargs.get('watermark_filename')
+        x = kwargs.get('x', 0)
+        y = kwargs.get('y', 0)
+        width = kwargs.get('width')
+        height = kwargs.get('height')
+        opacity = kwargs.get('opacity', 0.5)
+
+        if store is not None:
+            watermark = store.watermark(watermark_filename, width, height, opacity, prepare_watermark)
+        else:
+            watermark = prepare_watermark(os.path.join(upload_folder, watermark_filename), width, height, opacity)
+
+        # Apply watermark
+        img.paste(watermark, (x, y), watermark)
+    elif operation == 'blur_face':
+        img, _ = blur_faces(img, method=kwargs.get('method', 'blur'), strength=kwargs.get('strength', 0.5))
+    else:
+        raise ValueError(f"Unsupported operation: {operation}")
+
+    return img, img_format, save_options
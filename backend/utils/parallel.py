@@ -0,0 +1,121 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from .tiling import iter_strips, run_regions, run_tiled
+
+# The scikit-image filters behind some /process steps run on one core, but
+# the scipy.ndimage, NumPy and PyWavelets loops they spend their time in
+# release the GIL. Such a step can therefore be split into overlapping
+# strips of the frame, or into its channels, that run on threads of one
+# request. OpenCV steps are left whole, since OpenCV already runs them on
+# its own threads.
+
+def split_kind(op_type, params):
+    """
+    How a step can be split so that the result matches the whole-frame
+    run exactly: 'strips' (needs only a border of neighbours, see
+    utils.tiling.tile_halo), 'channels' (denoises each YCbCr channel on its
+    own) or None. Canny is left whole, because its hysteresis follows edges
+    across the frame.
+    """
+    if op_type == 'edge_detection' and params.get('method', 'canny') in ('sobel', 'prewitt', 'roberts', 'laplace'):
+        return 'strips'
+    if op_type == 'noise_reduction' and params.get('method') == 'wavelet':
+        return 'channels'
+    return None
+
+class StepSplitter:
+    """
+    Threads that run the parts of split /process steps, shared by all
+    requests of a process.
+
+    Each split step leases threads for as long as it runs. A step gets an
+    even share of ``max_threads`` among the steps splitting at the same
+    time, capped by the threads still free, so one request uses every
+    thread when it is alone and concurrent requests do not oversubscribe
+    the CPUs. A step granted a single thread runs whole on the request thread.
+
+    Parameters:
+    - max_threads: threads all split steps together may use; 1 disables splitting
+    - min_megapixels: smaller frames run whole, as the strips would cost more than they save
+    """
+
+    def __init__(self, max_threads, min_megapixels=1.0):
+        self.max_threads = max_threads
+        self.min_megapixels = min_megapixels
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._splitting = 0
+        self._busy = 0
+        self.split_steps = 0
+        self.contended_steps = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix='split')
+                self._pid = os.getpid()
+                self._splitting = self._busy = 0
+            return self._executor
+
+    def applies(self, frame, operation):
+        return (self.max_threads > 1 and frame.shape[0] * frame.shape[1] >= self.min_megapixels * 1e6
+                and split_kind(operation['type'], operation['params']) is not None)
+
+    @contextmanager
+    def lease(self):
+        """Threads granted to one step: at least 1, at most its share of max_threads."""
+        self._get_executor()
+        with self._lock:
+            self._splitting += 1
+            share = max(1, self.max_threads // self._splitting)
+            threads = max(1, min(share, self.max_threads - self._busy))
+            self._busy += threads
+            if threads > 1:
+                self.split_steps += 1
+            else:
+                self.contended_steps += 1
+        try:
+            yield threads
+        finally:
+            with self._lock:
+                self._splitting -= 1
+                self._busy -= threads
+
+    def map(self, fn, items, threads):
+        """Yield fn(item) in order, with at most ``threads`` items running at once."""
+        executor = self._get_executor()
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= threads:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def run(self, frame, operation, processor, tiling, threads):
+        """Run one step split across ``threads`` threads (see split_kind)."""
+        op_type, params = operation['type'], operation['params']
+        map_fn = lambda fn, items: self.map(fn, items, threads)
+        if split_kind(op_type, params) == 'channels':
+            return processor(frame, map_fn=map_fn, **params)
+        if tiling is not None and tiling.applies(frame):
+            # Large frames keep their memory-bounded tiles, now several at a time
+            return run_tiled(frame, op_type, params, processor, tiling.memory_mb, map_fn)
+        return run_regions(frame, op_type, params, processor, iter_strips(frame.shape[0], frame.shape[1], threads),
+                           map_fn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_threads': self.max_threads,
+                'min_megapixels': self.min_megapixels,
+                'splitting': self._splitting,
+                'busy_threads': self._busy,
+                'split_steps': self.split_steps,
+                'contended_steps': self.contended_steps
+            }
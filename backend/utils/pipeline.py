@@ -0,0 +1,223 @@
+import time
+from collections.abc import Mapping
+
+import numpy as np
+from PIL import Image
+
+from .lazy_imports import load
+from .lut import apply_table, compose, pointwise_table
+from .tiling import run_tiled, worth_tiling
+
+# Operation types accepted by /process, mapped to their ndarray implementations
+# in image_processing. The module (and OpenCV with it) is imported on first use.
+PROCESSOR_NAMES = {
+    'threshold': 'threshold_array',
+    'edge_detection': 'edge_detection_array',
+    'noise_reduction': 'noise_reduction_array',
+    'morphological': 'morphological_array',
+    'color_transformation': 'color_transformation_array',
+    'special_effect': 'special_effect_array',
+    'geometric': 'geometric_transform_array'
+}
+
+# Methods and parameter ranges of each operation type, as served by /filters
+FILTERS = {
+    'threshold': {
+        'methods': ['binary', 'adaptive', 'otsu', 'triangle'],
+        'params': {
+            'threshold': {'min': 0, 'max': 255, 'default': 127},
+            'block_size': {'min': 3, 'max': 21, 'default': 11},
+            'c': {'min': -10, 'max': 10, 'default': 2}
+        }
+    },
+    'edge_detection': {
+        'methods': ['canny', 'sobel', 'laplace', 'prewitt', 'roberts'],
+        'params': {
+            'sigma': {'min': 0.1, 'max': 5.0, 'default': 2.0},
+            'low_threshold': {'min': 0, 'max': 255, 'default': 100},
+            'high_threshold': {'min': 0, 'max': 255, 'default': 200}
+        }
+    },
+    'noise_reduction': {
+        'methods': ['gaussian', 'median', 'bilateral', 'nlmeans', 'wavelet'],
+        'params': {
+            'kernel_size': {'min': 3, 'max': 15, 'default': 5},
+            'sigma': {'min': 0.1, 'max': 5.0, 'default': 1.5}
+        }
+    },
+    'morphological': {
+        'operations': ['dilate', 'erode', 'opening', 'closing', 'gradient', 'tophat', 'blackhat'],
+        'params': {
+            'kernel_size': {'min': 3, 'max': 15, 'default': 5},
+            'iterations': {'min': 1, 'max': 10, 'default': 1}
+        }
+    },
+    'color_transformation': {
+        'methods': ['rgb_to_hsv', 'rgb_to_lab', 'grayscale', 'gamma', 'equalize', 'autocontrast',
+                    'brightness', 'contrast', 'levels', 'curves'],
+        'params': {
+            'gamma': {'min': 0.1, 'max': 5.0, 'default': 1.0},
+            'factor': {'min': 0.0, 'max': 3.0, 'default': 1.0},
+            'in_black': {'min': 0, 'max': 255, 'default': 0},
+            'in_white': {'min': 0, 'max': 255, 'default': 255},
+            'out_black': {'min': 0, 'max': 255, 'default': 0},
+            'out_white': {'min': 0, 'max': 255, 'default': 255},
+            'points': {'default': [[0, 0], [255, 255]]}
+        }
+    },
+    'special_effect': {
+        'effects': ['cartoon', 'oil_painting', 'pencil_sketch', 'watercolor', 'pixelate'],
+        'params': {
+            'strength': {'min': 0.1, 'max': 1.0, 'default': 0.5}
+        }
+    }
+}
+
+class _LazyProcessors(Mapping):
+    def __getitem__(self, key):
+        return getattr(load('utils.image_processing'), PROCESSOR_NAMES[key])
+
+    def __iter__(self):
+        return iter(PROCESSOR_NAMES)
+
+    def __len__(self):
+        return len(PROCESSOR_NAMES)
+
+ARRAY_PROCESSORS = _LazyProcessors()
+
+def image_to_frame(image):
+    """Copy a PIL image into a writable, C-contiguous uint8 array owned by the pipeline."""
+    return np.array(image)
+
+def frame_to_image(frame):
+    """Wrap the final frame as a PIL image."""
+    return Image.fromarray(frame)
+
+def _check_frame(frame):
+    # Image.fromarray used to run after every step and rejected anything that
+    # was not 8-bit; keep rejecting those results so the step is skipped.
+    if not isinstance(frame, np.ndarray) or frame.dtype != np.uint8:
+        raise TypeError(f"Cannot handle this data type: {getattr(frame, 'dtype', type(frame))}")
+    return np.ascontiguousarray(frame)
+
+def apply_step(frame, operation, tiling=None, splitter=None):
+    """
+    Run one operation, tile by tile when the tiling policy applies and
+    tiling the step saves memory (see utils.tiling.worth_tiling), split across threads when a utils.parallel.StepSplitter
+    is given and grants them.
+    """
+    processor = ARRAY_PROCESSORS[operation['type']]
+    params = operation['params']
+    if splitter is not None and splitter.applies(frame, operation):
+        with splitter.lease() as threads:
+            if threads > 1:
+                return splitter.run(frame, operation, processor, tiling, threads)
+    if tiling is not None and tiling.applies(frame) and worth_tiling(operation['type'], params):
+        return run_tiled(frame, operation['type'], params, processor, tiling.memory_mb)
+    return processor(frame, **params)
+
+def _pointwise(frame, operation):
+    """(table, to_gray) if the step can be folded into a lookup table on this frame, else None."""
+    if frame.dtype != np.uint8:
+        return None
+    pointwise = pointwise_table(operation['type'], operation['params'])
+    # Binary threshold converts RGB to grey first and takes grey frames as they are
+    if pointwise is not None and pointwise[1] and not (frame.ndim == 2 or frame.shape[2] == 3):
+        return None
+    return pointwise
+
+class _FusedSteps:
+    """Consecutive pointwise steps composed into one table, applied in a single pass."""
+
+    def __init__(self):
+        self.table = None
+        self.steps = []
+        self.done = 0
+
+    def add(self, table, operation, seconds, done):
+        self.table = table if self.table is None else compose(self.table, table)
+        self.steps.append([operation, seconds])
+        self.done = done
+
+    def flush(self, frame, on_step=None, on_checkpoint=None):
+        if self.table is None:
+            return frame
+        start = time.perf_counter()
+        frame = apply_table(frame, self.table)
+        # The lookup itself is reported as part of the last step
+        self.steps[-1][1] += time.perf_counter() - start
+        if on_step:
+            for operation, seconds in self.steps:
+                on_step(operation, seconds, frame)
+        if on_checkpoint:
+            on_checkpoint(self.done, frame)
+        self.table = None
+        self.steps = []
+        return frame
+
+def run_frame_pipeline(frame, operations, on_error=None, tiling=None, on_step=None, on_checkpoint=None,
+                       splitter=None):
+    """
+    Apply a list of /process operations to an ndarray frame.
+
+    Parameters:
+    - frame: uint8 array owned by the caller; it may be overwritten in place
+    - operations: list of {'type': ..., 'params': {...}} dicts
+    - on_error: optional callback(operation, exception) for steps that fail
+    - tiling: optional utils.tiling.TilingPolicy for large frames
+    - on_step: optional callback(operation, seconds, frame) after each step that succeeds
+    - on_checkpoint: optional callback(i, frame) whenever ``frame`` is the
+      result of the first i operations; the frame is modified afterwards,
+      so the callback must copy what it keeps
+    - splitter: optional utils.parallel.StepSplitter to run a step on several threads
+
+    Invalid or failing steps are skipped, matching the behaviour of /process.
+    Runs of pointwise steps (gamma, brightness, contrast, levels, curves,
+    binary threshold) are fused into one 256-entry table (utils/lut.py), so
+    there is one checkpoint at the end of each run.
+    """
+    fused = _FusedSteps()
+    for done, operation in enumerate(operations, 1):
+        if 'type' not in operation or 'params' not in operation:
+            continue
+
+        if operation['type'] in ARRAY_PROCESSORS:
+            start = time.perf_counter()
+            try:
+                pointwise = _pointwise(frame, operation)
+                if pointwise is not None:
+                    table, to_gray = pointwise
+                    if to_gray and frame.ndim == 3:
+                        frame = fused.flush(frame, on_step, on_checkpoint)
+                        frame = load('cv2').cvtColor(frame, load('cv2').COLOR_RGB2GRAY)
+                    fused.add(table, operation, time.perf_counter() - start, done)
+                    continue
+            except Exception as e:
+                if on_error:
+                    on_error(operation, e)
+                continue
+
+            frame = fused.flush(frame, on_step, on_checkpoint)
+            start = time.perf_counter()
+            try:
+                frame = _check_frame(apply_step(frame, operation, tiling, splitter))
+            except Exception as e:
+                if on_error:
+                    on_error(operation, e)
+                continue
+            if on_step:
+                on_step(operation, time.perf_counter() - start, frame)
+            if on_checkpoint:
+                on_checkpoint(done, frame)
+    return fused.flush(frame, on_step, on_checkpoint)
+
+def run_pipeline(image, operations, on_error=None, tiling=None, on_step=None, splitter=None):
+    """
+    Apply a list of /process operations to a PIL image.
+
+    The image is converted to an ndarray once, every step runs on that array
+    (in place where the operation allows), and the result is converted back
+    to PIL once at the end.
+    """
+    frame = run_frame_pipeline(image_to_frame(image), operations, on_error, tiling, on_step, splitter=splitter)
+    return frame_to_image(frame)
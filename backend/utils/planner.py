@@ -0,0 +1,413 @@
+import numpy as np
+
+from .lut import pointwise_table
+from .pipeline import FILTERS
+
+# /process chains are checked against the /filters schema before the source
+# is decoded, then planned: the chain is rewritten into one that does less
+# work and its cost is estimated. 'exact' plans only make rewrites that keep
+# every output pixel; 'fast' plans also move and merge steps, which changes
+# the result: value adjustments moved across a resize and merged resizes
+# give a similar image, not the same pixels. 'off' runs the chain as sent.
+PLAN_MODES = ('off', 'exact', 'fast')
+
+# Parameter that selects the variant of each operation type, and the variant
+# its processor falls back to when none is given
+VARIANTS = {
+    'threshold': ('method', 'binary'),
+    'edge_detection': ('method', 'canny'),
+    'noise_reduction': ('method', 'gaussian'),
+    'morphological': ('operation', 'dilate'),
+    'color_transformation': ('method', 'rgb_to_hsv'),
+    'special_effect': ('effect', 'cartoon'),
+    'geometric': ('operation', 'resize')
+}
+
+# The geometric step is accepted by /process but not listed by /filters
+GEOMETRIC_SCHEMA = {
+    'operations': ['resize', 'rotate', 'affine', 'perspective'],
+    'params': {
+        'width': {'min': 1, 'max': 32767},
+        'height': {'min': 1, 'max': 32767},
+        # cv2.rotate codes: 0 clockwise, 1 half turn, 2 counter-clockwise
+        'angle': {'min': 0, 'max': 2},
+        'matrix': {}
+    }
+}
+
+# Parameters a geometric step fails without
+GEOMETRIC_REQUIRED = {
+    'resize': ('width', 'height'),
+    'rotate': ('angle',),
+    'affine': ('matrix',),
+    'perspective': ('matrix',)
+}
+
+# Variants that only work on three-channel frames
+NEEDS_RGB = {
+    'color_transformation': ('rgb_to_hsv', 'rgb_to_lab'),
+    'noise_reduction': ('nlmeans',),
+    'special_effect': ('cartoon', 'pencil_sketch', 'watercolor')
+}
+
+# Linear steps that treat every channel alike. The grey conversion is a
+# weighted sum of the channels, so a later conversion can be done before
+# them instead and the result only differs by rounding. Nonlinear steps
+# (median, bilateral, morphology, value adjustments) do not commute with it.
+GRAY_SAFE = {
+    'noise_reduction': ('gaussian',),
+    'geometric': ('resize', 'rotate', 'affine', 'perspective')
+}
+
+# Rough single-core cost at the /filters defaults, from
+# benchmarks/filter_benchmark.py on a 2 MP frame. SAMPLE_NS is per pixel and
+# channel; GRAY_PIXEL_NS is per pixel for steps that work on the grey image,
+# plus GRAY_CONVERSION_NS per pixel when they get a colour frame. A run of
+# fused pointwise steps costs one TABLE_NS pass. Kernel-size dependent steps
+# are modelled in _step_ns.
+SAMPLE_NS = {
+    ('noise_reduction', 'nlmeans'): 1000,
+    ('noise_reduction', 'wavelet'): 200,
+    ('color_transformation', 'rgb_to_hsv'): 0.6,
+    ('color_transformation', 'rgb_to_lab'): 2.5,
+    ('color_transformation', 'equalize'): 1.5,
+    ('color_transformation', 'autocontrast'): 0.55,
+    ('special_effect', 'cartoon'): 45,
+    ('special_effect', 'oil_painting'): 150,
+    ('special_effect', 'pencil_sketch'): 100,
+    ('special_effect', 'watercolor'): 420,
+    ('special_effect', 'pixelate'): 0.6,
+    ('geometric', 'rotate'): 0.35,
+    ('geometric', 'affine'): 3.5,
+    ('geometric', 'perspective'): 3.5
+}
+GRAY_PIXEL_NS = {
+    ('threshold', 'binary'): 0.5,
+    ('threshold', 'adaptive'): 10,
+    ('threshold', 'otsu'): 1.2,
+    ('threshold', 'triangle'): 1.0,
+    ('edge_detection', 'canny'): 128,
+    ('edge_detection', 'sobel'): 47,
+    ('edge_detection', 'laplace'): 10.6,
+    ('edge_detection', 'prewitt'): 51,
+    ('edge_detection', 'roberts'): 37,
+    ('color_transformation', 'grayscale'): 0
+}
+GRAY_CONVERSION_NS = 0.8
+TABLE_NS = 0.4
+
+_IDENTITY = np.arange(256, dtype=np.uint8)
+
+def _schema(op_type):
+    return GEOMETRIC_SCHEMA if op_type == 'geometric' else FILTERS[op_type]
+
+def known_variant(op_type, variant):
+    """Whether /process accepts a step of this type and variant."""
+    if op_type not in VARIANTS:
+        return False
+    variants = _schema(op_type)[VARIANTS[op_type][0] + 's']
+    return isinstance(variant, str) and variant in variants
+
+def check_operations(operations):
+    """
+    Validate normalized /process steps against the /filters schema.
+
+    Raises ValueError naming the first step (counted from 1) with an unknown
+    type or variant, an unknown parameter or a value out of range.
+    """
+    for number, operation in enumerate(operations, 1):
+        op_type = operation['type']
+        if op_type not in VARIANTS:
+            raise ValueError(f"Step {number}: unsupported operation type: {op_type}")
+        if not isinstance(operation['params'], dict):
+            raise ValueError(f"Step {number}: params must be an object")
+        schema = _schema(op_type)
+        name = VARIANTS[op_type][0]
+        for key, value in operation['params'].items():
+            if key == name:
+                if value not in schema[name + 's']:
+                    raise ValueError(f"Step {number}: unsupported {op_type} {name}: {value}")
+            elif key not in schema['params']:
+                raise ValueError(f"Step {number}: unknown {op_type} parameter: {key}")
+            elif 'min' in schema['params'][key]:
+                limits = schema['params'][key]
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    raise ValueError(f"Step {number}: {key} must be a number")
+                if not limits['min'] <= value <= limits['max']:
+                    raise ValueError(f"Step {number}: {key} must be between {limits['min']} and {limits['max']}")
+
+def _variant(operation):
+    name, default = VARIANTS.get(operation['type'], (None, None))
+    return operation['params'].get(name, default)
+
+def _label(operation):
+    return f"{operation['type']}.{_variant(operation)}"
+
+def _table(operation):
+    # (table, to_gray) for a step the pipeline fuses into a lookup, else None
+    try:
+        return pointwise_table(operation['type'], operation['params'])
+    except Exception:
+        return None
+
+def _is_color_table(operation):
+    return operation['type'] == 'color_transformation' and _table(operation) is not None
+
+def _fails(operation, name, channels):
+    if operation['type'] == 'geometric':
+        return any(operation['params'].get(key) is None for key in GEOMETRIC_REQUIRED.get(name, ()))
+    return channels != 3 and name in NEEDS_RGB.get(operation['type'], ())
+
+def _trace(steps, shape):
+    """Yield (operation, variant, shape before, shape after or None if it fails) along a chain."""
+    for operation in steps:
+        name = _variant(operation)
+        width, height, channels = shape
+        if _fails(operation, name, channels):
+            yield operation, name, shape, None
+            continue
+        if operation['type'] == 'geometric' and name == 'resize':
+            width, height = operation['params']['width'], operation['params']['height']
+        elif operation['type'] == 'geometric' and name == 'rotate' and operation['params']['angle'] in (0, 2):
+            width, height = height, width
+        if operation['type'] in ('threshold', 'edge_detection') or name == 'grayscale':
+            channels = 1
+        after = (width, height, channels)
+        yield operation, name, shape, after
+        shape = after
+
+def _step_ns(operation, name, before, after):
+    op_type, params = operation['type'], operation['params']
+    pixels = before[0] * before[1]
+    samples = pixels * before[2]
+    if (op_type, name) in GRAY_PIXEL_NS:
+        convert = GRAY_CONVERSION_NS * pixels if before[2] == 3 else 0
+        return convert + GRAY_PIXEL_NS[(op_type, name)] * pixels
+    if op_type == 'noise_reduction' and name in ('gaussian', 'median', 'bilateral'):
+        k = params.get('kernel_size', 5)
+        per_sample = {
+            'gaussian': 0.75 + 0.17 * k,
+            # OpenCV's uint8 median sorts small windows; from 7 it switches to
+            # a constant-time histogram method that is slower but flat in k
+            # (kernel_benchmark.py: 260-300 ms for k = 7..11 on 2 MP RGB)
+            'median': 0.4 if k <= 3 else 2.0 if k <= 5 else 45,
+            'bilateral': 6.3 * (k / 5) ** 3
+        }[name]
+        return per_sample * samples
+    if op_type == 'morphological':
+        k = params.get('kernel_size', 5)
+        if name in ('dilate', 'erode'):
+            # Iterations are folded into one larger rectangle
+            return (0.1 + 0.017 * (params.get('iterations', 1) * (k - 1) + 1)) * samples
+        extra = 0.25 if name in ('gradient', 'tophat', 'blackhat') else 0
+        return (2 * (0.1 + 0.017 * k) + extra) * samples
+    if op_type == 'geometric' and name == 'resize':
+        return 0.07 * samples + 0.7 * after[0] * after[1] * after[2]
+    return SAMPLE_NS.get((op_type, name), 1.0) * samples
+
+def estimate_ms(steps, width, height, channels=3, frames=1):
+    """Estimated single-core time of a chain on a width x height frame, in milliseconds."""
+    total = 0.0
+    in_table = False
+    for operation, name, before, after in _trace(steps, (width, height, channels)):
+        if after is None:
+            continue
+        pointwise = _table(operation)
+        if pointwise is None:
+            total += _step_ns(operation, name, before, after)
+            in_table = False
+            continue
+        # Binary threshold flushes the running table and converts to grey first
+        to_gray = pointwise[1] and before[2] == 3
+        if to_gray:
+            total += GRAY_CONVERSION_NS * before[0] * before[1]
+        if to_gray or not in_table:
+            total += TABLE_NS * after[0] * after[1] * after[2]
+        in_table = True
+    return round(total * frames / 1e6, 2)
+
+def _simplify(steps, shape, rewrites, exact_size):
+    # Rewrites that leave every output pixel unchanged
+    out = []
+    for operation, name, before, after in _trace(steps, shape):
+        label = _label(operation)
+        if after is None:
+            reason = 'is missing parameters' if operation['type'] == 'geometric' else 'needs a colour frame'
+            rewrites.append(f"dropped {label}: {reason}")
+            continue
+        pointwise = _table(operation)
+        if pointwise is not None and not pointwise[1] and np.array_equal(pointwise[0], _IDENTITY):
+            rewrites.append(f"dropped {label}: leaves every value unchanged")
+            continue
+        if exact_size and operation['type'] == 'geometric' and name == 'resize' and after == before:
+            rewrites.append(f"dropped {label}: the frame is already {after[0]}x{after[1]}")
+            continue
+        if out and _merge_morphology(out[-1], operation) is not None:
+            merged = _merge_morphology(out[-1], operation)
+            size = merged['params']['kernel_size']
+            rewrites.append(f"merged two {label} steps into one {size}x{size} {name}")
+            out[-1] = merged
+            continue
+        out.append(operation)
+    return out
+
+def _merge_morphology(first, second):
+    # Two dilations (or erosions) by odd rectangles are one dilation by a rectangle
+    # spanning both, with OpenCV's default border (kernel_benchmark.py --verify)
+    if first['type'] != 'morphological' or second['type'] != 'morphological':
+        return None
+    name = _variant(first)
+    if name not in ('dilate', 'erode') or _variant(second) != name:
+        return None
+    reach = 1
+    for operation in (first, second):
+        k = operation['params'].get('kernel_size', 5)
+        if k % 2 == 0:
+            return None
+        reach += operation['params'].get('iterations', 1) * (k - 1)
+    return {'type': 'morphological', 'params': {'operation': name, 'kernel_size': reach, 'iterations': 1}}
+
+def _resize_directions(steps, shape):
+    # 'down' or 'up' for every resize that changes the pixel count, by step identity
+    directions = {}
+    for operation, name, before, after in _trace(steps, shape):
+        if after is not None and operation['type'] == 'geometric' and name == 'resize':
+            pixels_before, pixels_after = before[0] * before[1], after[0] * after[1]
+            if pixels_after != pixels_before:
+                directions[id(operation)] = 'down' if pixels_after < pixels_before else 'up'
+    return directions
+
+def _sink_pointwise(steps, shape, rewrites):
+    # Run value adjustments on whichever side of a resize has fewer pixels.
+    # Only linear adjustments commute with resampling; for curves, gamma or
+    # clipping the result changes, which is why this is a 'fast' rewrite
+    directions = _resize_directions(steps, shape)
+    out = []
+    for operation in steps:
+        moved = []
+        if directions.get(id(operation)) == 'down':
+            while out and _is_color_table(out[-1]):
+                moved.insert(0, out.pop())
+        out.append(operation)
+        out.extend(moved)
+        if moved:
+            size = f"{operation['params']['width']}x{operation['params']['height']}"
+            rewrites.append(f"moved {', '.join(_label(step) for step in moved)} after the downscale to {size} "
+                            f"(changes the result)")
+
+    steps, out = out, []
+    index = 0
+    while index < len(steps):
+        operation = steps[index]
+        index += 1
+        if directions.get(id(operation)) != 'up':
+            out.append(operation)
+            continue
+        moved = []
+        while index < len(steps) and _is_color_table(steps[index]):
+            moved.append(steps[index])
+            index += 1
+        out.extend(moved)
+        out.append(operation)
+        if moved:
+            size = f"{operation['params']['width']}x{operation['params']['height']}"
+            rewrites.append(f"moved {', '.join(_label(step) for step in moved)} before the upscale to {size} "
+                            f"(changes the result)")
+    return out
+
+def _merge_resizes(steps, shape, rewrites):
+    # Consecutive downscales (or upscales) become one resize to the last size;
+    # a downscale followed by an upscale is kept, it may be a deliberate blur
+    directions = _resize_directions(steps, shape)
+    out = []
+    for operation in steps:
+        direction = directions.get(id(operation))
+        if direction and out and directions.get(id(out[-1])) == direction:
+            previous = out.pop()
+            rewrites.append(f"merged the resize to {previous['params']['width']}x{previous['params']['height']} "
+                            f"into the next one to {operation['params']['width']}x{operation['params']['height']} "
+                            f"(changes the result)")
+        out.append(operation)
+    return out
+
+def _gray_early(steps, shape, rewrites):
+    # Threshold and edge detection only look at the grey image, so linear
+    # steps leading up to them can run on one channel instead of three. The
+    # conversion goes wherever in that run the cost estimate is lowest (after
+    # a downscale rather than before it)
+    out = []
+    run_start = None
+    for operation, name, before, after in _trace(steps, shape):
+        if after is not None and before[2] == 3:
+            if operation['type'] in ('threshold', 'edge_detection') and run_start is not None:
+                gray = {'type': 'color_transformation', 'params': {'method': 'grayscale'}}
+                candidates = [out[:index] + [gray] + out[index:] for index in range(run_start, len(out))]
+                best = min(candidates, key=lambda chain: estimate_ms(chain + [operation], *shape))
+                if estimate_ms(best + [operation], *shape) < estimate_ms(out + [operation], *shape):
+                    moved = best[best.index(gray) + 1:]
+                    rewrites.append(f"converted to grey before {', '.join(_label(step) for step in moved)}: "
+                                    f"{_label(operation)} only uses the grey image (differs by rounding)")
+                    out = best
+                run_start = None
+                out.append(operation)
+                continue
+            if name in GRAY_SAFE.get(operation['type'], ()):
+                if run_start is None:
+                    run_start = len(out)
+                out.append(operation)
+                continue
+        run_start = None
+        out.append(operation)
+    return out
+
+class Plan:
+    """The steps a /process chain runs as, the rewrites that led to them and their estimated cost."""
+
+    def __init__(self, mode, operations, rewrites, estimated_ms, unplanned_ms):
+        self.mode = mode
+        self.operations = operations
+        self.rewrites = rewrites
+        self.estimated_ms = estimated_ms
+        self.unplanned_ms = unplanned_ms
+
+    def to_dict(self):
+        return {
+            'mode': self.mode,
+            'operations': self.operations,
+            'rewrites': self.rewrites,
+            'estimated_ms': self.estimated_ms,
+            'unplanned_ms': self.unplanned_ms
+        }
+
+def plan_operations(operations, width, height, channels=3, mode='exact', frames=1, exact_size=True):
+    """
+    Plan a validated /process chain for a width x height frame.
+
+    Parameters:
+    - operations: normalized steps that passed check_operations
+    - width, height, channels: the frame the chain starts on
+    - mode: one of PLAN_MODES
+    - frames: number of frames the chain runs on, for the cost estimate
+    - exact_size: False when width and height are only nominal (previews of
+      clips), which disables rewrites that depend on the exact frame size
+
+    Returns a Plan. Steps that would fail on the frame are left out of the
+    plan; the pipeline skipped them before as well.
+    """
+    if mode not in PLAN_MODES:
+        raise ValueError(f"Unsupported plan mode: {mode} (use {', '.join(PLAN_MODES)})")
+    shape = (width, height, channels)
+    steps = list(operations)
+    rewrites = []
+    if mode != 'off':
+        steps = _simplify(steps, shape, rewrites, exact_size)
+    if mode == 'fast':
+        steps = _sink_pointwise(steps, shape, rewrites)
+        steps = _merge_resizes(steps, shape, rewrites)
+        steps = _gray_early(steps, shape, rewrites)
+        steps = _simplify(steps, shape, rewrites, exact_size)
+    return Plan(
+        mode, steps, rewrites,
+        estimate_ms(steps, width, height, channels, frames),
+        estimate_ms(operations, width, height, channels, frames)
+    )
@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .result_cache import make_key
+
+def prefix_keys(source_key, operations):
+    """
+    Keys of the frames along a chain: keys[0] is the decoded source and
+    keys[i] the frame after the first i steps. Each key hashes the previous
+    one with the next step, so a chain shares keys with every chain that
+    starts the same way.
+    """
+    keys = [source_key]
+    for operation in operations:
+        keys.append(make_key(keys[-1], 'step', operation))
+    return keys
+
+class PrefixCache:
+    """
+    Intermediate frames of /process chains, per editing session.
+
+    An editor that changes a parameter near the end of a long chain sends
+    the whole chain again; with the frames after each step kept, only the
+    steps from the first changed one on are recomputed. Frames are stored
+    read-only and handed out as copies, since the pipeline works in place.
+
+    The least recently used frames are evicted once a session holds more
+    than ``session_max_bytes`` or all sessions together more than
+    ``max_bytes``. Sessions idle for ``ttl_seconds`` are dropped whole.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, session_max_bytes=128 * 1024 * 1024, ttl_seconds=900):
+        self.max_bytes = max_bytes
+        self.session_max_bytes = session_max_bytes
+        self.ttl_seconds = ttl_seconds
+        # (session, key) -> frame, least recently used first
+        self._frames = OrderedDict()
+        self._bytes = 0
+        # session -> {'bytes': ..., 'used': ..., 'sources': {source key: (width, height)}}
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reused_steps = 0
+        self.evictions = 0
+        self.expired_sessions = 0
+
+    def _session(self, session):
+        # Called with the lock held
+        now = time.time()
+        if self.ttl_seconds:
+            for name, record in list(self._sessions.items()):
+                if name != session and now - record['used'] > self.ttl_seconds:
+                    self._drop(name)
+                    self.expired_sessions += 1
+        record = self._sessions.setdefault(session, {'bytes': 0, 'used': now, 'sources': {}})
+        record['used'] = now
+        return record
+
+    def _evict(self, entry):
+        frame = self._frames.pop(entry)
+        self._bytes -= frame.nbytes
+        self._sessions[entry[0]]['bytes'] -= frame.nbytes
+        self.evictions += 1
+
+    def _drop(self, session):
+        freed = 0
+        for entry in [entry for entry in self._frames if entry[0] == session]:
+            freed += self._frames.pop(entry).nbytes
+        self._bytes -= freed
+        self._sessions.pop(session, None)
+        return freed
+
+    def source_size(self, session, source_key):
+        """(width, height) of a source this session has decoded before, or None."""
+        with self._lock:
+            return self._session(session)['sources'].get(source_key)
+
+    def remember_source(self, session, source_key, size):
+        with self._lock:
+            self._session(session)['sources'][source_key] = size
+
+    def resume(self, session, keys):
+        """
+        (i, copy of the frame after i steps) for the longest prefix of
+        ``keys`` (see prefix_keys) this session has a frame for, or (0, None).
+        """
+        with self._lock:
+            self._session(session)
+            for index in range(len(keys) - 1, -1, -1):
+                frame = self._frames.get((session, keys[index]))
+                if frame is not None:
+                    self._frames.move_to_end((session, keys[index]))
+                    self.hits += 1
+                    self.reused_steps += index
+                    break
+            else:
+                self.misses += 1
+                return 0, None
+        return index, frame.copy()
+
+    def put(self, session, key, frame):
+        """Keep a copy of ``frame`` under ``key`` for ``session``, evicting older frames as needed."""
+        size = frame.nbytes
+        if size > min(self.session_max_bytes, self.max_bytes):
+            return
+        with self._lock:
+            if (session, key) in self._frames:
+                self._frames.move_to_end((session, key))
+                return
+        stored = frame.copy()
+        stored.setflags(write=False)
+        with self._lock:
+            record = self._session(session)
+            if (session, key) in self._frames:
+                return
+            while record['bytes'] + size > self.session_max_bytes:
+                self._evict(next(entry for entry in self._frames if entry[0] == session))
+            while self._bytes + size > self.max_bytes:
+                self._evict(next(iter(self._frames)))
+            self._frames[(session, key)] = stored
+            self._bytes += size
+            record['bytes'] += size
+
+    def drop_session(self, session):
+        """Forget a session's frames (the editor was closed); returns the bytes freed."""
+        with self._lock:
+            return self._drop(session)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'frames': len(self._frames),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'session_max_bytes': self.session_max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'reused_steps': self.reused_steps,
+                'evictions': self.evictions,
+                'expired_sessions': self.expired_sessions
+            }
@@ -0,0 +1,177 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+CAPTURE_ID = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$')
+
+def folded_stack(frame):
+    """Collapse a frame's call stack into flamegraph 'folded' form, root first."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class SlowRequestProfiler:
+    """
+    Stack-sampling profiler for requests that run longer than a threshold.
+
+    Requests only register their thread when they start. A sampler thread
+    wakes every ``interval_ms`` and samples the stacks of requests that have
+    been running for at least ``arm_ms``, so fast requests are never sampled.
+    When a request ends after ``slow_ms`` or more its samples are written to
+    ``folder`` as a folded-stack profile (flamegraph.pl, speedscope) plus a
+    JSON description; otherwise they are dropped.
+
+    Parameters:
+    - folder: where captures are stored
+    - slow_ms: latency that triggers a capture; 0 disables the profiler
+    - arm_ms: request age at which sampling starts (default slow_ms / 2)
+    - interval_ms: sampling interval
+    - max_captures: oldest captures beyond this are deleted
+    """
+
+    def __init__(self, folder, slow_ms=0, arm_ms=None, interval_ms=10, max_captures=50):
+        self.folder = folder
+        self.slow_ms = slow_ms
+        self.arm_ms = slow_ms / 2 if arm_ms is None else arm_ms
+        self.interval_ms = interval_ms
+        self.max_captures = max_captures
+        self._active = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sampler_pid = None
+
+    @property
+    def enabled(self):
+        return self.slow_ms > 0
+
+    def _ensure_sampler(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        if self._sampler_pid != os.getpid():
+            self._sampler_pid = os.getpid()
+            threading.Thread(target=self._sample_loop, name='slow-request-profiler', daemon=True).start()
+
+    def _sample_loop(self):
+        interval = self.interval_ms / 1000
+        me = threading.get_ident()
+        while True:
+            time.sleep(interval)
+            armed_before = time.perf_counter() - self.arm_ms / 1000
+            # Sample under the lock so end() never reads a record mid-update
+            with self._lock:
+                armed = [(tid, record) for tid, record in self._active.items()
+                         if record['start'] <= armed_before and tid != me]
+                if not armed:
+                    continue
+                frames = sys._current_frames()
+                for tid, record in armed:
+                    frame = frames.get(tid)
+                    if frame is not None:
+                        record['stacks'][folded_stack(frame)] += 1
+                del frames
+
+    def begin(self):
+        """Register the calling thread's request."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._ensure_sampler()
+            record = {'start': time.perf_counter(), 'stacks': Counter(), 'info': {}}
+            self._active[threading.get_ident()] = record
+        self._local.record = record
+
+    def annotate(self, **info):
+        """Attach details (operations, dimensions, ...) to the calling thread's request."""
+        record = getattr(self._local, 'record', None)
+        if record is not None:
+            record['info'].update(info)
+
+    def end(self, endpoint, status, timings=None):
+        """Finish the calling thread's request; returns the capture id if one was written."""
+        record = getattr(self._local, 'record', None)
+        if record is None:
+            return None
+        self._local.record = None
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+        duration_ms = (time.perf_counter() - record['start']) * 1000
+        if duration_ms < self.slow_ms or not record['stacks']:
+            return None
+        try:
+            return self._write(record, endpoint, status, duration_ms, timings)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error writing profile capture: {e}")
+            return None
+
+    def _write(self, record, endpoint, status, duration_ms, timings):
+        os.makedirs(self.folder, exist_ok=True)
+        capture_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        meta = dict(record['info'], **{
+            'id': capture_id,
+            'endpoint': endpoint,
+            'status': status,
+            'created': time.time(),
+            'duration_ms': round(duration_ms, 2),
+            'samples': sum(record['stacks'].values()),
+            'interval_ms': self.interval_ms,
+            'timings': [[name, round(ms, 2)] for name, ms in timings or []]
+        })
+        with open(os.path.join(self.folder, f'{capture_id}.folded'), 'w') as f:
+            for stack, count in record['stacks'].most_common():
+                f.write(f'{stack} {count}\n')
+        with open(os.path.join(self.folder, f'{capture_id}.json'), 'w') as f:
+            json.dump(meta, f)
+        self._prune()
+        return capture_id
+
+    def _prune(self):
+        captures = self.list()
+        for meta in captures[self.max_captures:]:
+            for suffix in ('.json', '.folded'):
+                try:
+                    os.remove(os.path.join(self.folder, meta['id'] + suffix))
+                except OSError:
+                    pass
+
+    def list(self):
+        """Descriptions of the stored captures, newest first."""
+        captures = []
+        try:
+            names = os.listdir(self.folder)
+        except FileNotFoundError:
+            return captures
+        for name in names:
+            if name.endswith('.json'):
+                try:
+                    with open(os.path.join(self.folder, name)) as f:
+                        captures.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        captures.sort(key=lambda meta: meta['created'], reverse=True)
+        return captures
+
+    def capture_path(self, capture_id, suffix='.folded'):
+        """Path of a stored capture file; raises FileNotFoundError for unknown ids."""
+        path = os.path.join(self.folder, capture_id + suffix)
+        if not CAPTURE_ID.match(capture_id) or not os.path.exists(path):
+            raise FileNotFoundError(capture_id)
+        return path
+
+    def stats(self):
+        with self._lock:
+            active = len(self._active)
+        return {
+            'enabled': self.enabled,
+            'slow_ms': self.slow_ms,
+            'arm_ms': self.arm_ms,
+            'interval_ms': self.interval_ms,
+            'active_requests': active
+        }
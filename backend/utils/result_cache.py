@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+def hash_bytes(data):
+    """Content hash of an in-memory payload."""
+    return hashlib.sha256(data).hexdigest()
+
+def hash_stream(stream, chunk_size=1024 * 1024):
+    """Content hash of a binary file object, read in chunks from its current position."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Content hash of a file on disk, read in chunks."""
+    with open(path, 'rb') as f:
+        return hash_stream(f, chunk_size)
+
+def normalize_operations(operations):
+    """Drop the steps /process would skip and return a canonical list."""
+    return [
+        {'type': operation['type'], 'params': operation['params']}
+        for operation in operations
+        if isinstance(operation, dict) and 'type' in operation and 'params' in operation
+    ]
+
+def make_key(source_hash, operation, params):
+    """
+    Build a cache key from the source content hash and the requested work.
+
+    Parameters:
+    - source_hash: hash_bytes/hash_file digest of the source image
+    - operation: operation name (or 'process' for /process chains)
+    - params: JSON-serialisable parameters; dict keys are sorted
+    """
+    spec = json.dumps([operation, params], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f"{source_hash}:{spec}".encode()).hexdigest()
+
+class ResultCache:
+    """
+    Two-tier cache for encoded processing results.
+
+    The memory tier is an LRU bounded by the total size of the stored values.
+    The optional disk tier keeps one JSON file per key in ``disk_dir`` and
+    drops the least recently used files once ``disk_max_bytes`` is exceeded.
+    Values must be JSON-serialisable.
+    """
+
+    def __init__(self, max_bytes=128 * 1024 * 1024, disk_dir=None, disk_max_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._disk_entries = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            files = []
+            for name in os.listdir(disk_dir):
+                if name.endswith('.json'):
+                    stat = os.stat(os.path.join(disk_dir, name))
+                    files.append((stat.st_mtime, name[:-5], stat.st_size))
+            for _, key, size in sorted(files):
+                self._disk_entries[key] = size
+                self._disk_bytes += size
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            on_disk = self.disk_dir and key in self._disk_entries
+
+        if on_disk:
+            try:
+                with open(self._disk_path(key), 'r') as f:
+                    payload = f.read()
+                value = json.loads(payload)
+            except (OSError, ValueError):
+                value = None
+            if value is not None:
+                with self._lock:
+                    if key in self._disk_entries:
+                        self._disk_entries.move_to_end(key)
+                    self.disk_hits += 1
+                    self._store_memory(key, value, len(payload))
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        payload = json.dumps(value)
+        with self._lock:
+            self._store_memory(key, value, len(payload))
+
+        if self.disk_dir:
+            tmp_path = self._disk_path(key) + '.tmp'
+            try:
+                with open(tmp_path, 'w') as f:
+                    f.write(payload)
+                os.replace(tmp_path, self._disk_path(key))
+            except OSError as e:
+                print(f"Error writing result cache entry: {e}")
+                return
+            with self._lock:
+                self._disk_bytes -= self._disk_entries.pop(key, 0)
+                self._disk_entries[key] = len(payload)
+                self._disk_bytes += len(payload)
+                self._evict_disk()
+
+    def _store_memory(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_max_bytes and self._disk_entries:
+            key, size = self._disk_entries.popitem(last=False)
+            self._disk_bytes -= size
+            self.disk_evictions += 1
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self.disk_dir:
+                for key in self._disk_entries:
+                    try:
+                        os.remove(self._disk_path(key))
+                    except OSError:
+                        pass
+            self._disk_entries.clear()
+            self._disk_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_evictions': self.disk_evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'disk_entries': len(self._disk_entries),
+                'disk_bytes': self._disk_bytes,
+                'disk_enabled': bool(self.disk_dir)
+            }
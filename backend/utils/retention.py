@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+
+# Partial uploads older than this are left over from a crash
+STALE_UPLOAD_SECONDS = 3600
+
+class UploadSweeper:
+    """
+    Retention for an UploadStore's folder, run by a background thread.
+
+    Uploads not looked up for ``ttl_seconds`` are deleted. If the stored
+    bytes are still over ``quota_bytes``, whole files are then deleted in
+    least-recently-accessed order until the folder fits. A file is a set of
+    names that link the same blob. Blobs no name links to any more and
+    abandoned partial uploads are removed on every sweep. Last access is the
+    latest of the store's index (merged with what the other worker
+    processes have written) and the file's atime and mtime; names of one
+    blob share its atime. Each removal holds the store's blob lock, so it
+    never races an upload that is being saved, and the index is written
+    once per sweep.
+    Dot-prefixed entries (index, caches, profiles) are not uploads and are
+    never swept.
+
+    Parameters:
+    - store: utils.upload_store.UploadStore
+    - quota_bytes: most deduplicated bytes to keep; 0 for no quota
+    - ttl_seconds: idle time after which an upload is deleted; 0 keeps uploads
+    - interval: seconds between sweeps
+    """
+
+    def __init__(self, store, quota_bytes=0, ttl_seconds=0, interval=300):
+        self.store = store
+        self.quota_bytes = quota_bytes
+        self.ttl_seconds = ttl_seconds
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread_pid = None
+        self.evicted_files = 0
+        self.freed_bytes = 0
+        self._usage = None
+        self._last_sweep = None
+        self._sweep_ms = None
+
+    def ensure_started(self):
+        """Start the sweeper thread in this process (again after a fork)."""
+        if self._thread_pid != os.getpid():
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, name='upload-sweeper', daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error sweeping uploads: {e}")
+            time.sleep(self.interval)
+
+    def _scan(self):
+        """Group the uploads by inode: [{'inode', 'names', 'size', 'accessed'}, ...]."""
+        files = {}
+        for entry in os.scandir(self.store.folder):
+            if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+                continue
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            accessed = max(self.store.last_access(entry.name) or 0, stat.st_atime, stat.st_mtime)
+            inode = (stat.st_dev, stat.st_ino)
+            group = files.setdefault(inode, {'inode': inode, 'names': [], 'size': stat.st_size, 'accessed': 0})
+            group['names'].append((entry.name, accessed))
+            group['accessed'] = max(group['accessed'], accessed)
+        return list(files.values())
+
+    def _remove(self, filename, inode):
+        # The blob lock is taken per file, so uploads are not held up for a
+        # whole sweep. A name a new upload has been linked to since the scan
+        # points to another inode and is kept.
+        with self.store.blob_lock():
+            try:
+                stat = os.stat(self.store.path(filename), follow_symlinks=False)
+                if (stat.st_dev, stat.st_ino) != inode:
+                    return
+                os.remove(self.store.path(filename))
+            except FileNotFoundError:
+                pass
+        self.evicted_files += 1
+
+    def _remove_orphans(self, now):
+        try:
+            entries = list(os.scandir(self.store.blob_dir))
+        except FileNotFoundError:
+            return
+        # Called with the store's blob lock held: a blob that is being saved has no name yet
+        for entry in entries:
+            try:
+                stat = entry.stat(follow_symlinks=False)
+                if entry.name.startswith('.upload-'):
+                    if now - stat.st_mtime > STALE_UPLOAD_SECONDS:
+                        os.remove(entry.path)
+                elif stat.st_nlink == 1:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+
+    def sweep(self):
+        """Apply the TTL and quota once; returns the usage afterwards."""
+        with self._lock:
+            start = time.perf_counter()
+            now = time.time()
+            self.store.reload()
+            files = self._scan()
+            scanned_bytes = sum(group['size'] for group in files)
+
+            if self.ttl_seconds:
+                for group in files:
+                    for filename, accessed in list(group['names']):
+                        if now - accessed > self.ttl_seconds:
+                            self._remove(filename, group['inode'])
+                            group['names'].remove((filename, accessed))
+                files = [group for group in files if group['names']]
+
+            stored_bytes = sum(group['size'] for group in files)
+            if self.quota_bytes and stored_bytes > self.quota_bytes:
+                for group in sorted(files, key=lambda group: group['accessed']):
+                    if stored_bytes <= self.quota_bytes:
+                        break
+                    for filename, _ in group['names']:
+                        self._remove(filename, group['inode'])
+                    group['names'] = []
+                    stored_bytes -= group['size']
+                files = [group for group in files if group['names']]
+
+            with self.store.blob_lock():
+                self._remove_orphans(now)
+            # One index write for every upload removed above
+            self.store.forget_missing(name for group in files for name, _ in group['names'])
+            self.freed_bytes += scanned_bytes - stored_bytes
+            self.store.flush()
+
+            self._last_sweep = now
+            self._sweep_ms = round((time.perf_counter() - start) * 1000, 2)
+            self._usage = self._report(files)
+            return self._usage
+
+    def _report(self, files):
+        stored_bytes = sum(group['size'] for group in files)
+        return {
+            'files': sum(len(group['names']) for group in files),
+            'stored_files': len(files),
+            'stored_bytes': stored_bytes,
+            'logical_bytes': sum(group['size'] * len(group['names']) for group in files),
+            'quota_bytes': self.quota_bytes,
+            'ttl_seconds': self.ttl_seconds,
+            'evicted_files': self.evicted_files,
+            'freed_bytes': self.freed_bytes,
+            'last_sweep': self._last_sweep,
+            'sweep_ms': self._sweep_ms
+        }
+
+    def usage(self, refresh=False):
+        """
+        Usage as of the last sweep, or rescanned now with ``refresh``. Only
+        the sweeper thread deletes; a refresh just reports.
+        """
+        if refresh or self._usage is None:
+            with self._lock:
+                self.store.reload()
+                self._usage = self._report(self._scan())
+        return self._usage
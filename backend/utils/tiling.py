@@ -0,0 +1,143 @@
+import math
+
+import numpy as np
+
+from .lazy_imports import load
+
+class TilingPolicy:
+    """
+    When and how to run neighbourhood filters tile by tile.
+
+    Parameters:
+    - memory_mb: working-memory ceiling for one tile (input copy plus the
+      filter's intermediates); 0 disables tiling
+    - min_megapixels: frames smaller than this run whole
+    """
+
+    def __init__(self, memory_mb=64, min_megapixels=16):
+        self.memory_mb = memory_mb
+        self.min_megapixels = min_megapixels
+
+    def applies(self, frame):
+        return self.memory_mb > 0 and frame.shape[0] * frame.shape[1] >= self.min_megapixels * 1e6
+
+def tile_halo(op_type, params):
+    """
+    Number of border pixels a tile needs so that its core matches the
+    whole-image result, or None if the operation cannot be tiled exactly
+    (global operations such as Canny hysteresis or NL-means are run whole).
+    """
+    if op_type == 'noise_reduction':
+        method = params.get('method', 'gaussian')
+        if method in ('gaussian', 'median', 'bilateral'):
+            return params.get('kernel_size', 5) // 2
+    elif op_type == 'morphological':
+        operation = params.get('operation', 'dilate')
+        radius = params.get('kernel_size', 5) // 2
+        if operation in ('dilate', 'erode'):
+            return radius * params.get('iterations', 1)
+        if operation == 'gradient':
+            return radius
+        if operation in ('opening', 'closing', 'tophat', 'blackhat'):
+            return 2 * radius
+    elif op_type == 'edge_detection':
+        if params.get('method', 'canny') in ('sobel', 'laplace', 'prewitt', 'roberts'):
+            return 1
+    elif op_type == 'threshold':
+        method = params.get('method', 'binary')
+        if method == 'binary':
+            return 0
+        if method == 'adaptive':
+            return params.get('block_size', 11) // 2
+        if method in ('otsu', 'triangle'):
+            # Global threshold: tiles only convert to gray, see run_tiled
+            return 0
+    return None
+
+# Steps whose whole-frame path writes its result back into the input frame
+# (see utils.image_processing). They need no memory beyond the frame itself,
+# so tiling them would only add an output frame and the tile copies.
+IN_PLACE = {
+    'noise_reduction': ('gaussian', 'median'),
+    'morphological': ('dilate', 'erode', 'opening', 'closing', 'gradient', 'tophat', 'blackhat')
+}
+
+def worth_tiling(op_type, params):
+    """Whether tiling a step lowers its peak memory: it can be tiled exactly and does not run in place."""
+    if tile_halo(op_type, params) is None:
+        return False
+    if op_type == 'noise_reduction':
+        return params.get('method', 'gaussian') not in IN_PLACE[op_type]
+    if op_type == 'morphological':
+        return params.get('operation', 'dilate') not in IN_PLACE[op_type]
+    return True
+
+def _bytes_per_pixel(op_type, channels):
+    # Rough working set per pixel: the tile copy, the result and, for the
+    # scikit-image edge filters, float64 intermediates.
+    if op_type == 'edge_detection':
+        return channels + 8 * 3
+    return channels * 3
+
+def tile_size(memory_mb, op_type, channels, halo):
+    """Side of the square tile core that keeps one tile within memory_mb."""
+    pixels = memory_mb * 1024 * 1024 / _bytes_per_pixel(op_type, channels)
+    return max(64, int(math.sqrt(pixels)) - 2 * halo)
+
+def iter_tiles(height, width, size):
+    """Yield (y0, y1, x0, x1) core regions covering the frame."""
+    for y0 in range(0, height, size):
+        for x0 in range(0, width, size):
+            yield y0, min(y0 + size, height), x0, min(x0 + size, width)
+
+def iter_strips(height, width, count):
+    """Yield (y0, y1, x0, x1) core regions of ``count`` full-width horizontal strips."""
+    size = max(1, math.ceil(height / count))
+    for y0 in range(0, height, size):
+        yield y0, min(y0 + size, height), 0, width
+
+def run_regions(frame, op_type, params, processor, regions, map_fn=map):
+    """
+    Run ``processor`` over overlapping copies of each (y0, y1, x0, x1) core
+    region of ``frame`` and stitch the cores into a preallocated output.
+    ``params`` must be tileable (see tile_halo). ``map_fn(fn, regions)``
+    must yield results in order; a thread pool's map runs regions in parallel.
+    """
+    cv2 = load('cv2')
+    height, width = frame.shape[:2]
+    halo = tile_halo(op_type, params)
+    global_threshold = op_type == 'threshold' and params.get('method') in ('otsu', 'triangle')
+
+    def run(region):
+        y0, y1, x0, x1 = region
+        ya, yb = max(0, y0 - halo), min(height, y1 + halo)
+        xa, xb = max(0, x0 - halo), min(width, x1 + halo)
+        # Copy: processors may overwrite their input, and neighbours still need it
+        tile = frame[ya:yb, xa:xb].copy()
+        if global_threshold:
+            result = tile if tile.ndim == 2 else cv2.cvtColor(tile, cv2.COLOR_RGB2GRAY)
+        else:
+            result = processor(tile, **params)
+        return result[y0 - ya:y0 - ya + (y1 - y0), x0 - xa:x0 - xa + (x1 - x0)]
+
+    regions = list(regions)
+    out = None
+    for (y0, y1, x0, x1), core in zip(regions, map_fn(run, regions)):
+        if out is None:
+            out = np.empty((height, width) + core.shape[2:], dtype=core.dtype)
+        out[y0:y1, x0:x1] = core
+
+    if global_threshold:
+        flag = cv2.THRESH_OTSU if params['method'] == 'otsu' else cv2.THRESH_TRIANGLE
+        cv2.threshold(out, 0, 255, cv2.THRESH_BINARY + flag, dst=out)
+    return out
+
+def run_tiled(frame, op_type, params, processor, memory_mb, map_fn=map):
+    """
+    Run ``processor`` over overlapping tiles of ``frame`` sized to keep one
+    tile within ``memory_mb``, see run_regions.
+    """
+    height, width = frame.shape[:2]
+    channels = frame.shape[2] if frame.ndim == 3 else 1
+    size = tile_size(memory_mb, op_type, channels, tile_halo(op_type, params))
+    return run_regions(frame, op_type, params, processor, iter_tiles(height, width, size), map_fn)
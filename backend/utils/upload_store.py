@@ -0,0 +1,396 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from PIL import Image, UnidentifiedImageError
+
+from .result_cache import hash_file
+
+try:
+    import fcntl
+except ImportError:  # Windows: the locks only cover the threads of one process
+    fcntl = None
+
+INDEX_FILENAME = '.index.json'
+BLOB_DIRNAME = '.blobs'
+INDEX_LOCK_FILENAME = '.index.lock'
+BLOB_LOCK_FILENAME = '.blobs.lock'
+# A lookup moves the file's atime forward at most this often
+ATIME_RESOLUTION_SECONDS = 60
+# The pixel limit is checked from the header after each of the first this
+# many chunks of an upload, then only once the whole file is on disk
+HEADER_CHECK_CHUNKS = 4
+
+class UploadTooLarge(ValueError):
+    """An upload exceeds the configured byte or pixel limit."""
+
+def _image_bytes(img):
+    return img.width * img.height * len(img.getbands())
+
+class _FileLock:
+    """
+    Exclusive flock on ``path``, shared with the other worker processes.
+    A forked child shares its parent's open file and so its lock; the file
+    is opened again in every process. Callers serialise their own threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._pid = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            if self._pid != os.getpid():
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                self._pid = os.getpid()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+class UploadStore:
+    """
+    Uploads on disk plus what the filename-based endpoints keep recomputing.
+
+    - an index with each file's format, dimensions, byte size and content
+      hash, persisted next to the uploads and validated against the file's
+      mtime and size; every worker process keeps its own copy and merges
+      the others' entries in whenever it writes or reloads the file
+    - a memory-bounded LRU of decoded frames and prepared watermarks, shared
+      by every endpoint, so repeat operations on a hot upload skip decoding
+    - content-addressed blobs: each distinct upload is stored once under
+      .blobs/<sha256> and every filename is a hard link to its blob
+    """
+
+    def __init__(self, folder, cache_bytes=256 * 1024 * 1024, persist=True):
+        self.folder = folder
+        self.persist = persist
+        self.cache_bytes = cache_bytes
+        self._index_path = os.path.join(folder, INDEX_FILENAME)
+        self.blob_dir = os.path.join(folder, BLOB_DIRNAME)
+        self._index = {}
+        self._index_dirty = False
+        self._frames = OrderedDict()
+        self._frames_bytes = 0
+        self._lock = threading.Lock()
+        self._blob_lock = threading.Lock()
+        self._blob_file_lock = _FileLock(os.path.join(folder, BLOB_LOCK_FILENAME))
+        self._index_file_lock = _FileLock(os.path.join(folder, INDEX_LOCK_FILENAME))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        try:
+            with open(self._index_path) as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+
+    def path(self, filename):
+        return os.path.join(self.folder, filename)
+
+    @contextmanager
+    def blob_lock(self):
+        """Held while blobs are created, linked or swept, by one thread of one process at a time."""
+        with self._blob_lock, self._blob_file_lock:
+            yield
+
+    def _current_entry(self, filename, entry):
+        try:
+            stat = os.stat(self.path(filename))
+        except OSError:
+            return False
+        return entry.get('mtime_ns') == stat.st_mtime_ns and entry.get('size') == stat.st_size
+
+    def _merge_index(self, drop=()):
+        # Called with _lock and the index file lock held. Takes in what other
+        # processes have written: entries this process does not have, the
+        # later access time of entries both have, and the entry that matches
+        # the file on disk when the two disagree. ``drop`` is removed from both.
+        try:
+            with open(self._index_path) as f:
+                persisted = json.load(f)
+        except (OSError, ValueError):
+            persisted = {}
+        for filename in drop:
+            persisted.pop(filename, None)
+        for filename, entry in persisted.items():
+            mine = self._index.get(filename)
+            if mine is None:
+                self._index[filename] = entry
+            elif (mine['mtime_ns'], mine['size']) == (entry.get('mtime_ns'), entry.get('size')):
+                mine['accessed'] = max(mine.get('accessed', 0), entry.get('accessed', 0))
+            elif not self._current_entry(filename, mine) and self._current_entry(filename, entry):
+                self._index[filename] = entry
+
+    def _write_index(self, drop=()):
+        # Called with _lock held
+        self._index_dirty = False
+        if not self.persist:
+            return
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        try:
+            with self._index_file_lock:
+                self._merge_index(drop)
+                with open(tmp_path, 'w') as f:
+                    # dumps() runs the C encoder; dump() streams through the Python one
+                    f.write(json.dumps(self._index))
+                os.replace(tmp_path, self._index_path)
+        except OSError as e:
+            print(f"Error writing upload index: {e}")
+
+    def reload(self):
+        """Merge in the index entries and access times other processes have written."""
+        if not self.persist:
+            return
+        with self._lock, self._index_file_lock:
+            self._merge_index()
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256)
+
+    def _check_pixels(self, path, max_pixels):
+        # Reads the header only. Returns False if it is not (yet) readable.
+        try:
+            with Image.open(path) as img:
+                width, height = img.size
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            return False
+        if max_pixels and width * height > max_pixels:
+            raise UploadTooLarge(f"Image has {width}x{height} pixels, the limit is {max_pixels}")
+        return True
+
+    def save(self, stream, filename, max_bytes=None, max_pixels=None, chunk_size=64 * 1024):
+        """
+        Stream an upload to disk in chunks, hashing it on the way, and store
+        it under ``filename``.
+
+        Identical content is kept once: a new upload whose hash already has a
+        blob is dropped and ``filename`` is linked to the existing blob.
+        UploadTooLarge is raised as soon as the stream passes ``max_bytes`` or
+        the image header declares more than ``max_pixels``.
+
+        Returns (metadata, deduplicated); metadata is None if the file is
+        not an image PIL can read.
+        """
+        os.makedirs(self.blob_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, prefix='.upload-')
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            header_checked = False
+            header_checks = 0
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: stream.read(chunk_size), b''):
+                    size += len(chunk)
+                    if max_bytes and size > max_bytes:
+                        raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+                    # Every attempt tries all of PIL's plugins, so a file that is
+                    # not an image is not identified again for every chunk
+                    if not header_checked and header_checks < HEADER_CHECK_CHUNKS and size >= chunk_size:
+                        header_checks += 1
+                        f.flush()
+                        header_checked = self._check_pixels(tmp_path, max_pixels)
+            if not header_checked:
+                self._check_pixels(tmp_path, max_pixels)
+
+            sha256 = digest.hexdigest()
+            blob_path = self._blob_path(sha256)
+            with self.blob_lock():
+                deduplicated = os.path.exists(blob_path)
+                if deduplicated:
+                    os.remove(tmp_path)
+                else:
+                    os.replace(tmp_path, blob_path)
+                self._link(blob_path, filename)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        try:
+            return self.metadata(filename, sha256=sha256), deduplicated
+        except UnidentifiedImageError:
+            return None, deduplicated
+
+    def _link(self, blob_path, filename):
+        # Called with the blob lock held. Swaps the name over atomically and
+        # deletes the blob the name pointed to if nothing else links to it.
+        path = self.path(filename)
+        with self._lock:
+            previous = self._index.get(filename, {}).get('sha256')
+        tmp_link = f"{path}.{os.getpid()}.{threading.get_ident()}.link"
+        try:
+            os.link(blob_path, tmp_link)
+        except OSError:
+            # No hard links on this filesystem: store a copy instead
+            shutil.copyfile(blob_path, tmp_link)
+        os.replace(tmp_link, path)
+        self.forget(filename)
+        if previous and self._blob_path(previous) != blob_path:
+            self.release_blob(previous)
+
+    def release_blob(self, sha256):
+        """Delete a blob once no upload links to it. Returns the bytes freed."""
+        blob_path = self._blob_path(sha256)
+        try:
+            stat = os.stat(blob_path)
+            if stat.st_nlink == 1:
+                os.remove(blob_path)
+                return stat.st_size
+        except OSError:
+            pass
+        return 0
+
+    def metadata(self, filename, sha256=None):
+        """
+        Format, dimensions, size and content hash of an upload. Raises
+        FileNotFoundError for unknown files. ``sha256`` skips hashing when the
+        caller already knows the content hash.
+        """
+        stat = os.stat(self.path(filename))
+        self._touch(filename, stat)
+        with self._lock:
+            entry = self._index.get(filename)
+            if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                # Persisted lazily by flush(); retention only needs it roughly right
+                entry['accessed'] = time.time()
+                self._index_dirty = True
+                return entry
+
+        with Image.open(self.path(filename)) as img:
+            entry = {
+                'format': (img.format or '').lower(),
+                'width': img.width,
+                'height': img.height,
+                'mode': img.mode,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': sha256 or hash_file(self.path(filename)),
+                'accessed': time.time()
+            }
+        with self._lock:
+            self._index[filename] = entry
+            self._write_index()
+        return entry
+
+    def _touch(self, filename, stat):
+        # The atime is seen by every worker's sweeper at once, unlike the
+        # index, which only reaches the others when it is next written
+        now = time.time()
+        if now - stat.st_atime > ATIME_RESOLUTION_SECONDS:
+            try:
+                os.utime(self.path(filename), ns=(time.time_ns(), stat.st_mtime_ns))
+            except OSError:
+                pass
+
+    def last_access(self, filename):
+        """When an upload was last looked up, or None if it is not indexed."""
+        with self._lock:
+            entry = self._index.get(filename)
+            return entry.get('accessed') if entry else None
+
+    def forget_missing(self, filenames):
+        """
+        Drop index entries for uploads that are not in ``filenames`` and no
+        longer on disk (a name saved since the caller listed them is kept).
+        """
+        filenames = set(filenames)
+        with self._lock:
+            missing = [filename for filename in self._index
+                       if filename not in filenames and not os.path.exists(self.path(filename))]
+        if missing:
+            self.forget_all(missing)
+
+    def flush(self):
+        """Persist access times recorded since the index was last written."""
+        with self._lock:
+            if self._index_dirty:
+                self._write_index()
+
+    def forget(self, filename):
+        """Drop an upload from the index and the frame cache (the file itself is not touched)."""
+        self.forget_all([filename])
+
+    def forget_all(self, filenames):
+        """Like forget, for many uploads at once: the index is written once."""
+        filenames = set(filenames)
+        with self._lock:
+            for filename in filenames:
+                self._index.pop(filename, None)
+            # Also drops the entries another process may have persisted
+            self._write_index(drop=filenames)
+            for key in [key for key in self._frames if key[1] in filenames]:
+                self._frames_bytes -= self._frames.pop(key)[1]
+
+    def _cached(self, key, build):
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return self._frames[key][0]
+            self.misses += 1
+
+        value = build()
+        size = _image_bytes(value)
+        with self._lock:
+            if size <= self.cache_bytes and key not in self._frames:
+                self._frames[key] = (value, size)
+                self._frames_bytes += size
+                while self._frames_bytes > self.cache_bytes:
+                    _, (_, evicted_size) = self._frames.popitem(last=False)
+                    self._frames_bytes -= evicted_size
+                    self.evictions += 1
+        return value
+
+    def open_image(self, filename, draft_size=None):
+        """
+        Decoded frame of an upload. Returns a copy, so callers may modify it
+        (e.g. paste a watermark) without touching the cached frame.
+
+        With ``draft_size`` a JPEG that is not already cached at full size is
+        decoded at the smallest DCT scale that is still at least that large.
+        """
+        meta = self.metadata(filename)
+        full_key = ('frame', filename, meta['mtime_ns'], (meta['width'], meta['height']))
+
+        with Image.open(self.path(filename)) as img:
+            if draft_size and full_key not in self._frames:
+                img.draft(img.mode, draft_size)
+
+            def decode():
+                img.load()
+                return img
+
+            return self._cached(('frame', filename, meta['mtime_ns'], img.size), decode).copy()
+
+    def watermark(self, filename, width, height, opacity, prepare):
+        """
+        Watermark prepared by ``prepare(path, width, height, opacity)``,
+        cached per size and opacity. The returned image is shared; do not modify it.
+        """
+        meta = self.metadata(filename)
+        key = ('watermark', filename, meta['mtime_ns'], width, height, opacity)
+        return self._cached(key, lambda: prepare(self.path(filename), width, height, opacity))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'indexed': len(self._index),
+                'cached': len(self._frames),
+                'cached_bytes': self._frames_bytes,
+                'cache_bytes': self.cache_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
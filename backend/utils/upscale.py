@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from .lazy_imports import load
+
+UPSCALE_METHODS = ('nearest', 'bilinear', 'bicubic', 'lanczos')
+
+MAX_SCALE = 8
+
+# Largest output an upscale may produce, in megapixels (0 for no limit).
+# Defaults to the upload limit, so a result is never bigger than an upload may be.
+MAX_OUTPUT_PIXELS = int(float(os.getenv('UPSCALE_MAX_MEGAPIXELS', os.getenv('UPLOAD_MAX_MEGAPIXELS', 100))) * 1e6)
+
+def _interpolation(cv2, method):
+    return {
+        'nearest': cv2.INTER_NEAREST,
+        'bilinear': cv2.INTER_LINEAR,
+        'bicubic': cv2.INTER_CUBIC,
+        'lanczos': cv2.INTER_LANCZOS4
+    }[method]
+
+def upscale_array(img_array, width, height, method='lanczos'):
+    """
+    Resize a uint8, uint16 or float32 array with an OpenCV interpolation kernel.
+
+    The result keeps the input dtype (cubic and Lanczos overshoot is saturated),
+    so there is no float64 intermediate the size of the output.
+    """
+    if method not in UPSCALE_METHODS:
+        raise ValueError(f"Unsupported upscale method: {method}")
+    cv2 = load('cv2')
+    return cv2.resize(img_array, (width, height), interpolation=_interpolation(cv2, method))
+
+def upscale_image(img, scale=2.0, method='lanczos'):
+    """
+    Upscale a PIL image by an arbitrary factor.
+
+    Parameters:
+    - scale: factor applied to both dimensions, 0 < scale <= MAX_SCALE; the
+      result may have at most MAX_OUTPUT_PIXELS pixels
+    - method: 'nearest', 'bilinear', 'bicubic' or 'lanczos'
+    """
+    if not 0 < scale <= MAX_SCALE:
+        raise ValueError(f"Scale must be greater than 0 and at most {MAX_SCALE}")
+    width = max(1, round(img.width * scale))
+    height = max(1, round(img.height * scale))
+    if MAX_OUTPUT_PIXELS and width * height > MAX_OUTPUT_PIXELS:
+        raise ValueError(f"Upscaled image would have {width}x{height} pixels, the limit is {MAX_OUTPUT_PIXELS}")
+
+    # Interpolate colours rather than palette indices, and keep every other
+    # mode in a dtype OpenCV can resize directly
+    if img.mode == 'P':
+        img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    elif img.mode == '1':
+        img = img.convert('L')
+    elif img.mode in ('I', 'F'):
+        img = img.convert('F')
+    elif img.mode not in ('L', 'LA', 'RGB', 'RGBA', 'I;16'):
+        img = img.convert('RGB')
+
+    return Image.fromarray(upscale_array(np.asarray(img), width, height, method))